@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+artefatos.py  --  v1.0
+======================
+Artefatos intermediarios do pipeline da certidao (main.processar_certidao),
+gravados em artefatos.db ao lado do banco.
+
+Cada etapa grava sua saida (texto extraido, dados em JSON, partes com
+endereco, arquivos gerados) sob uma chave = SHA-256 de
+  nome da etapa + versao do codigo da etapa + hash das entradas.
+A versao do codigo e o hash do codigo-fonte das funcoes da etapa: mudar o
+modelo da peticao invalida so as etapas de geracao, e o texto e o OCR da
+certidao sao reaproveitados.
+
+Arquivos gerados ficam no disco; o artefato guarda caminho + SHA-256 e so
+vale enquanto o arquivo estiver intacto (ver arquivo_intacto).
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from pathlib import Path
+
+from banco import conectar
+
+
+DDL_ARTEFATOS = """
+CREATE TABLE IF NOT EXISTS artefatos (
+    etapa      TEXT NOT NULL,
+    chave      TEXT NOT NULL,      -- ver chave_etapa
+    dados      TEXT NOT NULL,      -- JSON com a saida da etapa
+    criado_em  REAL NOT NULL,
+    PRIMARY KEY (etapa, chave)
+);
+"""
+
+
+def caminho_artefatos(caminho_db: str = "certidoes_tce.db") -> str:
+    """Arquivo dos artefatos: artefatos.db no mesmo diretorio do banco."""
+    return str(Path(caminho_db).with_name("artefatos.db"))
+
+
+def hash_json(obj) -> str:
+    """SHA-256 de um objeto JSON (chaves ordenadas: independe da ordem do dict)."""
+    bruto = json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def hash_arquivo(caminho: str) -> str:
+    """SHA-256 do arquivo, ou "" se o caminho for vazio/inexistente."""
+    if not caminho or not os.path.isfile(caminho):
+        return ""
+    from gestor_enderecos import sha256_arquivo
+    return sha256_arquivo(caminho)
+
+
+def versao_codigo(*objetos) -> str:
+    """
+    Versao de uma etapa: hash do codigo-fonte das funcoes/modulos que a
+    implementam. Constantes (ex.: gestor_enderecos._VERSAO_OCR) entram pelo
+    valor. Sem o fonte disponivel, cai no nome qualificado do objeto.
+    """
+    h = hashlib.sha256()
+    for obj in objetos:
+        if callable(obj) or inspect.ismodule(obj):
+            try:
+                fonte = inspect.getsource(obj)
+            except (OSError, TypeError):
+                fonte = f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', obj)}"
+        else:
+            fonte = repr(obj)
+        h.update(fonte.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def chave_etapa(etapa: str, versao: str, *entradas) -> str:
+    """Chave do artefato: etapa + versao do codigo + entradas (hashes, caminhos)."""
+    bruto = "|".join([etapa, versao, *("" if e is None else str(e) for e in entradas)])
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def registrar_arquivo(caminho: str) -> dict:
+    """Artefato de arquivo gerado: {caminho, sha256}."""
+    return {"caminho": caminho, "sha256": hash_arquivo(caminho)}
+
+
+def arquivo_intacto(registro: dict) -> bool:
+    """True se o arquivo registrado ainda existe com o mesmo conteudo."""
+    return bool(registro and registro.get("sha256")
+                and hash_arquivo(registro.get("caminho")) == registro["sha256"])
+
+
+class ArtefatosPipeline:
+    """
+    Acesso a tabela artefatos. Uma conexao por instancia (banco.conectar:
+    WAL, para conviver com o lote e a GUI).
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.conn = conectar(caminho, timeout=30)
+        self.conn.executescript(DDL_ARTEFATOS)
+        self.conn.commit()
+
+    def obter(self, etapa: str, chave: str):
+        """Saida gravada da etapa (JSON decodificado) ou None."""
+        linha = self.conn.execute(
+            "SELECT dados FROM artefatos WHERE etapa = ? AND chave = ?",
+            (etapa, chave)).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    def gravar(self, etapa: str, chave: str, dados) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO artefatos (etapa, chave, dados, criado_em) "
+                "VALUES (?, ?, ?, ?)",
+                (etapa, chave, json.dumps(dados, ensure_ascii=False), time.time()))
+
+    def podar(self, dias: float = 90) -> int:
+        """Remove artefatos gravados ha mais de `dias`. Retorna quantos sairam."""
+        limite = time.time() - dias * 86400
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM artefatos WHERE criado_em < ?",
+                                    (limite,))
+        return cur.rowcount
+
+    def fechar(self) -> None:
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python artefatos.py [certidoes_tce.db] [--podar DIAS]
+    args = sys.argv[1:]
+    dias = None
+    if "--podar" in args:
+        i = args.index("--podar")
+        dias = float(args[i + 1])
+        del args[i:i + 2]
+    art = ArtefatosPipeline(caminho_artefatos(args[0] if args else "certidoes_tce.db"))
+    if dias is not None:
+        print(f"  {art.podar(dias)} artefato(s) removido(s)")
+    for etapa, n in art.conn.execute(
+            "SELECT etapa, COUNT(*) FROM artefatos GROUP BY etapa ORDER BY etapa"):
+        print(f"  {etapa:<10} {n:>5}")
+    art.fechar()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+banco.py  --  v1.0
+==================
+Fabrica de conexoes SQLite do sistema: certidoes_tce.db (main,
+enviador_peticao, gestor_enderecos, fila_jobs) e os bancos auxiliares
+(ocr_cache.db, artefatos.db). Guarda tambem o esquema do certidoes_tce.db
+e as suas migracoes (migrar).
+
+Toda conexao sai com:
+  journal_mode=WAL     leitores nao bloqueiam o gravador (GUI, enviador e
+                       lote abertos ao mesmo tempo); fica gravado no arquivo
+  synchronous=NORMAL   com WAL, fsync so nos checkpoints: commits rapidos,
+                       sem risco de corromper o banco numa queda
+  busy_timeout         espera o outro gravador em vez de "database is locked"
+  cache_size/mmap_size cache de paginas maior e leitura via mmap
+  foreign_keys=ON      as REFERENCES das tabelas passam a valer
+"""
+
+import sqlite3
+
+
+DB_PATH = "certidoes_tce.db"
+
+BUSY_TIMEOUT_MS = 10_000
+CACHE_KIB       = 32_768              # cache_size negativo = KiB
+MMAP_BYTES      = 256 * 1024 * 1024
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    f"PRAGMA cache_size=-{CACHE_KIB}",
+    f"PRAGMA mmap_size={MMAP_BYTES}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+def conectar(caminho: str = DB_PATH, row_factory=None,
+             **kwargs) -> sqlite3.Connection:
+    """
+    Abre `caminho` com os PRAGMAs acima. kwargs vao para sqlite3.connect
+    (ex.: isolation_level=None, check_same_thread=False).
+    """
+    kwargs.setdefault("timeout", BUSY_TIMEOUT_MS / 1000)
+    conn = sqlite3.connect(caminho, **kwargs)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+# ============================================================
+# ESQUEMA (certidoes_tce.db)
+# ============================================================
+# Todo o esquema do banco fica aqui. Os DDL_* sao as tabelas como foram
+# criadas originalmente (antes em main, gestor_enderecos, enviador_peticao
+# e fila_jobs) e nao mudam mais: alteracoes entram como novas MIGRACOES.
+
+DDL_CERTIDOES = """
+CREATE TABLE IF NOT EXISTS certidoes (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    numero_processo TEXT NOT NULL,
+    valor_atualizado TEXT,
+    data_atualizacao TEXT,
+    acordao_origem   TEXT,
+    data_insercao    TEXT DEFAULT CURRENT_TIMESTAMP,
+    caminho_pdf_certidao TEXT,
+    caminho_pdf_planilha  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS responsaveis (
+    id               INTEGER PRIMARY KEY AUTOINCREMENT,
+    certidao_id      INTEGER NOT NULL REFERENCES certidoes(id),
+    nome             TEXT NOT NULL,
+    tipo_doc         TEXT,   -- CPF ou CNPJ
+    numero_doc       TEXT,
+    acordao          TEXT,
+    excluido         INTEGER DEFAULT 0,
+    endereco         TEXT
+);
+"""
+
+DDL_ENDERECOS = """
+CREATE TABLE IF NOT EXISTS enderecos_responsavel (
+    id                  INTEGER PRIMARY KEY AUTOINCREMENT,
+    responsavel_id      INTEGER REFERENCES responsaveis(id),
+    certidao_id         INTEGER REFERENCES certidoes(id),
+    numero_doc          TEXT,
+    tipo_logradouro     TEXT,
+    logradouro          TEXT,
+    numero              TEXT,
+    complemento         TEXT,
+    bairro              TEXT,
+    cep                 TEXT,
+    municipio           TEXT,
+    uf                  TEXT DEFAULT 'PI',
+    pais                TEXT DEFAULT 'BR',
+    endereco_original   TEXT,
+    data_insercao       TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_end_numero_doc
+    ON enderecos_responsavel(numero_doc);
+CREATE INDEX IF NOT EXISTS idx_end_responsavel
+    ON enderecos_responsavel(responsavel_id);
+"""
+
+DDL_COMARCAS = """
+CREATE TABLE IF NOT EXISTS cod_comarcas (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    comarca     TEXT NOT NULL UNIQUE,
+    cod_comarca TEXT NOT NULL
+);"""
+
+DDL_PETICOES = """
+CREATE TABLE IF NOT EXISTS peticoes_enviadas (
+    id                   INTEGER PRIMARY KEY AUTOINCREMENT,
+    certidao_id          INTEGER REFERENCES certidoes(id),
+    numero_processo_pje  TEXT,
+    comarca              TEXT,
+    cod_comarca          TEXT,
+    caminho_pdf_assinado TEXT,
+    data_envio           TEXT DEFAULT CURRENT_TIMESTAMP,
+    status               TEXT DEFAULT 'enviada',
+    resposta_pje         TEXT
+);"""
+
+DDL_JOBS = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    tipo            TEXT NOT NULL,
+    chave           TEXT NOT NULL,
+    payload         TEXT NOT NULL DEFAULT '{}',
+    estado          TEXT NOT NULL DEFAULT 'queued'
+                    CHECK (estado IN ('queued', 'running', 'done', 'failed')),
+    tentativas      INTEGER NOT NULL DEFAULT 0,
+    max_tentativas  INTEGER NOT NULL DEFAULT 3,
+    dono            TEXT,
+    lease_ate       REAL,
+    checkpoints     TEXT NOT NULL DEFAULT '{}',
+    erro            TEXT,
+    criado_em       REAL NOT NULL,
+    atualizado_em   REAL NOT NULL,
+    UNIQUE (tipo, chave)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_fila ON jobs(tipo, estado, id);
+"""
+
+ESQUEMA_BASE = DDL_CERTIDOES + DDL_ENDERECOS + DDL_COMARCAS + DDL_PETICOES + DDL_JOBS
+
+
+def _executar(conn: sqlite3.Connection, script: str) -> None:
+    """
+    Executa um script SQL comando a comando. executescript nao serve aqui:
+    ele faz COMMIT antes de rodar, e as migracoes precisam de uma transacao so.
+    """
+    comando = ""
+    for linha in script.splitlines(keepends=True):
+        comando += linha
+        if sqlite3.complete_statement(comando):
+            conn.execute(comando)
+            comando = ""
+    if comando.strip():
+        conn.execute(comando)
+
+
+# ============================================================
+# MIGRACOES (PRAGMA user_version)
+# ============================================================
+# user_version = numero da ultima migracao aplicada. Com migracoes
+# pendentes, migrar roda ESQUEMA_BASE (tudo IF NOT EXISTS: cria as tabelas
+# que faltam em bancos novos ou antigos) e depois as migracoes, nessa ordem.
+
+def _m001_indices(conn: sqlite3.Connection) -> None:
+    """Indices das consultas frequentes e numero_processo unico."""
+    # Certidoes repetidas: fica a de menor id (a que salvar_certidao
+    # atualizava); as dependentes passam a apontar para ela. Um responsavel
+    # da repetida que a mantida ja tem (mesmo nome e documento) e fundido:
+    # seus enderecos vao para o da mantida e so a linha repetida sai.
+    duplicadas = conn.execute("""
+        SELECT c.id, m.manter
+        FROM certidoes c
+        JOIN (SELECT numero_processo, MIN(id) AS manter FROM certidoes
+              GROUP BY numero_processo HAVING COUNT(*) > 1) m
+          ON m.numero_processo = c.numero_processo
+        WHERE c.id <> m.manter
+    """).fetchall()
+    for remover, manter in duplicadas:
+        movidos = fundidos = 0
+        for resp_id, nome, numero_doc in conn.execute(
+                "SELECT id, nome, numero_doc FROM responsaveis WHERE certidao_id = ?",
+                (remover,)).fetchall():
+            igual = conn.execute("""
+                SELECT id FROM responsaveis
+                WHERE certidao_id = ? AND nome = ? AND numero_doc IS ?
+                ORDER BY id LIMIT 1
+            """, (manter, nome, numero_doc)).fetchone()
+            if igual is None:
+                conn.execute("UPDATE responsaveis SET certidao_id = ? WHERE id = ?",
+                             (manter, resp_id))
+                movidos += 1
+            else:
+                conn.execute("UPDATE enderecos_responsavel SET responsavel_id = ? "
+                             "WHERE responsavel_id = ?", (igual[0], resp_id))
+                conn.execute("DELETE FROM responsaveis WHERE id = ?", (resp_id,))
+                fundidos += 1
+        conn.execute("UPDATE enderecos_responsavel SET certidao_id = ? "
+                     "WHERE certidao_id = ?", (manter, remover))
+        conn.execute("UPDATE peticoes_enviadas SET certidao_id = ? "
+                     "WHERE certidao_id = ?", (manter, remover))
+        conn.execute("DELETE FROM certidoes WHERE id = ?", (remover,))
+        print(f"  migracao 1: certidao {remover} (repetida) fundida na {manter}: "
+              f"{movidos} responsavel(is) movido(s), {fundidos} repetido(s) "
+              f"fundido(s) no da certidao {manter}")
+
+    _executar(conn, """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_certidoes_numero_processo
+            ON certidoes(numero_processo);
+        CREATE INDEX IF NOT EXISTS idx_responsaveis_certidao
+            ON responsaveis(certidao_id);
+        CREATE INDEX IF NOT EXISTS idx_responsaveis_numero_doc
+            ON responsaveis(numero_doc);
+        CREATE INDEX IF NOT EXISTS idx_peticoes_certidao_status
+            ON peticoes_enviadas(certidao_id, status);
+    """)
+
+
+def _m002_esquema_consolidado(conn: sqlite3.Connection) -> None:
+    """
+    Esquema passou a vir todo daqui. Bancos que ja estavam na versao 1 so
+    precisam do ESQUEMA_BASE (que migrar ja rodou) e do indice das peticoes,
+    que a versao 1 pulava quando a tabela ainda nao existia.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_peticoes_certidao_status "
+                 "ON peticoes_enviadas(certidao_id, status)")
+
+
+def _m003_endereco_por_certidao(conn: sqlite3.Connection) -> None:
+    """
+    Um endereco por (numero_doc, certidao_id), para o upsert em lote do
+    gestor_enderecos. Repetidos: fica o de menor id (o que salvar_endereco
+    atualizava).
+    """
+    conn.execute("""
+        DELETE FROM enderecos_responsavel
+        WHERE numero_doc IS NOT NULL AND certidao_id IS NOT NULL
+          AND id NOT IN (SELECT MIN(id) FROM enderecos_responsavel
+                         WHERE numero_doc IS NOT NULL AND certidao_id IS NOT NULL
+                         GROUP BY numero_doc, certidao_id)
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_end_doc_certidao "
+                 "ON enderecos_responsavel(numero_doc, certidao_id)")
+
+
+def _m004_hash_pdf(conn: sqlite3.Connection) -> None:
+    """SHA-256 do PDF assinado no log de protocolos (peticoes_enviadas)."""
+    colunas = {c[1] for c in conn.execute("PRAGMA table_info(peticoes_enviadas)")}
+    if "hash_pdf" not in colunas:
+        conn.execute("ALTER TABLE peticoes_enviadas ADD COLUMN hash_pdf TEXT")
+
+
+def _m005_idempotencia(conn: sqlite3.Connection) -> None:
+    """
+    Chave de idempotencia do protocolo em peticoes_enviadas. Envios ja
+    registrados recebem a chave a partir de certidao_id e hash_pdf.
+    """
+    colunas = {c[1] for c in conn.execute("PRAGMA table_info(peticoes_enviadas)")}
+    if "chave_idempotencia" not in colunas:
+        conn.execute("ALTER TABLE peticoes_enviadas ADD COLUMN chave_idempotencia TEXT")
+    conn.execute("""
+        UPDATE peticoes_enviadas SET chave_idempotencia = certidao_id || ':' || hash_pdf
+        WHERE chave_idempotencia IS NULL AND hash_pdf IS NOT NULL
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_peticoes_idempotencia "
+                 "ON peticoes_enviadas(chave_idempotencia, status)")
+
+
+# (versao, descricao, funcao) -- so acrescente no fim
+MIGRACOES = (
+    (1, "indices das consultas frequentes; numero_processo unico", _m001_indices),
+    (2, "esquema de todos os modulos consolidado em banco.py", _m002_esquema_consolidado),
+    (3, "enderecos_responsavel unico por (numero_doc, certidao_id)",
+     _m003_endereco_por_certidao),
+    (4, "hash_pdf em peticoes_enviadas", _m004_hash_pdf),
+    (5, "chave de idempotencia do protocolo em peticoes_enviadas", _m005_idempotencia),
+)
+VERSAO_ESQUEMA = MIGRACOES[-1][0]
+
+
+def migrar(conn: sqlite3.Connection) -> int:
+    """
+    Leva o banco a VERSAO_ESQUEMA. Com o banco em dia, custa uma leitura de
+    user_version. Senao, cria as tabelas que faltam e aplica as migracoes
+    pendentes numa unica transacao (BEGIN IMMEDIATE: dois processos abrindo
+    o banco ao mesmo tempo nao migram duas vezes); qualquer erro desfaz tudo.
+    Retorna o user_version final.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= VERSAO_ESQUEMA:
+        return VERSAO_ESQUEMA
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        versao = conn.execute("PRAGMA user_version").fetchone()[0]
+        if versao < VERSAO_ESQUEMA:
+            _executar(conn, ESQUEMA_BASE)
+            for numero, _, migracao in MIGRACOES:
+                if numero > versao:
+                    migracao(conn)
+            conn.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return max(versao, VERSAO_ESQUEMA)
+
+
+# ============================================================
+# PLANO DAS CONSULTAS FREQUENTES (EXPLAIN QUERY PLAN)
+# ============================================================
+
+CONSULTAS_QUENTES = {
+    "responsaveis por certidao":
+        "SELECT * FROM responsaveis WHERE certidao_id = 1",
+    "responsaveis por CPF/CNPJ":
+        "SELECT id FROM responsaveis WHERE numero_doc = '0' LIMIT 1",
+    "certidao por numero_processo":
+        "SELECT id FROM certidoes WHERE numero_processo = '0'",
+    "peticao enviada da certidao":
+        "SELECT numero_processo_pje FROM peticoes_enviadas "
+        "WHERE certidao_id = 1 AND status = 'enviada' LIMIT 1",
+    "peticao pela chave de idempotencia":
+        "SELECT numero_processo_pje FROM peticoes_enviadas "
+        "WHERE chave_idempotencia = '1:0' AND status = 'enviada' LIMIT 1",
+}
+
+
+def verificar_planos(conn: sqlite3.Connection, verbose: bool = True) -> dict:
+    """
+    EXPLAIN QUERY PLAN das CONSULTAS_QUENTES. Retorna {nome: usa_indice};
+    consultas sobre tabelas ainda inexistentes ficam de fora.
+    """
+    resultado = {}
+    for nome, sql in CONSULTAS_QUENTES.items():
+        try:
+            plano = [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        except sqlite3.OperationalError:
+            continue
+        usa_indice = all("USING" in passo for passo in plano
+                         if passo.startswith(("SCAN", "SEARCH")))
+        resultado[nome] = usa_indice
+        if verbose:
+            print(f"  {'OK   ' if usa_indice else 'SCAN '} {nome}: {' | '.join(plano)}")
+    return resultado
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python banco.py [certidoes_tce.db]  -> PRAGMAs, versao do esquema e
+    #                                          plano das consultas frequentes
+    #                                          (aplica as migracoes pendentes)
+    conn = conectar(sys.argv[1] if len(sys.argv) >= 2 else DB_PATH)
+    migrar(conn)
+    for nome in ("journal_mode", "synchronous", "busy_timeout", "cache_size",
+                 "mmap_size", "temp_store", "foreign_keys", "user_version"):
+        print(f"  {nome:<13} {conn.execute(f'PRAGMA {nome}').fetchone()[0]}")
+    print()
+    planos = verificar_planos(conn)
+    conn.close()
+    sys.exit(0 if all(planos.values()) else 1)
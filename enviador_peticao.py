@@ -25,8 +25,10 @@ Novas tabelas criadas automaticamente:
 import base64
 import hashlib
 import os
+import random
 import re
 import sqlite3
+import time
 import tkinter as tk
 from datetime import datetime
 from pathlib import Path
@@ -34,6 +36,9 @@ from tkinter import filedialog, messagebox, ttk
 
 import requests
 
+from banco import conectar, migrar
+from fila_jobs import FilaJobs
+
 # ============================================================
 # CONSTANTES PJe  (idênticas ao sistema de referência)
 # ============================================================
@@ -63,26 +68,6 @@ DB_PATH   = "certidoes_tce.db"
 # BANCO DE DADOS
 # ============================================================
 
-DDL_COMARCAS = """
-CREATE TABLE IF NOT EXISTS cod_comarcas (
-    id          INTEGER PRIMARY KEY AUTOINCREMENT,
-    comarca     TEXT NOT NULL UNIQUE,
-    cod_comarca TEXT NOT NULL
-);"""
-
-DDL_PETICOES = """
-CREATE TABLE IF NOT EXISTS peticoes_enviadas (
-    id                   INTEGER PRIMARY KEY AUTOINCREMENT,
-    certidao_id          INTEGER REFERENCES certidoes(id),
-    numero_processo_pje  TEXT,
-    comarca              TEXT,
-    cod_comarca          TEXT,
-    caminho_pdf_assinado TEXT,
-    data_envio           TEXT DEFAULT CURRENT_TIMESTAMP,
-    status               TEXT DEFAULT 'enviada',
-    resposta_pje         TEXT
-);"""
-
 # Comarcas TJPI — edite/complemente via interface "Gerenciar comarcas"
 COMARCAS_PADRAO = [
     ("ALTOS",                 "8743"),
@@ -104,10 +89,8 @@ COMARCAS_PADRAO = [
 
 
 def abrir_banco(caminho: str = DB_PATH) -> sqlite3.Connection:
-    conn = sqlite3.connect(caminho)
-    conn.row_factory = sqlite3.Row
-    conn.executescript(DDL_COMARCAS + DDL_PETICOES)
-    conn.commit()
+    conn = conectar(caminho, row_factory=sqlite3.Row)
+    migrar(conn)          # cod_comarcas e peticoes_enviadas: ver banco.py
     cur = conn.cursor()
     cur.execute("SELECT COUNT(*) FROM cod_comarcas")
     if cur.fetchone()[0] == 0:
@@ -119,6 +102,55 @@ def abrir_banco(caminho: str = DB_PATH) -> sqlite3.Connection:
     return conn
 
 
+def reus_da_certidao(conn: sqlite3.Connection, cert_id: int) -> list:
+    """
+    Responsáveis não excluídos da certidão, com o endereço estruturado (se
+    houver): o importado com a própria certidão ou, na falta dele, o mais
+    recente do mesmo CPF/CNPJ.
+    """
+    return conn.execute("""
+        SELECT r.id, r.certidao_id, r.nome, r.tipo_doc, r.numero_doc, r.endereco,
+               e.tipo_logradouro, e.logradouro, e.municipio, e.uf
+        FROM responsaveis r
+        LEFT JOIN enderecos_responsavel e ON e.id = COALESCE(
+            (SELECT id FROM enderecos_responsavel
+             WHERE numero_doc = r.numero_doc AND certidao_id = r.certidao_id),
+            (SELECT MAX(id) FROM enderecos_responsavel
+             WHERE numero_doc = r.numero_doc)
+        )
+        WHERE r.certidao_id = ? AND r.excluido = 0
+    """, (cert_id,)).fetchall()
+
+
+def codigo_comarca(conn: sqlite3.Connection, comarca: str):
+    """Código PJe da comarca (tabela cod_comarcas) ou None."""
+    row = conn.execute(
+        "SELECT cod_comarca FROM cod_comarcas WHERE comarca=? LIMIT 1",
+        (comarca,)).fetchone()
+    return row[0] if row else None
+
+
+def chave_idempotencia(cert_id: int, pdf: "PdfCodificado") -> str:
+    """Chave de um protocolo: a mesma certidão com o mesmo PDF assinado."""
+    return f"{cert_id}:{pdf.sha256}"
+
+
+def registrar_peticao(conn: sqlite3.Connection, cert_id: int, comarca: str,
+                      cod_comarca: str, pdf: "PdfCodificado", status: str,
+                      resposta: str, numero_processo: str = None) -> None:
+    """Grava um envio (status 'enviada' ou 'erro') no log peticoes_enviadas."""
+    conn.execute("""
+        INSERT INTO peticoes_enviadas
+            (certidao_id, numero_processo_pje, comarca, cod_comarca,
+             caminho_pdf_assinado, hash_pdf, chave_idempotencia, data_envio,
+             status, resposta_pje)
+        VALUES (?,?,?,?,?,?,?,?,?,?)
+    """, (cert_id, numero_processo, comarca, cod_comarca, pdf.caminho,
+          pdf.sha256, chave_idempotencia(cert_id, pdf),
+          datetime.now().strftime("%Y-%m-%d %H:%M:%S"), status, resposta[:2000]))
+    conn.commit()
+
+
 # ============================================================
 # UTILITÁRIOS  (equivalentes ao sistema de referência)
 # ============================================================
@@ -136,6 +168,125 @@ def hash_file(caminho: str) -> str:
     return h.hexdigest()
 
 
+# O PDF entra no envelope em base64 lido em blocos de tamanho múltiplo de 3:
+# cada bloco codifica sem padding intermediário e a concatenação é idêntica
+# a b64encode do arquivo inteiro.
+BLOCO_BASE64 = 3 * 64 * 1024
+
+
+def tamanho_base64(n_bytes: int) -> int:
+    """Tamanho do base64 (com padding) de n_bytes."""
+    return 4 * ((n_bytes + 2) // 3)
+
+
+# Base64 do PDF até este tamanho fica em memória (lista de blocos); acima,
+# vai para um arquivo temporário, e a memória não cresce com o PDF.
+LIMITE_BASE64_MEMORIA = 16 * 1024 * 1024
+
+
+class PdfCodificado:
+    """
+    PDF assinado lido uma única vez: o arquivo é mapeado em memória (mmap)
+    e cada bloco de BLOCO_BASE64 bytes alimenta o SHA-256 e é codificado em
+    base64 na mesma passada. O base64 fica guardado — em memória até
+    LIMITE_BASE64_MEMORIA, acima disso num arquivo temporário — e cada
+    iteração (um POST, uma nova tentativa, o envio da GUI ou do lote) só
+    devolve os blocos prontos, sem reler o PDF nem recodificar. O hash e o
+    tamanho do base64 servem ao envelope SOAP (CorpoSOAP), à chave do job
+    de protocolo e ao log em peticoes_enviadas (hash_pdf).
+    """
+
+    def __init__(self, caminho: str, bloco: int = BLOCO_BASE64,
+                 limite_memoria: int = LIMITE_BASE64_MEMORIA):
+        import mmap
+        import tempfile
+        if bloco % 3:
+            raise ValueError("bloco precisa ser múltiplo de 3")
+        self.caminho = str(caminho)
+        self.bloco_base64 = 4 * bloco // 3
+        self.blocos = []
+        self._temp = None
+        h = hashlib.sha256()
+        with open(self.caminho, "rb") as f:
+            self.tamanho = os.fstat(f.fileno()).st_size
+            self.tamanho_base64 = tamanho_base64(self.tamanho)
+            if self.tamanho_base64 > limite_memoria:
+                self._temp = tempfile.TemporaryFile(prefix="peticao_b64_")
+            try:
+                if self.tamanho:        # mmap não aceita arquivo vazio
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        for inicio in range(0, self.tamanho, bloco):
+                            trecho = mm[inicio:inicio + bloco]
+                            h.update(trecho)
+                            codificado = base64.b64encode(trecho)
+                            if self._temp is None:
+                                self.blocos.append(codificado)
+                            else:
+                                self._temp.write(codificado)
+            except BaseException:
+                self.fechar()
+                raise
+        self.sha256 = h.hexdigest()
+        self._fechado = False
+
+    def __iter__(self):
+        if self._fechado:
+            raise ValueError(f"PDF já fechado: {self.caminho}")
+        if self._temp is None:
+            yield from self.blocos
+            return
+        self._temp.seek(0)
+        for codificado in iter(lambda: self._temp.read(self.bloco_base64), b""):
+            yield codificado
+
+    def fechar(self) -> None:
+        """Descarta o base64 guardado (e apaga o arquivo temporário)."""
+        self._fechado = True
+        self.blocos = []
+        if self._temp is not None:
+            self._temp.close()
+            self._temp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def __del__(self):
+        # Rede de segurança para os retornos antecipados da GUI
+        if hasattr(self, "blocos"):
+            self.fechar()
+
+
+class CorpoSOAP:
+    """
+    Envelope SOAP em partes: cabeçalho, blocos base64 do PDF e fechamento.
+    len() é o Content-Length, então o requests envia o corpo com tamanho
+    fixo (sem chunked) iterando as partes, sem montar o envelope inteiro
+    numa string. Pode ser iterado de novo (reenvio): os blocos base64 já
+    codificados saem do PdfCodificado.
+    """
+
+    def __init__(self, cabecalho: bytes, pdf: PdfCodificado, fechamento: bytes):
+        self.cabecalho  = cabecalho
+        self.pdf        = pdf
+        self.fechamento = fechamento
+        self._tamanho = len(cabecalho) + pdf.tamanho_base64 + len(fechamento)
+
+    def __len__(self) -> int:
+        return self._tamanho
+
+    def __iter__(self):
+        yield self.cabecalho
+        yield from self.pdf
+        yield self.fechamento
+
+    def para_bytes(self) -> bytes:
+        """Envelope completo em memória (depuração)."""
+        return b"".join(self)
+
+
 def valor_float(valor_str: str) -> float:
     """Converte 'R$ 167.406,32' → 167406.32"""
     s = re.sub(r"[R$\s]", "", str(valor_str or "0"))
@@ -157,16 +308,19 @@ def _esc(s: str) -> str:
 # ============================================================
 
 def _buscar_endereco(conn: sqlite3.Connection,
-                     numero_doc: str, endereco_texto: str) -> dict:
+                     numero_doc: str, endereco_texto: str,
+                     certidao_id: int = None) -> dict:
     """
-    Busca endereço estruturado em enderecos_responsavel.
+    Busca endereço estruturado em enderecos_responsavel: o da própria
+    certidão, senão o mais recente do CPF/CNPJ.
     Fallback: parseia responsaveis.endereco (texto livre).
     """
     if numero_doc:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT * FROM enderecos_responsavel WHERE numero_doc=? LIMIT 1",
-            (numero_doc,))
+        cur.execute("""
+            SELECT * FROM enderecos_responsavel WHERE numero_doc=?
+            ORDER BY certidao_id IS ? DESC, id DESC LIMIT 1
+        """, (numero_doc, certidao_id))
         row = cur.fetchone()
         if row and row["logradouro"]:
             cep  = (row["cep"] or "").replace("-", "").replace(" ", "")
@@ -221,7 +375,8 @@ def _bloco_polo_passivo(responsaveis: list, conn: sqlite3.Connection) -> str:
         tipo_pessoa  = "juridica" if tipo_doc == "CNPJ" else "fisica"
         tipo_doc_pje = "CMF" #if tipo_doc == "CNPJ" else "CMF"
 
-        end = _buscar_endereco(conn, num_doc, resp.get("endereco") or "")
+        end = _buscar_endereco(conn, num_doc, resp.get("endereco") or "",
+                               resp.get("certidao_id"))
 
         blocos.append(f"""
                 <int:parte assistenciaJudiciaria="1" intimacaoPendente="1" relacionamentoProcessual="1">
@@ -243,11 +398,20 @@ def _bloco_polo_passivo(responsaveis: list, conn: sqlite3.Connection) -> str:
     return "\n".join(blocos)
 
 
+# Ponto do envelope onde entra o conteúdo do PDF
+_MARCA_CONTEUDO = "\x00CONTEUDO_PDF\x00"
+
+
 def montar_body(certidao: dict, responsaveis: list,
                 conn: sqlite3.Connection, cod_comarca: str,
-                valor: float, conteudo_b64: str, pdf_hash: str,
-                ID_MANIFESTANTE, SENHA_MANIFEST) -> bytes:
-    """Monta o envelope SOAP exatamente como no sistema de referência."""
+                valor: float, pdf: PdfCodificado,
+                ID_MANIFESTANTE, SENHA_MANIFEST) -> CorpoSOAP:
+    """
+    Monta o envelope SOAP exatamente como no sistema de referência. O PDF
+    não é embutido numa string: o envelope é dividido em torno de
+    <int:conteudo> e os blocos base64 já codificados entram no envio
+    (ver CorpoSOAP).
+    """
     polo_passivo = _bloco_polo_passivo(responsaveis, conn)
 
     body = f"""
@@ -325,15 +489,375 @@ def montar_body(certidao: dict, responsaveis: list,
                         </tip:dadosBasicos>
                         <!-- PETIÇÃO -->
                         <!--1 or more repetitions:-->
-                        <tip:documento tipoDocumento="{TIPO_DOC_PJE}" mimetype="application/pdf" nivelSigilo="0" hash="{pdf_hash}" descricao="Petição Inicial">
+                        <tip:documento tipoDocumento="{TIPO_DOC_PJE}" mimetype="application/pdf" nivelSigilo="0" hash="{pdf.sha256}" descricao="Petição Inicial">
                             <!--Optional:-->
-                            <int:conteudo>{conteudo_b64}</int:conteudo>
+                            <int:conteudo>{_MARCA_CONTEUDO}</int:conteudo>
                         </tip:documento>
                     </ser:entregarManifestacaoProcessual>
                 </soapenv:Body>
             </soapenv:Envelope>"""
 
-    return body.encode("utf-8")
+    cabecalho, fechamento = body.split(_MARCA_CONTEUDO)
+    return CorpoSOAP(cabecalho.encode("utf-8"), pdf, fechamento.encode("utf-8"))
+
+
+# ============================================================
+# ENVIO AO PJe  (sem interface: usado pela GUI e pelo lote)
+# ============================================================
+
+TIMEOUT_PJE     = 120     # segundos de espera pela resposta
+TIMEOUT_CONEXAO = 10      # segundos para abrir a conexão (TCP + TLS)
+
+# Novas tentativas em falhas transitórias (timeout, conexão, HTTP 5xx)
+TENTATIVAS_PJE  = 4       # envios por protocolo, contando o primeiro
+ESPERA_BASE_PJE = 2.0     # segundos; dobra a cada nova tentativa
+ESPERA_MAX_PJE  = 60.0
+
+# Operação do PJe que localiza processos pelo número de origem
+# (outrosnumeros), usada para decidir se um envio sem resposta pode ser
+# repetido. CONFIGURAÇÃO OBRIGATÓRIA para que timeouts de leitura sejam
+# tentados de novo: não existe no MNI 2.2.2 básico, então só preencha com
+# uma operação que o tribunal de fato ofereça (recebe idConsultante,
+# senhaConsultante e outrosnumeros). Vem da variável de ambiente
+# PJE_OPERACAO_LOCALIZAR ou de --localizar no lote. Sem ela, as
+# credenciais nunca saem para essa consulta e um envio sem resposta
+# (timeout de leitura, HTTP 500) NUNCA é repetido: fica como 'incerto'
+# para conferência no PJe (ver protocolar_job).
+OPERACAO_LOCALIZAR = os.environ.get("PJE_OPERACAO_LOCALIZAR") or None
+
+AVISO_SEM_LOCALIZAR = (
+    "⚠️  Consulta por outrosnumeros não configurada (PJE_OPERACAO_LOCALIZAR / "
+    "--localizar): timeouts de leitura e HTTP 500 NÃO serão repetidos, e o "
+    "envio fica 'incerto' para conferência no PJe.")
+
+# Namespaces do serviço de intercomunicação 2.2.2 (os mesmos de montar_body)
+_NAMESPACES_MNI = (
+    'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:ser="http://www.cnj.jus.br/servico-intercomunicacao-2.2.2/" '
+    'xmlns:tip="http://www.cnj.jus.br/tipos-servico-intercomunicacao-2.2.2" '
+    'xmlns:int="http://www.cnj.jus.br/intercomunicacao-2.2.2"')
+
+
+def envelope_soap(operacao: str, parametros_xml: str) -> bytes:
+    """Envelope SOAP de uma operação do serviço (ser:<operacao> com os parâmetros dados)."""
+    return (f'<soapenv:Envelope {_NAMESPACES_MNI}><soapenv:Header/><soapenv:Body>'
+            f'<ser:{operacao}>{parametros_xml}</ser:{operacao}>'
+            f'</soapenv:Body></soapenv:Envelope>').encode("utf-8")
+
+
+class ClientePJe:
+    """
+    Cliente do serviço de intercomunicação do PJe. Toda operação SOAP passa
+    por uma única requests.Session: as conexões com o PJe ficam abertas
+    (keep-alive) num pool do HTTPAdapter com até `conexoes` conexões, e
+    envios seguidos ou em paralelo reaproveitam a conexão TCP/TLS já feita.
+    Com o pool cheio, a próxima requisição espera uma conexão livre
+    (pool_block), sem abrir conexões avulsas. Pode ser usado por várias
+    threads ao mesmo tempo.
+
+    gzip=True comprime o corpo das requisições (Content-Encoding: gzip);
+    o envelope deixa de ser enviado em streaming. Só ligue se o servidor
+    aceitar. As respostas já vêm comprimidas quando o servidor quiser
+    (Accept-Encoding padrão do requests).
+    """
+
+    def __init__(self, url: str = PJE_URL, conexoes: int = 1,
+                 timeout: float = TIMEOUT_PJE, gzip: bool = False,
+                 operacao_localizar: str = OPERACAO_LOCALIZAR):
+        from requests.adapters import HTTPAdapter
+
+        self.url     = url
+        self.operacao_localizar = operacao_localizar
+        self.timeout = (TIMEOUT_CONEXAO, timeout)
+        self.gzip    = gzip
+        self.sessao  = requests.Session()
+        self.sessao.headers.update({"Connection": "keep-alive"})
+        # Novas tentativas ficam com quem chama: um POST de protocolo não
+        # pode ser repetido às cegas
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, conexoes),
+                                pool_block=True, max_retries=0)
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+
+    def chamar(self, corpo):
+        """POST de um envelope (bytes ou CorpoSOAP). Retorna o requests.Response."""
+        headers = {"Content-Type": "text/xml; charset=utf-8"}
+        if self.gzip:
+            import gzip
+            corpo = gzip.compress(corpo if isinstance(corpo, bytes) else b"".join(corpo))
+            headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(len(corpo))
+        return self.sessao.post(self.url, data=corpo, headers=headers,
+                                timeout=self.timeout)
+
+    def entregar_manifestacao(self, corpo: CorpoSOAP):
+        """entregarManifestacaoProcessual: envelope de montar_body."""
+        return self.chamar(corpo)
+
+    def consultar_competencias(self, parametros_xml: str):
+        """consultarCompetencias, com os parâmetros da operação em XML."""
+        return self.chamar(envelope_soap("consultarCompetencias", parametros_xml))
+
+    def localizar_processos(self, outros_numeros: str, id_consultante: str,
+                            senha: str) -> set:
+        """
+        Números (20 dígitos) dos processos do PJe com o número de origem
+        `outros_numeros` (o processo TCE em <int:outrosnumeros>). Conjunto
+        vazio = nenhum. Levanta RuntimeError sem operação configurada (ver
+        OPERACAO_LOCALIZAR; nada é enviado) ou se o PJe não der uma resposta
+        válida (SOAP Fault, HTTP diferente de 200): "não sei" não pode ser
+        confundido com "não existe".
+        """
+        if not self.operacao_localizar:
+            raise RuntimeError("consulta por outrosnumeros não configurada")
+        resp = self.chamar(envelope_soap(self.operacao_localizar, (
+            f"<tip:idConsultante>{_esc(id_consultante)}</tip:idConsultante>"
+            f"<tip:senhaConsultante>{_esc(senha)}</tip:senhaConsultante>"
+            f"<tip:outrosnumeros>{_esc(outros_numeros)}</tip:outrosnumeros>")))
+        if resp.status_code != 200 or "Fault>" in resp.text:
+            raise RuntimeError(f"{self.operacao_localizar}: HTTP {resp.status_code}")
+        return set(re.findall(r"(?<!\d)\d{20}(?!\d)", resp.text))
+
+    def fechar(self) -> None:
+        self.sessao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def espera_backoff(tentativa: int) -> float:
+    """
+    Segundos antes da `tentativa`-ésima nova tentativa: backoff exponencial
+    (ESPERA_BASE_PJE * 2^(n-1), até ESPERA_MAX_PJE) com jitter total, para
+    que os envios de um lote não voltem todos ao mesmo tempo.
+    """
+    return random.uniform(0, min(ESPERA_MAX_PJE, ESPERA_BASE_PJE * 2 ** (tentativa - 1)))
+
+
+def _conexao_nao_aberta(exc: BaseException) -> bool:
+    """True se a falha foi antes de abrir a conexão (recusada, DNS): nada foi enviado."""
+    vistos, pilha = set(), [exc]
+    while pilha:
+        e = pilha.pop()
+        if e is None or id(e) in vistos:
+            continue
+        vistos.add(id(e))
+        if (isinstance(e, ConnectionRefusedError)
+                or type(e).__name__ in ("NewConnectionError", "NameResolutionError")):
+            return True
+        pilha += [getattr(e, "reason", None), e.__cause__, e.__context__]
+        pilha += [a for a in getattr(e, "args", ()) if isinstance(a, BaseException)]
+    return False
+
+
+def _falha_transitoria(exc: Exception = None, response=None):
+    """
+    Classifica uma falha do POST:
+      None            definitiva (não tentar de novo);
+      "nao_enviado"   o PJe não processou o pedido: timeout de conexão,
+                      conexão recusada, HTTP 502/503/504;
+      "incerto"       pode ter protocolado: timeout de leitura, conexão
+                      caída no meio, outro HTTP 5xx sem SOAP Fault.
+    """
+    if exc is not None:
+        if isinstance(exc, requests.exceptions.ConnectTimeout) or (
+                isinstance(exc, requests.exceptions.ConnectionError)
+                and _conexao_nao_aberta(exc)):
+            return "nao_enviado"
+        if isinstance(exc, (requests.exceptions.Timeout,
+                            requests.exceptions.ConnectionError)):
+            return "incerto"
+        return None
+    if response.status_code in (502, 503, 504):
+        return "nao_enviado"
+    if response.status_code >= 500 and "Fault>" not in response.text:
+        return "incerto"
+    return None
+
+
+def protocolar_job(conn: sqlite3.Connection, fila, job: dict, body: CorpoSOAP,
+                   cert_id: int, comarca_envio: str, cod_comarca: str,
+                   cliente: ClientePJe = None, credenciais: tuple = None,
+                   reenviar: bool = False, esperar=time.sleep) -> dict:
+    """
+    Passos 9-10 do envio para um job de protocolo já reivindicado: POST do
+    envelope, checkpoint da resposta, registro em peticoes_enviadas e
+    conclusão/falha do job. cliente: ClientePJe da GUI ou do lote; sem ele,
+    abre um só para este envio.
+
+    Idempotência: com a chave (certidão + hash do PDF) já registrada como
+    'enviada', não há POST. Falhas em que o PJe não processou o pedido
+    (timeout de conexão, conexão recusada, HTTP 502/503/504) são tentadas
+    de novo até TENTATIVAS_PJE vezes, com espera_backoff entre elas.
+    Quando a falha deixa dúvida se o processo foi criado (timeout de
+    leitura, HTTP 500), só há nova tentativa se o cliente tiver a consulta
+    por outrosnumeros configurada (ClientePJe.operacao_localizar, com as
+    `credenciais` (cpf, senha)) e ela confirmar que não há processo novo;
+    um processo novo encontrado é registrado como o protocolo. Sem essa
+    confirmação o job falha como 'incerto', e o próximo envio do mesmo PDF
+    também para antes do POST.
+    reenviar=True: envio pedido explicitamente pelo usuário; ignora a chave
+    já registrada e a dúvida de um envio anterior.
+
+    Retorna {"status": "enviada" | "sem_numero" | "http" | "timeout" |
+    "incerto" | "erro", "numero_processo", "status_code", "conteudo",
+    "erro", "retomado", "tentativas"}.
+    """
+    resultado = {"status": None, "numero_processo": None, "status_code": None,
+                 "conteudo": "", "erro": None, "retomado": False, "tentativas": 0}
+    chave = chave_idempotencia(cert_id, body.pdf)
+
+    # Só reaproveita a resposta se ela trouxe o número do processo; erros
+    # do PJe são reenviados normalmente
+    resposta_salva = job["checkpoints"].get("resposta")
+    registrado = None if reenviar else conn.execute("""
+        SELECT numero_processo_pje FROM peticoes_enviadas
+        WHERE chave_idempotencia = ? AND status = 'enviada' LIMIT 1
+    """, (chave,)).fetchone()
+    if (resposta_salva and resposta_salva["status_code"] == 200
+            and re.search(r"\d{20}", resposta_salva["conteudo"])):
+        resultado["retomado"] = True
+        status_code = resposta_salva["status_code"]
+        conteudo    = resposta_salva["conteudo"]
+    elif registrado:
+        fila.concluir(job["id"])
+        resultado.update(status="enviada", numero_processo=registrado[0], retomado=True)
+        return resultado
+    else:
+        avulso = cliente is None
+        if avulso:
+            cliente = ClientePJe()
+        try:
+            response = _postar_com_retentativas(conn, fila, job, body, cert_id,
+                                                cliente, credenciais, reenviar,
+                                                resultado, esperar)
+        finally:
+            if avulso:
+                cliente.fechar()
+        if response is None:
+            if resultado["status"] == "enviada":      # localizado após timeout
+                registrar_peticao(conn, cert_id, comarca_envio, cod_comarca, body.pdf,
+                                  "enviada", resultado["conteudo"],
+                                  resultado["numero_processo"])
+                fila.concluir(job["id"])
+            else:
+                fila.falhar(job["id"], resultado["erro"])
+            return resultado
+        status_code = response.status_code
+        conteudo    = response.text
+        fila.checkpoint(job["id"], "resposta",
+                        {"status_code": status_code, "conteudo": conteudo})
+    resultado.update(status_code=status_code, conteudo=conteudo)
+
+    # 10. Trata resposta  (idêntico ao ref)
+    if status_code != 200:
+        fila.falhar(job["id"], f"HTTP {status_code}")
+        resultado.update(status="http", erro=f"HTTP {status_code}")
+        return resultado
+
+    numero_processo = re.search(r"\d{20}", conteudo)
+    if numero_processo:
+        numero_processo = numero_processo.group()
+        registrar_peticao(conn, cert_id, comarca_envio, cod_comarca, body.pdf,
+                          "enviada", conteudo, numero_processo)
+        fila.concluir(job["id"])
+        resultado.update(status="enviada", numero_processo=numero_processo)
+    else:
+        registrar_peticao(conn, cert_id, comarca_envio, cod_comarca, body.pdf,
+                          "erro", conteudo)
+        fila.falhar(job["id"], "número do processo ausente na resposta")
+        resultado.update(status="sem_numero",
+                         erro="número do processo ausente na resposta")
+    return resultado
+
+
+def _postar_com_retentativas(conn, fila, job, body, cert_id, cliente,
+                             credenciais, reenviar, resultado, esperar):
+    """
+    Laço de envio de protocolar_job. Retorna o requests.Response final, ou
+    None com resultado["status"]/["erro"] preenchidos (falha, ou processo
+    localizado no PJe: status 'enviada' com o número).
+    """
+    linha = conn.execute("SELECT numero_processo FROM certidoes WHERE id = ?",
+                         (cert_id,)).fetchone()
+    numero_tce = linha[0] if linha else None
+    # Processos desta certidão que já conhecemos: um processo "encontrado"
+    # só conta se for novo (no reenvio, o anterior também tem o mesmo TCE)
+    conhecidos = {r[0] for r in conn.execute(
+        "SELECT numero_processo_pje FROM peticoes_enviadas "
+        "WHERE certidao_id = ? AND numero_processo_pje IS NOT NULL", (cert_id,))}
+
+    def processo_criado():
+        """Número do processo novo no PJe, "" se não há, None se não deu para saber."""
+        if not (cliente.operacao_localizar and credenciais and numero_tce):
+            return None
+        try:
+            novos = cliente.localizar_processos(numero_tce, *credenciais) - conhecidos
+        except Exception as exc:
+            print(f"  Verificação por outrosnumeros indisponível: {exc}")
+            return None
+        return min(novos) if novos else ""
+
+    def resolver_duvida() -> bool:
+        """
+        Depois de uma falha que pode ter protocolado: True se resultado já
+        tem a resposta final (processo localizado ou impossível verificar),
+        False se o PJe confirmou que não há processo novo (pode reenviar).
+        """
+        numero = processo_criado()
+        if numero is None:
+            resultado.update(status="incerto", erro=(
+                f"{resultado['erro'] or 'envio anterior sem resposta'}: não foi "
+                f"possível verificar se o processo foi criado; confira no PJe "
+                f"antes de reenviar"))
+            return True
+        if numero:
+            resultado.update(status="enviada", numero_processo=numero, erro=None,
+                             conteudo=f"processo localizado no PJe por "
+                                      f"outrosnumeros={numero_tce}")
+            return True
+        return False
+
+    # Envio anterior terminou em dúvida (ver abaixo): verifica antes do POST,
+    # a menos que o usuário tenha pedido o reenvio
+    incerto = bool(job["checkpoints"].get("envio_incerto"))
+    if incerto and not reenviar and resolver_duvida():
+        return None
+
+    for tentativa in range(1, TENTATIVAS_PJE + 1):
+        if tentativa > 1:
+            esperar(espera_backoff(tentativa - 1))
+            fila.renovar(job["id"])
+
+        resultado["tentativas"] = tentativa
+        try:
+            response = cliente.entregar_manifestacao(body)
+        except Exception as exc:
+            tipo = _falha_transitoria(exc)
+            erro = ("timeout" if isinstance(exc, requests.exceptions.Timeout)
+                    else str(exc) or type(exc).__name__)
+            resultado.update(status="timeout" if erro == "timeout" else "erro", erro=erro)
+        else:
+            tipo = _falha_transitoria(response=response)
+            if tipo is None:
+                return response
+            resultado.update(status="http", erro=f"HTTP {response.status_code}",
+                             status_code=response.status_code, conteudo=response.text)
+        if tipo is None:
+            return None
+        print(f"  Protocolo da certidão {cert_id}: {resultado['erro']} "
+              f"(tentativa {tentativa}/{TENTATIVAS_PJE})")
+        if tipo == "incerto":
+            if not incerto:
+                incerto = True
+                fila.checkpoint(job["id"], "envio_incerto",
+                                {"erro": resultado["erro"], "em": time.time()})
+            if resolver_duvida():
+                return None
+    return None
 
 
 # ============================================================
@@ -362,6 +886,7 @@ class EnviadorApp(tk.Toplevel):
         super().__init__(master)
         self.db_path       = db_path
         self.conn          = abrir_banco(db_path)
+        self.pje           = ClientePJe()   # conexão reaproveitada entre envios
         self._certidao     = None   # sqlite3.Row da certidão selecionada
         self._responsaveis = []     # sqlite3.Row dos réus
 
@@ -617,18 +1142,7 @@ class EnviadorApp(tk.Toplevel):
         self.var_acordao.set(self._certidao["acordao_origem"] or "—")
 
         # Réus com endereço
-        cur.execute("""
-            SELECT r.id, r.nome, r.tipo_doc, r.numero_doc, r.endereco,
-                   e.tipo_logradouro, e.logradouro, e.municipio, e.uf
-            FROM responsaveis r
-            LEFT JOIN enderecos_responsavel e ON e.id = (
-                SELECT id FROM enderecos_responsavel
-                WHERE numero_doc = r.numero_doc
-                LIMIT 1
-            )
-            WHERE r.certidao_id = ? AND r.excluido = 0
-        """, (cert_id,))
-        self._responsaveis = cur.fetchall()
+        self._responsaveis = reus_da_certidao(self.conn, cert_id)
 
         self.tree_reus.delete(*self.tree_reus.get_children())
         for r in self._responsaveis:
@@ -695,6 +1209,7 @@ class EnviadorApp(tk.Toplevel):
             WHERE certidao_id=? AND status='enviada' LIMIT 1
         """, (cert_id,))
         row_exist = cur.fetchone()
+        reenviar  = bool(row_exist)
         if row_exist:
             ok = messagebox.askyesno(
                 "Já Protocolada",
@@ -713,18 +1228,13 @@ class EnviadorApp(tk.Toplevel):
         comarca_envio = "NUCLEO DE JUSTICA 4.0" if resposta_nucleo else comarca
 
         # 4. Busca código da comarca  (idêntico ao ref)
-        cur.execute(
-            "SELECT cod_comarca FROM cod_comarcas WHERE comarca=? LIMIT 1",
-            (comarca_envio,)
-        )
-        row_cc = cur.fetchone()
-        if not row_cc:
+        cod_comarca = codigo_comarca(self.conn, comarca_envio)
+        if not cod_comarca:
             messagebox.showerror(
                 "Erro",
                 f'Não foi encontrado nenhum código para a comarca "{comarca_envio}"'
             )
             return
-        cod_comarca = row_cc["cod_comarca"]
 
         # 5. Solicita arquivo PDF assinado  (idêntico ao ref: filedialog no fluxo)
         nomes_reus = ", ".join(r["nome"] for r in self._responsaveis)
@@ -738,8 +1248,7 @@ class EnviadorApp(tk.Toplevel):
         # 6. Converte PDF  (idêntico ao ref)
         self._set_status("Aguarde. Estou realizando a conexão com a API do PJe.")
         try:
-            conteudo_base64 = converter_para_base64(file_path1)
-            pdf_hash        = hash_file(file_path1)
+            pdf = PdfCodificado(file_path1)
         except Exception as exc:
             messagebox.showerror("Erro", f"Não foi possível ler o arquivo PDF:\n{exc}")
             return
@@ -791,7 +1300,7 @@ class EnviadorApp(tk.Toplevel):
             messagebox.showerror("Erro", "CPF e senha são obrigatórios.")
             return
         body = montar_body(dict(self._certidao), resp_dicts, self.conn,
-                           cod_comarca, valor, conteudo_base64, pdf_hash, cpf, senha)
+                           cod_comarca, valor, pdf, cpf, senha)
 
         
         # 8. Confirmação final "Deseja, realmente, enviar?"  (idêntico ao ref)
@@ -809,93 +1318,142 @@ class EnviadorApp(tk.Toplevel):
             self._set_status("Envio cancelado pelo usuário.")
             return
 
-        # 9. Envia ao PJe  (idêntico ao ref)
-        self.btn_enviar.config(state="disabled", text="Enviando…")
-        self.update_idletasks()
-
-        url     = PJE_URL
-        headers = {"Content-Type": "text/xml; charset=utf-8"}
-        response = None
-
+        # 9. Envia ao PJe como job de protocolo (fila_jobs): a resposta do PJe
+        #    vira checkpoint antes de ser gravada. Se o programa cair entre o
+        #    POST e o INSERT, o próximo envio do mesmo PDF só grava o resultado,
+        #    sem protocolar de novo.
+        fila = FilaJobs.da_conexao(self.conn)
         try:
-            response = requests.post(url, data=body, headers=headers, timeout=120)
-            print(response.text)
-        except requests.exceptions.Timeout:
+            job = fila.enfileirar(
+                "protocolo", chave_idempotencia(cert_id, pdf),
+                {"certidao_id": cert_id, "comarca": comarca_envio,
+                 "cod_comarca": cod_comarca, "arquivo": file_path1},
+                reabrir=("failed", "done"))
+            if (job["checkpoints"].get("envio_incerto") and not reenviar
+                    and not self.pje.operacao_localizar):
+                # Sem consulta no PJe para desfazer a dúvida: só o usuário decide
+                reenviar = messagebox.askyesno(
+                    "Protocolo não confirmado",
+                    "O último envio deste PDF ficou sem resposta do PJe e pode "
+                    "ter criado o processo.\nJá conferiu no PJe que o processo "
+                    "NÃO foi criado? Enviar de novo?")
+                if not reenviar:
+                    return
+            job = fila.reivindicar("protocolo", job_id=job["id"])
+            if job is None:
+                messagebox.showwarning(
+                    "Envio em andamento",
+                    "Já existe um envio deste PDF em andamento (ou interrompido há "
+                    "poucos minutos).\nAguarde alguns minutos e tente novamente.")
+                return
+        finally:
+            fila.fechar()
+        self._enviar_job_protocolo(job, body, cert_id, comarca_envio,
+                                   cod_comarca, (cpf, senha), reenviar)
+
+    def _enviar_job_protocolo(self, job, body: CorpoSOAP, cert_id: int,
+                              comarca_envio: str, cod_comarca: str,
+                              credenciais: tuple, reenviar: bool):
+        """
+        Passos 9-10 de enviar_peticao (ver protocolar_job) numa thread: as
+        novas tentativas (esperas e timeouts) não travam a janela. A thread
+        usa conexão e fila próprias; o resultado volta pela fila `saida`,
+        lida no loop do Tk.
+        """
+        import queue
+        import threading
+
+        self.btn_enviar.config(state="disabled", text="Enviando…")
+        self._set_status("Enviando ao PJe…")
+        saida = queue.Queue()
+
+        def trabalho():
+            conn = fila = None
+            try:
+                conn = conectar(self.db_path, row_factory=sqlite3.Row)
+                fila = FilaJobs(self.db_path)
+                res = protocolar_job(conn, fila, job, body, cert_id,
+                                     comarca_envio, cod_comarca, cliente=self.pje,
+                                     credenciais=credenciais, reenviar=reenviar)
+            except Exception as exc:
+                res = {"status": "erro", "numero_processo": None, "status_code": None,
+                       "conteudo": "", "erro": str(exc), "retomado": False,
+                       "tentativas": 0}
+            finally:
+                body.pdf.fechar()
+                if fila is not None:
+                    fila.fechar()
+                if conn is not None:
+                    conn.close()
+            saida.put(res)
+
+        def aguardar():
+            try:
+                res = saida.get_nowait()
+            except queue.Empty:
+                self.after(200, aguardar)
+                return
             self.btn_enviar.config(state="normal", text="⚡  ENVIAR PETIÇÃO AO PJe")
+            self._resultado_protocolo(res, cert_id)
+
+        threading.Thread(target=trabalho, daemon=True).start()
+        self.after(200, aguardar)
+
+    def _resultado_protocolo(self, res: dict, cert_id: int):
+        """Mensagens da GUI para o resultado de protocolar_job."""
+        if res["retomado"]:
+            self._set_status("Envio interrompido retomado: resposta do PJe já recebida.")
+        elif res["conteudo"]:
+            print(res["conteudo"])
+
+        if res["status"] == "enviada":
+            numero_processo = res["numero_processo"]
+            messagebox.showinfo(
+                "Info",
+                f"Inicial protocolizada com sucesso.\n"
+                f"Processo Nº {numero_processo} criado com sucesso.\n"
+                f"Salvei no Banco de Dados."
+            )
+            self._set_status(
+                f"✅ Protocolada! Processo PJe: {numero_processo}",
+                cor=CORES["success"])
+            self._carregar_certidoes()
+            self.tree_cert.selection_set(str(cert_id))
+            self._ao_selecionar()
+
+        elif res["status"] == "sem_numero":
+            messagebox.showerror(
+                "Erro",
+                "Algo deu errado. Verifique no terminal do sistema a informação.\n"
+                "Em seguida, tente novamente."
+            )
+            self._set_status("❌ Número do protocolo não encontrado na resposta do PJe.")
+
+        elif res["status"] == "timeout":
             messagebox.showerror("Erro",
-                "Timeout: o servidor PJe não respondeu em 2 minutos.\nTente novamente.")
+                f"Timeout: o servidor PJe não respondeu após {res['tentativas']} "
+                f"tentativa(s).\nTente novamente.")
             self._set_status("❌ Timeout na conexão com o PJe.")
-            return
-        except Exception as exc:
-            self.btn_enviar.config(state="normal", text="⚡  ENVIAR PETIÇÃO AO PJe")
-            messagebox.showerror("Erro",
-                f"Ocorreu um erro ao tentar enviar a Petição Inicial ao PJe:\n{exc}")
-            self._set_status(f"❌ Erro: {exc}")
-            return
 
-        self.btn_enviar.config(state="normal", text="⚡  ENVIAR PETIÇÃO AO PJe")
-
-        # 10. Trata resposta  (idêntico ao ref)
-        if response.status_code == 200:
-            conteudo      = response.text
-            numero_processo = re.search(r"\d{20}", conteudo)
-
-            if numero_processo:
-                numero_processo = numero_processo.group()
-                self._set_status("Estou finalizando. Salvando dados do protocolo.")
-                self.update_idletasks()
-
-                # Salva no banco
-                self.conn.execute("""
-                    INSERT INTO peticoes_enviadas
-                        (certidao_id, numero_processo_pje, comarca, cod_comarca,
-                         caminho_pdf_assinado, data_envio, status, resposta_pje)
-                    VALUES (?,?,?,?,?,?,?,?)
-                """, (cert_id, numero_processo, comarca_envio, cod_comarca,
-                      file_path1, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                      "enviada", conteudo[:2000]))
-                self.conn.commit()
-
-                messagebox.showinfo(
-                    "Info",
-                    f"Inicial protocolizada com sucesso.\n"
-                    f"Processo Nº {numero_processo} criado com sucesso.\n"
-                    f"Salvei no Banco de Dados."
-                )
-                self._set_status(
-                    f"✅ Protocolada! Processo PJe: {numero_processo}",
-                    cor=CORES["success"])
-                self._carregar_certidoes()
-                self.tree_cert.selection_set(str(cert_id))
-                self._ao_selecionar()
+        elif res["status"] == "incerto":
+            messagebox.showwarning("Protocolo não confirmado",
+                f"{res['erro']}.\n\nO PJe pode ter criado o processo: confira no "
+                f"PJe antes de enviar de novo.")
+            self._set_status("⚠ Protocolo não confirmado: confira no PJe.")
 
-            else:
-                # Registra erro
-                self.conn.execute("""
-                    INSERT INTO peticoes_enviadas
-                        (certidao_id, comarca, cod_comarca, caminho_pdf_assinado,
-                         data_envio, status, resposta_pje)
-                    VALUES (?,?,?,?,?,?,?)
-                """, (cert_id, comarca_envio, cod_comarca, file_path1,
-                      datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                      "erro", conteudo[:2000]))
-                self.conn.commit()
-
-                messagebox.showerror(
-                    "Erro",
-                    "Algo deu errado. Verifique no terminal do sistema a informação.\n"
-                    "Em seguida, tente novamente."
-                )
-                self._set_status("❌ Número do protocolo não encontrado na resposta do PJe.")
-                print(conteudo)   # debug: resposta completa no terminal
+        elif res["status"] == "erro":
+            messagebox.showerror("Erro",
+                f"Ocorreu um erro ao tentar enviar a Petição Inicial ao PJe:\n{res['erro']}")
+            self._set_status(f"❌ Erro: {res['erro']}")
 
         else:
+            status_code = res["status_code"]
             messagebox.showerror(
                 "Erro",
                 "Que Pena 😞 Ocorreu um erro ao tentar enviar a Petição ao PJe.\n"
-                f"HTTP {response.status_code}"
+                f"HTTP {status_code}"
             )
-            self._set_status(f"❌ Erro HTTP {response.status_code}.")
+            self._set_status(f"❌ Erro HTTP {status_code}.")
 
     # ── Gerenciador de comarcas ────────────────────────────────
 
@@ -1023,6 +1581,208 @@ class GerenciadorComarcas(tk.Toplevel):
             self._carregar()
 
 
+# ============================================================
+# PROTOCOLO EM LOTE  (linha de comando, sem diálogos)
+# ============================================================
+
+WORKERS_LOTE = 4        # envios simultâneos ao PJe
+
+
+def ler_manifesto_protocolo(origem: str) -> list:
+    """
+    Itens {certidao_id, comarca, pdf} de um manifesto .csv (cabeçalho
+    certidao_id,comarca,pdf) ou .jsonl (um objeto por linha, mesmas chaves).
+    comarca é o nome cadastrado em cod_comarcas (ex.: TERESINA ou
+    NUCLEO DE JUSTICA 4.0); pdf é a inicial assinada. Caminhos relativos
+    são resolvidos a partir da pasta do manifesto.
+    """
+    import csv
+    import json
+
+    origem = Path(origem)
+    with open(origem, encoding="utf-8-sig", newline="") as f:
+        if origem.suffix.lower() == ".jsonl":
+            brutos = [json.loads(l) for l in f if l.strip()]
+        else:
+            brutos = list(csv.DictReader(f))
+
+    def resolver(valor):
+        valor = str(valor or "").strip()
+        if not valor:
+            return ""
+        caminho = Path(valor)
+        return str(caminho if caminho.is_absolute() else origem.parent / caminho)
+
+    return [{"certidao_id": int(b["certidao_id"]),
+             "comarca": str(b.get("comarca") or "").strip().upper(),
+             "pdf": resolver(b.get("pdf"))}
+            for b in brutos if str(b.get("certidao_id") or "").strip()]
+
+
+def _protocolar_item(caminho_db: str, item: dict, cpf: str, senha: str,
+                     cliente: ClientePJe, reenviar: bool) -> dict:
+    """
+    Worker do lote: passos 1-10 de enviar_peticao para um item do
+    manifesto, com conexão e fila próprias (uma por thread). Não propaga
+    exceções: o erro fica no resultado.
+    """
+    t0 = time.perf_counter()
+    res = {**item, "numero_tce": None, "numero_processo": None,
+           "status": "erro", "erro": None, "tempo": 0.0}
+    conn = fila = pdf = None
+    try:
+        conn = conectar(caminho_db, row_factory=sqlite3.Row)
+        fila = FilaJobs(caminho_db)
+        cert_id = item["certidao_id"]
+
+        certidao = conn.execute("SELECT * FROM certidoes WHERE id=?",
+                                (cert_id,)).fetchone()
+        if not certidao:
+            res["erro"] = "certidão não encontrada"
+            return res
+        res["numero_tce"] = certidao["numero_processo"]
+        reus = reus_da_certidao(conn, cert_id)
+        if not reus:
+            res["erro"] = "nenhum réu remanescente"
+            return res
+
+        existente = conn.execute("""
+            SELECT numero_processo_pje FROM peticoes_enviadas
+            WHERE certidao_id=? AND status='enviada' LIMIT 1
+        """, (cert_id,)).fetchone()
+        if existente and not reenviar:
+            res.update(status="já protocolada",
+                       numero_processo=existente["numero_processo_pje"])
+            return res
+
+        cod_comarca = codigo_comarca(conn, item["comarca"])
+        if not cod_comarca:
+            res["erro"] = f'comarca "{item["comarca"]}" sem código'
+            return res
+        try:
+            pdf = PdfCodificado(item["pdf"])
+        except OSError as exc:
+            res["erro"] = f"PDF ilegível: {exc}"
+            return res
+
+        valor = round(valor_float(certidao["valor_atualizado"]), 2)
+        body = montar_body(dict(certidao), [dict(r) for r in reus], conn,
+                           cod_comarca, valor, pdf, cpf, senha)
+
+        job = fila.enfileirar(
+            "protocolo", chave_idempotencia(cert_id, pdf),
+            {"certidao_id": cert_id, "comarca": item["comarca"],
+             "cod_comarca": cod_comarca, "arquivo": pdf.caminho},
+            reabrir=("failed", "done") if reenviar else ("failed",))
+        if job["estado"] == "done":
+            res["status"] = "já protocolada"
+            return res
+        job = fila.reivindicar("protocolo", job_id=job["id"])
+        if job is None:
+            res["status"] = "em andamento"
+            return res
+
+        r = protocolar_job(conn, fila, job, body, cert_id, item["comarca"],
+                           cod_comarca, cliente=cliente, credenciais=(cpf, senha),
+                           reenviar=reenviar)
+        res.update(status=r["status"] if r["status"] in ("enviada", "incerto") else "erro",
+                   numero_processo=r["numero_processo"], erro=r["erro"])
+    except Exception as exc:
+        res.update(status="erro", erro=str(exc))
+    finally:
+        if pdf is not None:
+            pdf.fechar()
+        if fila is not None:
+            fila.fechar()
+        if conn is not None:
+            conn.close()
+        res["tempo"] = time.perf_counter() - t0
+    return res
+
+
+def protocolar_lote(origem, cpf: str, senha: str, caminho_db: str = DB_PATH,
+                    workers: int = WORKERS_LOTE, reenviar: bool = False,
+                    gzip: bool = False,
+                    operacao_localizar: str = OPERACAO_LOCALIZAR) -> list:
+    """
+    Protocola no PJe as certidões de um manifesto (ver
+    ler_manifesto_protocolo) sem diálogos: as credenciais do manifestante
+    valem para o lote todo, e até `workers` envios correm ao mesmo tempo
+    por um único ClientePJe (conexões reaproveitadas; gzip: ver
+    ClientePJe). Cada envio é
+    um job 'protocolo' na fila (como na GUI), então um lote interrompido
+    pode ser rodado de novo sem protocolar em dobro. Certidões já
+    protocoladas são puladas, a menos que reenviar=True.
+    operacao_localizar: ver OPERACAO_LOCALIZAR; sem ela, um envio sem
+    resposta nunca é repetido.
+    origem: manifesto .csv/.jsonl ou lista de itens já lida.
+    Retorna a lista de resultados (um dict por item, na ordem da origem).
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    itens = (ler_manifesto_protocolo(origem) if isinstance(origem, (str, Path))
+             else list(origem))
+    if not itens:
+        print("Nenhuma certidão no manifesto.")
+        return []
+    abrir_banco(caminho_db).close()     # migra e semeia as comarcas antes das threads
+    workers = max(1, min(workers, len(itens)))
+    print(f"📨 Protocolo em lote: {len(itens)} certidão(ões), "
+          f"{workers} envio(s) simultâneo(s)")
+    if not operacao_localizar:
+        print(AVISO_SEM_LOCALIZAR)
+    t_lote = time.perf_counter()
+
+    # Certidão repetida no manifesto: só a primeira linha vale (duas threads
+    # com PDFs diferentes protocolariam a mesma certidão duas vezes)
+    resultados = [None] * len(itens)
+    vistas = set()
+    for i, it in enumerate(itens):
+        if it["certidao_id"] in vistas:
+            resultados[i] = {**it, "numero_tce": None, "numero_processo": None,
+                             "status": "erro", "erro": "certidão repetida no manifesto",
+                             "tempo": 0.0}
+        vistas.add(it["certidao_id"])
+
+    cliente = ClientePJe(conexoes=workers, gzip=gzip,
+                         operacao_localizar=operacao_localizar)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futuros = {pool.submit(_protocolar_item, caminho_db, it, cpf, senha,
+                               cliente, reenviar): i
+                   for i, it in enumerate(itens) if resultados[i] is None}
+        for n, fut in enumerate(as_completed(futuros), 1):
+            r = resultados[futuros[fut]] = fut.result()
+            print(f"  [{n}/{len(futuros)}] certidão {r['certidao_id']}: {r['status']}"
+                  f"{' ' + r['numero_processo'] if r['numero_processo'] else ''}"
+                  f"{' (' + r['erro'] + ')' if r['erro'] else ''}")
+    finally:
+        # Interrompido (Ctrl+C): termina os envios em curso e não começa os demais
+        pool.shutdown(wait=True, cancel_futures=True)
+        cliente.fechar()
+
+    _imprimir_resumo_protocolo(resultados, time.perf_counter() - t_lote)
+    return resultados
+
+
+def _imprimir_resumo_protocolo(resultados: list, total: float) -> None:
+    print()
+    print(f"{'Certidão':>8}  {'Processo TCE':<16} {'Comarca':<22} "
+          f"{'Processo PJe':<20} {'Tempo':>6}  Status")
+    print("-" * 100)
+    for r in resultados:
+        print(f"{r['certidao_id']:>8}  {(r['numero_tce'] or '-')[:16]:<16} "
+              f"{r['comarca'][:22]:<22} {(r['numero_processo'] or '-'):<20} "
+              f"{r['tempo']:5.1f}s  {r['status']}"
+              f"{': ' + r['erro'] if r['erro'] else ''}")
+    contagem = {}
+    for r in resultados:
+        contagem[r["status"]] = contagem.get(r["status"], 0) + 1
+    print("-" * 100)
+    print(f"{len(resultados)} certidão(ões) em {total:.1f}s — "
+          + ", ".join(f"{n} {status}" for status, n in sorted(contagem.items())))
+
+
 # ============================================================
 # PONTO DE ENTRADA
 # ============================================================
@@ -1040,6 +1800,56 @@ def abrir_enviador(master=None, db_path: str = DB_PATH) -> "EnviadorApp":
 
 if __name__ == "__main__":
     import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--lote":
+        import getpass
+
+        uso = (
+            "Uso: python enviador_peticao.py --lote manifesto.csv [certidoes_tce.db]\n"
+            "         [--workers N] [--reenviar] [--sim] [--gzip] [--localizar OPERACAO]\n"
+            "  --localizar OPERACAO  operação do PJe que consulta processos por\n"
+            "                        outrosnumeros (ou PJE_OPERACAO_LOCALIZAR).\n"
+            "                        Sem ela, timeouts de leitura e HTTP 500 nunca\n"
+            "                        são repetidos: o envio fica 'incerto'.")
+        args = sys.argv[2:]
+        n_workers = WORKERS_LOTE
+        operacao = OPERACAO_LOCALIZAR
+        for opcao in ("--workers", "--localizar"):
+            if opcao in args:
+                i = args.index(opcao)
+                if i + 1 >= len(args):
+                    sys.exit(uso)
+                if opcao == "--workers":
+                    if not args[i + 1].isdigit():
+                        sys.exit(uso)
+                    n_workers = int(args[i + 1])
+                else:
+                    operacao = args[i + 1]
+                del args[i:i + 2]
+        reenviar = "--reenviar" in args
+        sem_confirmacao = "--sim" in args
+        comprimir = "--gzip" in args
+        args = [a for a in args if a not in ("--reenviar", "--sim", "--gzip")]
+        if not args or args[0] in ("-h", "--help"):
+            sys.exit(uso)
+        manifesto = args[0]
+        db = args[1] if len(args) > 1 else DB_PATH
+
+        itens = ler_manifesto_protocolo(manifesto)
+        print(f"{len(itens)} certidão(ões) no manifesto {manifesto}")
+        cpf   = input("CPF do Manifestante: ").strip()
+        senha = getpass.getpass("Senha do Manifestante: ").strip()
+        if not cpf or not senha:
+            sys.exit("CPF e senha são obrigatórios.")
+        if not sem_confirmacao and input(
+                f"Deseja, realmente, enviar {len(itens)} inicial(is) para "
+                f"protocolo? [s/N] ").strip().lower() not in ("s", "sim"):
+            sys.exit("Envio cancelado pelo usuário.")
+        resultados = protocolar_lote(itens, cpf, senha, caminho_db=db,
+                                     workers=n_workers, reenviar=reenviar,
+                                     gzip=comprimir, operacao_localizar=operacao)
+        sys.exit(1 if any(r["status"] in ("erro", "incerto") for r in resultados) else 0)
+
     db   = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
     root = tk.Tk()
     root.withdraw()
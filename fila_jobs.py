@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fila_jobs.py  --  v1.0
+======================
+Fila de trabalhos persistente no proprio certidoes_tce.db.
+
+Cada job tem um tipo ('certidao' = extracao/geracao da peticao,
+'protocolo' = envio ao PJe), uma chave que identifica o trabalho (repetir
+a mesma chave nao cria outro job), um payload JSON e checkpoints por etapa.
+Se o processo morrer no meio, o lease do job expira e o proximo worker que
+o reivindicar recomeca da ultima etapa gravada (ex.: depois do OCR, sem
+refaze-lo).
+
+Estados: queued -> running -> done
+                          \\-> queued (nova tentativa) / failed (esgotou)
+
+A reivindicacao e atomica (BEGIN IMMEDIATE): varios processos podem
+consumir a mesma fila sem pegar o mesmo job.
+"""
+
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import time
+
+from banco import conectar, migrar
+
+
+LEASE_PADRAO = 300.0      # segundos; renove (renovar/checkpoint) antes de vencer
+
+
+def identificador_worker() -> str:
+    """Dono dos leases deste processo: host:pid."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _job(linha) -> dict:
+    job = dict(linha)
+    job["payload"] = json.loads(job["payload"])
+    job["checkpoints"] = json.loads(job["checkpoints"])
+    return job
+
+
+class FilaJobs:
+    """
+    Acesso a tabela jobs. Abre a propria conexao (em autocommit, para
+    controlar as transacoes), entao pode ser usada em qualquer processo.
+    """
+
+    def __init__(self, caminho_db: str, dono: str = None):
+        self.caminho_db = caminho_db
+        self.dono = dono or identificador_worker()
+        self.conn = conectar(caminho_db, row_factory=sqlite3.Row, timeout=30,
+                             isolation_level=None)
+        migrar(self.conn)        # tabela jobs: ver banco.py
+
+    @classmethod
+    def da_conexao(cls, conn: sqlite3.Connection, dono: str = None) -> "FilaJobs":
+        """Fila no mesmo arquivo de banco de uma conexao ja aberta."""
+        for _, nome, arquivo in conn.execute("PRAGMA database_list"):
+            if nome == "main" and arquivo:
+                return cls(arquivo, dono)
+        raise ValueError("A fila de jobs precisa de um banco em arquivo.")
+
+    def fechar(self) -> None:
+        self.conn.close()
+
+    # ── Escrita ──────────────────────────────────────────────
+
+    def enfileirar(self, tipo: str, chave: str, payload: dict = None,
+                   max_tentativas: int = 3, reabrir: tuple = ("failed",)) -> dict:
+        """
+        Cria o job (tipo, chave), ou devolve o existente. Um job existente
+        num dos estados de `reabrir` volta para a fila com as tentativas
+        zeradas; 'done' em reabrir tambem apaga os checkpoints (refazer
+        tudo). Retorna o job.
+        """
+        agora = time.time()
+        with self._transacao():
+            self.conn.execute("""
+                INSERT OR IGNORE INTO jobs
+                    (tipo, chave, payload, max_tentativas, criado_em, atualizado_em)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (tipo, chave, json.dumps(payload or {}, ensure_ascii=False),
+                  max_tentativas, agora, agora))
+            if reabrir:
+                marcadores = ",".join("?" * len(reabrir))
+                self.conn.execute(f"""
+                    UPDATE jobs SET estado = 'queued', tentativas = 0, erro = NULL,
+                           dono = NULL, lease_ate = NULL, atualizado_em = ?,
+                           checkpoints = CASE WHEN estado = 'done' THEN '{{}}'
+                                              ELSE checkpoints END
+                    WHERE tipo = ? AND chave = ? AND estado IN ({marcadores})
+                """, (agora, tipo, chave, *reabrir))
+            linha = self.conn.execute(
+                "SELECT * FROM jobs WHERE tipo = ? AND chave = ?", (tipo, chave)).fetchone()
+        return _job(linha)
+
+    def reivindicar(self, tipo: str, lease: float = LEASE_PADRAO,
+                    job_id: int = None):
+        """
+        Pega atomicamente o proximo job do tipo: na fila, ou 'running' com
+        lease vencido (o dono morreu). Com job_id, tenta so esse job.
+        Jobs com lease vencido e sem tentativas restantes viram 'failed'.
+        Retorna o job (dict, com payload e checkpoints ja decodificados)
+        ou None.
+        """
+        agora = time.time()
+        filtro_id = "AND id = ?" if job_id is not None else ""
+        params = (tipo, agora) + ((job_id,) if job_id is not None else ())
+        with self._transacao():
+            self.conn.execute("""
+                UPDATE jobs SET estado = 'failed', dono = NULL, lease_ate = NULL,
+                       erro = COALESCE(erro, 'lease expirado apos a ultima tentativa'),
+                       atualizado_em = ?
+                WHERE tipo = ? AND estado = 'running' AND lease_ate < ?
+                  AND tentativas >= max_tentativas
+            """, (agora, tipo, agora))
+            linha = self.conn.execute(f"""
+                SELECT id FROM jobs
+                WHERE tipo = ?
+                  AND (estado = 'queued' OR (estado = 'running' AND lease_ate < ?))
+                  {filtro_id}
+                ORDER BY id LIMIT 1
+            """, params).fetchone()
+            if linha is None:
+                return None
+            self.conn.execute("""
+                UPDATE jobs SET estado = 'running', dono = ?, lease_ate = ?,
+                       tentativas = tentativas + 1, atualizado_em = ?
+                WHERE id = ?
+            """, (self.dono, agora + lease, agora, linha["id"]))
+            job = self.conn.execute("SELECT * FROM jobs WHERE id = ?",
+                                    (linha["id"],)).fetchone()
+        return _job(job)
+
+    def renovar(self, job_id: int, lease: float = LEASE_PADRAO) -> bool:
+        """Estende o lease; False se o job nao pertence mais a este dono."""
+        cur = self.conn.execute("""
+            UPDATE jobs SET lease_ate = ?, atualizado_em = ?
+            WHERE id = ? AND dono = ? AND estado = 'running'
+        """, (time.time() + lease, time.time(), job_id, self.dono))
+        return cur.rowcount == 1
+
+    def checkpoint(self, job_id: int, etapa: str, resultado,
+                   lease: float = LEASE_PADRAO) -> None:
+        """Grava o resultado (JSON) de uma etapa concluida e renova o lease."""
+        agora = time.time()
+        self.conn.execute("""
+            UPDATE jobs SET checkpoints = json_set(checkpoints, '$.' || ?, json(?)),
+                   lease_ate = ?, atualizado_em = ?
+            WHERE id = ? AND dono = ?
+        """, (etapa, json.dumps(resultado, ensure_ascii=False), agora + lease,
+              agora, job_id, self.dono))
+
+    def concluir(self, job_id: int) -> None:
+        self.conn.execute("""
+            UPDATE jobs SET estado = 'done', dono = NULL, lease_ate = NULL,
+                   erro = NULL, atualizado_em = ?
+            WHERE id = ? AND dono = ?
+        """, (time.time(), job_id, self.dono))
+
+    def falhar(self, job_id: int, erro: str) -> str:
+        """
+        Registra a falha. Volta para a fila se ainda houver tentativas,
+        senao fica 'failed'. Os checkpoints sao mantidos. Retorna o estado.
+        """
+        with self._transacao():
+            self.conn.execute("""
+                UPDATE jobs SET
+                    estado = CASE WHEN tentativas < max_tentativas
+                                  THEN 'queued' ELSE 'failed' END,
+                    dono = NULL, lease_ate = NULL, erro = ?, atualizado_em = ?
+                WHERE id = ? AND dono = ?
+            """, (erro[-4000:], time.time(), job_id, self.dono))
+            linha = self.conn.execute("SELECT estado FROM jobs WHERE id = ?",
+                                      (job_id,)).fetchone()
+        return linha["estado"] if linha else "failed"
+
+    # ── Leitura ──────────────────────────────────────────────
+
+    def obter(self, tipo: str, chave: str):
+        linha = self.conn.execute(
+            "SELECT * FROM jobs WHERE tipo = ? AND chave = ?", (tipo, chave)).fetchone()
+        return _job(linha) if linha else None
+
+    def resumo(self, tipo: str = None) -> dict:
+        """{estado: quantidade}, de um tipo ou de todos."""
+        sql = "SELECT estado, COUNT(*) FROM jobs"
+        params = ()
+        if tipo:
+            sql += " WHERE tipo = ?"
+            params = (tipo,)
+        return dict(self.conn.execute(sql + " GROUP BY estado", params).fetchall())
+
+    # ── Interno ──────────────────────────────────────────────
+
+    @contextlib.contextmanager
+    def _transacao(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python fila_jobs.py [certidoes_tce.db]  -> resumo da fila
+    fila = FilaJobs(sys.argv[1] if len(sys.argv) >= 2 else "certidoes_tce.db")
+    for linha in fila.conn.execute("""
+            SELECT tipo, estado, COUNT(*) AS n, MAX(tentativas) AS max_tent
+            FROM jobs GROUP BY tipo, estado ORDER BY tipo, estado"""):
+        print(f"  {linha['tipo']:<10} {linha['estado']:<8} {linha['n']:>5}  "
+              f"(ate {linha['max_tent']} tentativa(s))")
+    fila.fechar()
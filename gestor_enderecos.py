@@ -23,11 +23,16 @@ Colunas do PDF de enderecos:
 """
 
 import re
+import json
 import sqlite3
 import os
+import hashlib
+import time
 from dataclasses import dataclass
 from typing import Optional
 
+from banco import conectar, migrar
+
 
 # ============================================================
 # ESTRUTURAS DE DADOS
@@ -93,6 +98,23 @@ class ParteComEndereco:
     endereco: Optional[EnderecoEstruturado] = None
 
 
+def partes_para_json(partes: list) -> list:
+    """Lista de ParteComEndereco -> lista de dicts (serializavel em JSON)."""
+    from dataclasses import asdict
+    return [asdict(p) for p in partes]
+
+
+def partes_de_json(dados: list) -> list:
+    """Inverso de partes_para_json."""
+    partes = []
+    for d in dados:
+        d = dict(d)
+        if d.get("endereco"):
+            d["endereco"] = EnderecoEstruturado(**d["endereco"])
+        partes.append(ParteComEndereco(**d))
+    return partes
+
+
 # ============================================================
 # TIPOS DE LOGRADOURO
 # ============================================================
@@ -190,7 +212,347 @@ def parsear_endereco(endereco_bruto: str) -> EnderecoEstruturado:
 
 
 # ============================================================
-# OCR POR CELULA
+# DOCUMENTO PDF (handle compartilhado pelas etapas)
+# ============================================================
+
+class DocumentoPDF:
+    """
+    Handle unico de um PDF, compartilhado por todas as etapas do pipeline
+    (texto, OCR, tabela, montagem do PDF final).
+
+    O arquivo e aberto uma vez e mapeado em memoria (mmap). O SHA-256, o
+    pdfplumber, o texto de cada pagina e o PdfReader (pypdf) sao criados
+    sob demanda e reaproveitados. pdfplumber e pypdf recebem cada um sua
+    propria visao do mesmo mapeamento (posicao de leitura independente),
+    sem copiar os bytes. A rasterizacao roda no poppler, em outro processo,
+    e por isso le o arquivo pelo caminho.
+
+    Use como context manager ou chame fechar(). Paginas do pypdf ja
+    adicionadas a um PdfWriter dependem do documento aberto ate o write().
+    """
+
+    def __init__(self, caminho: str):
+        import mmap
+        self.caminho  = str(caminho)
+        self._arquivo = open(self.caminho, "rb")
+        try:
+            self._mmap = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._arquivo.close()
+            raise
+        self._visoes  = []
+        self._sha256  = None
+        self._plumber = None
+        self._pypdf   = None
+        self._textos  = {}
+
+    def _nova_visao(self):
+        """Outro mmap do mesmo arquivo: mesmas paginas de memoria, posicao propria."""
+        import mmap
+        visao = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        self._visoes.append(visao)
+        return visao
+
+    @property
+    def tamanho(self) -> int:
+        return len(self._mmap)
+
+    @property
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self._mmap).hexdigest()
+        return self._sha256
+
+    @property
+    def plumber(self):
+        """pdfplumber.PDF aberto sobre o mapeamento (criado no primeiro uso)."""
+        if self._plumber is None:
+            import pdfplumber
+            self._plumber = pdfplumber.open(self._nova_visao())
+        return self._plumber
+
+    @property
+    def n_paginas(self) -> int:
+        return len(self.plumber.pages)
+
+    def texto_pagina(self, p_idx: int) -> str:
+        """Texto da camada de texto da pagina (0-based), extraido uma vez."""
+        if p_idx not in self._textos:
+            pag = self.plumber.pages[p_idx]
+            self._textos[p_idx] = pag.extract_text() or ""
+            pag.flush_cache()
+        return self._textos[p_idx]
+
+    def renderizar(self, p_idx: int, dpi: int, poppler_path: str = None):
+        """Rasteriza uma unica pagina (0-based). Nao guarda a imagem."""
+        return _renderizar_pagina(self.caminho, p_idx, dpi, poppler_path)
+
+    @property
+    def pypdf(self):
+        """pypdf.PdfReader sobre o mapeamento (criado no primeiro uso)."""
+        if self._pypdf is None:
+            from pypdf import PdfReader
+            self._pypdf = PdfReader(self._nova_visao())
+        return self._pypdf
+
+    @property
+    def paginas_pypdf(self):
+        return self.pypdf.pages
+
+    def fechar(self) -> None:
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+        self._pypdf = None
+        for visao in self._visoes:
+            visao.close()
+        self._visoes = []
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def abrir_documento(pdf) -> tuple:
+    """
+    Aceita um caminho ou um DocumentoPDF ja aberto.
+    Retorna (documento, proprio): se proprio for True, quem chamou abriu o
+    documento e deve fecha-lo.
+    """
+    if isinstance(pdf, DocumentoPDF):
+        return pdf, False
+    return DocumentoPDF(pdf), True
+
+
+# ============================================================
+# CACHE DE OCR (SQLite, enderecado por conteudo)
+# ============================================================
+
+# Incremente ao mudar o pre-processamento das imagens: invalida o cache antigo
+_VERSAO_OCR = 2
+
+OCR_LANG    = "por+eng"
+PSM_CELULA  = 6        # bloco uniforme de texto (celulas da tabela)
+PSM_PAGINA  = 3        # segmentacao automatica (pagina inteira)
+
+DDL_CACHE_OCR = """
+CREATE TABLE IF NOT EXISTS ocr_cache (
+    chave          TEXT PRIMARY KEY,
+    texto          TEXT NOT NULL,
+    ultimo_acesso  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ocr_cache_acesso
+    ON ocr_cache(ultimo_acesso);
+CREATE TABLE IF NOT EXISTS ocr_cache_contadores (
+    nome   TEXT PRIMARY KEY,
+    valor  INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO ocr_cache_contadores (nome, valor)
+    VALUES ('acertos', 0), ('falhas', 0);
+CREATE TABLE IF NOT EXISTS geometria_cache (
+    chave  TEXT PRIMARY KEY,     -- ver chave_geometria
+    dados  TEXT NOT NULL         -- JSON: [] sem tabela, ou [n_linhas, celulas]
+);
+CREATE TABLE IF NOT EXISTS layout_modelos (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    colunas     TEXT NOT NULL,   -- JSON: fronteiras x das colunas (pontos)
+    usos        INTEGER NOT NULL DEFAULT 0,
+    ultimo_uso  REAL NOT NULL
+);
+"""
+
+# Incremente ao mudar a deteccao de tabela: invalida a geometria em cache
+_VERSAO_GEOMETRIA = 1
+
+# Distancia maxima (pontos) entre fronteiras de coluna do mesmo layout
+TOLERANCIA_LAYOUT = 2.0
+
+
+def caminho_cache_ocr(caminho_db: str = "certidoes_tce.db") -> str:
+    """Arquivo do cache de OCR: ocr_cache.db no mesmo diretorio do banco."""
+    from pathlib import Path
+    return str(Path(caminho_db).with_name("ocr_cache.db"))
+
+
+def sha256_arquivo(caminho: str) -> str:
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def chave_ocr(pdf_hash: str, pagina: int, bbox, dpi: int,
+              lang: str = OCR_LANG, psm: int = PSM_CELULA,
+              backend: str = "", mosaico: bool = False) -> str:
+    """
+    Chave do cache: SHA-256 do PDF + pagina (0-based) + bbox da celula em
+    pontos PDF (None = pagina inteira) + DPI + lingua + psm + motor de OCR
+    + modo (celula a celula ou mosaico) + versao do pre-processamento.
+    Motores e modos diferentes nao produzem o mesmo texto, entao cada
+    combinacao tem a sua propria entrada.
+    """
+    bbox_txt = "pagina" if bbox is None else ",".join(f"{v:.2f}" for v in bbox)
+    modo = "mosaico" if mosaico else "celula"
+    bruto = (f"v{_VERSAO_OCR}|{pdf_hash}|{pagina}|{bbox_txt}|{dpi}|{lang}|{psm}"
+             f"|{backend}|{modo}")
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def chave_geometria(pdf_hash: str, pagina: int) -> str:
+    """Chave da geometria da tabela: SHA-256 do PDF + pagina + versao."""
+    bruto = f"g{_VERSAO_GEOMETRIA}|{pdf_hash}|{pagina}"
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def _mesmas_colunas(a: list, b: list) -> bool:
+    return len(a) == len(b) and all(abs(x - y) <= TOLERANCIA_LAYOUT for x, y in zip(a, b))
+
+
+class CacheOCR:
+    """
+    Cache persistente de texto OCR com descarte LRU.
+    Guarda tambem a geometria das tabelas ja detectadas (por PDF e pagina)
+    e os modelos de layout aprendidos (fronteiras x das colunas).
+
+    Cada processo (inclusive os workers do pool) abre sua propria conexao;
+    o arquivo usa WAL para aceitar leitores e gravadores concorrentes.
+    Os contadores de acertos/falhas ficam no proprio banco, somando todos
+    os processos e execucoes; self.acertos/self.falhas contam so esta instancia.
+    """
+
+    def __init__(self, caminho: str, max_entradas: int = 200_000):
+        self.caminho      = caminho
+        self.max_entradas = max_entradas
+        self.acertos      = 0
+        self.falhas       = 0
+        self._gravacoes   = 0
+        self.conn = conectar(caminho, timeout=30)
+        self.conn.executescript(DDL_CACHE_OCR)
+        self.conn.commit()
+
+    def obter(self, chaves: list) -> dict:
+        """Retorna {chave: texto} das chaves presentes e renova o acesso delas."""
+        chaves = list(dict.fromkeys(chaves))
+        if not chaves:
+            return {}
+        encontrados = {}
+        for i in range(0, len(chaves), 500):
+            lote = chaves[i:i + 500]
+            marcadores = ",".join("?" * len(lote))
+            for chave, texto in self.conn.execute(
+                    f"SELECT chave, texto FROM ocr_cache WHERE chave IN ({marcadores})",
+                    lote):
+                encontrados[chave] = texto
+
+        acertos = len(encontrados)
+        falhas  = len(chaves) - acertos
+        agora   = time.time()
+        with self.conn:
+            if encontrados:
+                self.conn.executemany(
+                    "UPDATE ocr_cache SET ultimo_acesso=? WHERE chave=?",
+                    [(agora, c) for c in encontrados])
+            self.conn.executemany(
+                "UPDATE ocr_cache_contadores SET valor=valor+? WHERE nome=?",
+                [(acertos, "acertos"), (falhas, "falhas")])
+        self.acertos += acertos
+        self.falhas  += falhas
+        return encontrados
+
+    def gravar(self, textos: dict) -> None:
+        """Grava {chave: texto} numa unica transacao."""
+        if not textos:
+            return
+        agora = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO ocr_cache (chave, texto, ultimo_acesso) "
+                "VALUES (?,?,?)",
+                [(c, t, agora) for c, t in textos.items()])
+        self._gravacoes += len(textos)
+        if self._gravacoes >= 500:
+            self.podar()
+
+    def podar(self) -> int:
+        """Remove as entradas menos recentemente usadas acima de max_entradas."""
+        self._gravacoes = 0
+        total = self.conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+        excesso = total - self.max_entradas
+        if excesso <= 0:
+            return 0
+        with self.conn:
+            self.conn.execute("""
+                DELETE FROM ocr_cache WHERE chave IN (
+                    SELECT chave FROM ocr_cache ORDER BY ultimo_acesso LIMIT ?
+                )
+            """, (excesso,))
+        return excesso
+
+    def obter_geometria(self, pdf_hash: str, pagina: int):
+        """
+        Geometria em cache da pagina: None se ainda nao detectada; [] se a
+        pagina nao tem tabela; senao (n_linhas, [(bbox, bbox, bbox), ...]),
+        no formato de _celulas_pagina.
+        """
+        linha = self.conn.execute(
+            "SELECT dados FROM geometria_cache WHERE chave=?",
+            (chave_geometria(pdf_hash, pagina),)).fetchone()
+        if linha is None:
+            return None
+        dados = json.loads(linha[0])
+        if not dados:
+            return []
+        n_linhas, celulas = dados
+        return n_linhas, [tuple(tuple(b) for b in trio) for trio in celulas]
+
+    def gravar_geometria(self, pdf_hash: str, pagina: int, detectado) -> None:
+        """detectado: retorno de _celulas_pagina (None = pagina sem tabela)."""
+        dados = json.dumps([] if detectado is None else list(detectado))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO geometria_cache (chave, dados) VALUES (?,?)",
+                (chave_geometria(pdf_hash, pagina), dados))
+
+    def modelos_layout(self) -> list:
+        """Fronteiras x das colunas de cada layout aprendido, mais usados primeiro."""
+        return [json.loads(c) for (c,) in self.conn.execute(
+            "SELECT colunas FROM layout_modelos ORDER BY usos DESC, ultimo_uso DESC")]
+
+    def aprender_layout(self, colunas: list) -> None:
+        """Registra as colunas de uma tabela detectada (ou conta mais um uso)."""
+        agora = time.time()
+        with self.conn:
+            for id_modelo, txt in self.conn.execute(
+                    "SELECT id, colunas FROM layout_modelos").fetchall():
+                if _mesmas_colunas(json.loads(txt), colunas):
+                    self.conn.execute(
+                        "UPDATE layout_modelos SET usos=usos+1, ultimo_uso=? WHERE id=?",
+                        (agora, id_modelo))
+                    return
+            self.conn.execute(
+                "INSERT INTO layout_modelos (colunas, usos, ultimo_uso) VALUES (?,?,?)",
+                (json.dumps([round(x, 2) for x in colunas]), 1, agora))
+
+    def estatisticas(self) -> dict:
+        cont = dict(self.conn.execute("SELECT nome, valor FROM ocr_cache_contadores"))
+        entradas = self.conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+        return {"entradas": entradas,
+                "acertos": cont.get("acertos", 0),
+                "falhas": cont.get("falhas", 0)}
+
+    def fechar(self) -> None:
+        self.podar()
+        self.conn.close()
+
+
+# ============================================================
+# CONFIGURACAO DO OCR (Poppler / Tesseract)
 # ============================================================
 
 def _configurar_ocr() -> tuple:
@@ -249,78 +611,970 @@ def _configurar_ocr() -> tuple:
     return poppler_path, tess_cmd
 
 
-def _ocr_cell(img_page, cell_bbox_pts, dpi_scale: float, lang: str = "por+eng") -> str:
+# ============================================================
+# BACKENDS DE OCR
+# ============================================================
+
+class BackendOCR:
+    """
+    Interface dos motores de OCR. Um backend recebe uma imagem PIL e
+    devolve o texto reconhecido. Cada processo mantem uma unica instancia
+    por backend (ver obter_backend_ocr), de modo que o modelo de lingua e
+    carregado uma vez por worker.
+    """
+    nome = "base"
+
+    def ler(self, img, lang: str = OCR_LANG, psm: int = PSM_CELULA) -> str:
+        raise NotImplementedError
+
+    def ler_palavras(self, img, lang: str = OCR_LANG,
+                     psm: int = PSM_CELULA) -> list:
+        """
+        OCR com layout: lista de (id_linha, x, y, largura, altura, texto),
+        uma tupla por palavra, em coordenadas de pixel da imagem.
+        """
+        raise NotImplementedError
+
+    def fechar(self) -> None:
+        pass
+
+
+class BackendTesserocr(BackendOCR):
+    """
+    Tesseract em processo via tesserocr (API C++). Mantem um PyTessBaseAPI
+    aberto por (lang, psm): o traineddata e carregado uma vez e cada celula
+    custa so o reconhecimento, sem fork nem PNG temporario.
+
+    O construtor ja abre a API de OCR_LANG: se o tessdata nao for achado ou
+    o traineddata da lingua faltar, levanta RuntimeError aqui, e
+    obter_backend_ocr cai para o pytesseract em vez de falhar na primeira
+    celula.
+    """
+    nome = "tesserocr"
+
+    def __init__(self):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self._apis = {}
+        try:
+            self._api(OCR_LANG, PSM_CELULA)
+        except Exception as e:
+            raise RuntimeError(
+                f"tesserocr nao inicializou lang={OCR_LANG!r}: {e}") from e
+
+    def _api(self, lang: str, psm: int):
+        api = self._apis.get((lang, psm))
+        if api is None:
+            kwargs = {"lang": lang, "psm": psm}
+            tessdata = os.environ.get("TESSDATA_PREFIX")
+            if tessdata:
+                kwargs["path"] = os.path.join(tessdata, "")
+            api = self._tesserocr.PyTessBaseAPI(**kwargs)
+            self._apis[(lang, psm)] = api
+        return api
+
+    def ler(self, img, lang: str = OCR_LANG, psm: int = PSM_CELULA) -> str:
+        api = self._api(lang, psm)
+        api.SetImage(img)
+        return api.GetUTF8Text()
+
+    def ler_palavras(self, img, lang: str = OCR_LANG,
+                     psm: int = PSM_CELULA) -> list:
+        RIL = self._tesserocr.RIL
+        api = self._api(lang, psm)
+        api.SetImage(img)
+        api.Recognize()
+        ri = api.GetIterator()
+        if ri is None:
+            return []
+        palavras = []
+        id_linha = -1
+        for w in self._tesserocr.iterate_level(ri, RIL.WORD):
+            if w.IsAtBeginningOf(RIL.TEXTLINE):
+                id_linha += 1
+            texto = w.GetUTF8Text(RIL.WORD)
+            bbox  = w.BoundingBox(RIL.WORD)
+            if not texto or not texto.strip() or not bbox:
+                continue
+            x0, y0, x1, y1 = bbox
+            palavras.append((id_linha, x0, y0, x1 - x0, y1 - y0, texto))
+        return palavras
+
+    def fechar(self) -> None:
+        for api in self._apis.values():
+            api.End()
+        self._apis.clear()
+
+
+class BackendPytesseract(BackendOCR):
+    """Fallback: um processo tesseract por chamada (pytesseract)."""
+    nome = "pytesseract"
+
+    def __init__(self):
+        import pytesseract
+        self._pytesseract = pytesseract
+
+    def ler(self, img, lang: str = OCR_LANG, psm: int = PSM_CELULA) -> str:
+        return self._pytesseract.image_to_string(img, lang=lang,
+                                                 config=f"--psm {psm}")
+
+    def ler_palavras(self, img, lang: str = OCR_LANG,
+                     psm: int = PSM_CELULA) -> list:
+        d = self._pytesseract.image_to_data(
+            img, lang=lang, config=f"--psm {psm}",
+            output_type=self._pytesseract.Output.DICT)
+        palavras = []
+        for i, texto in enumerate(d["text"]):
+            if not texto or not texto.strip():
+                continue
+            id_linha = (d["block_num"][i], d["par_num"][i], d["line_num"][i])
+            palavras.append((id_linha, d["left"][i], d["top"][i],
+                             d["width"][i], d["height"][i], texto))
+        return palavras
+
+
+BACKENDS_OCR = {
+    "tesserocr":   BackendTesserocr,
+    "pytesseract": BackendPytesseract,
+}
+
+# Instancias ja criadas neste processo (uma por backend)
+_BACKENDS_ATIVOS = {}
+
+
+def obter_backend_ocr(nome: str = None) -> BackendOCR:
+    """
+    Retorna o backend de OCR deste processo, criando-o na primeira chamada.
+    nome=None tenta tesserocr e cai para pytesseract se o pacote (ou o
+    traineddata) nao estiver disponivel.
+    """
+    candidatos = [nome] if nome else ["tesserocr", "pytesseract"]
+    erro = None
+    for cand in candidatos:
+        if cand in _BACKENDS_ATIVOS:
+            return _BACKENDS_ATIVOS[cand]
+        if cand not in BACKENDS_OCR:
+            raise ValueError(f"Backend de OCR desconhecido: {cand!r} "
+                             f"(opcoes: {', '.join(BACKENDS_OCR)})")
+        try:
+            backend = BACKENDS_OCR[cand]()
+        except (ImportError, RuntimeError) as e:
+            erro = e
+            continue
+        _BACKENDS_ATIVOS[cand] = backend
+        return backend
+    raise RuntimeError(f"Nenhum backend de OCR disponivel: {erro}")
+
+
+# ============================================================
+# PRE-PROCESSAMENTO DAS IMAGENS (NumPy)
+# ============================================================
+
+JANELA_BINARIZACAO  = 31      # lado (px) da janela da media local
+K_BINARIZACAO       = 0.15    # tinta = pixel abaixo de (1-k) x media local
+ANGULO_MAX_DESKEW   = 2.0     # graus; inclinacoes maiores nao sao procuradas
+PASSO_DESKEW        = 0.1     # graus
+ALTURA_MIN_GLIFO    = 30      # px; linhas mais baixas sao ampliadas 2x
+MARGEM_CELULA       = 4       # px descartados de cada lado (borda da grade)
+
+
+def _binarizar_adaptativo(cinza, janela: int = JANELA_BINARIZACAO,
+                          k: float = K_BINARIZACAO):
+    """
+    Binarizacao por media local (imagem integral): cada pixel vira tinta (0)
+    se for mais escuro que (1-k) vezes a media da janela ao redor, senao
+    fundo (255). Tolera fundo irregular e carimbos/marcas d'agua claros.
+    """
+    import numpy as np
+
+    h, w = cinza.shape
+    r = janela // 2
+    integral = np.zeros((h + 1, w + 1), dtype=np.int64)
+    np.cumsum(cinza, axis=0, dtype=np.int64, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+
+    y0 = np.clip(np.arange(h) - r, 0, h)
+    y1 = np.clip(np.arange(h) + r + 1, 0, h)
+    x0 = np.clip(np.arange(w) - r, 0, w)
+    x1 = np.clip(np.arange(w) + r + 1, 0, w)
+    # Soma da janela de cada pixel, in-place para limitar os temporarios
+    soma = integral[np.ix_(y1, x1)]
+    soma -= integral[np.ix_(y0, x1)]
+    soma -= integral[np.ix_(y1, x0)]
+    soma += integral[np.ix_(y0, x0)]
+    del integral
+
+    # cinza < (1-k) * soma / area, em inteiros (percentuais)
+    soma *= int(round((1.0 - k) * 100))
+    limite = np.outer(y1 - y0, x1 - x0) * 100
+    limite *= cinza
+    return np.where(limite < soma, np.uint8(0), np.uint8(255))
+
+
+def _estimar_inclinacao(binaria) -> float:
+    """
+    Angulo (graus, anti-horario) das linhas de texto/grade: o que deixa o
+    perfil de projecao horizontal mais concentrado. Usa 1 de cada 4 pixels
+    em cada eixo; 0.0 se a pagina nao tiver tinta suficiente.
+    """
+    import numpy as np
+
+    ys, xs = np.nonzero(binaria[::4, ::4] == 0)
+    if len(ys) < 100:
+        return 0.0
+    ys = ys.astype(np.float64)
+    xs = xs.astype(np.float64)
+
+    melhor, melhor_score = 0.0, -1
+    n = int(round(ANGULO_MAX_DESKEW / PASSO_DESKEW))
+    for passo in range(-n, n + 1):
+        angulo = passo * PASSO_DESKEW
+        linhas = np.round(ys + xs * np.tan(np.radians(angulo))).astype(np.int64)
+        hist = np.bincount(linhas - linhas.min())
+        score = int(np.dot(hist, hist))
+        if score > melhor_score or (score == melhor_score and abs(angulo) < abs(melhor)):
+            melhor, melhor_score = angulo, score
+    return melhor
+
+
+class PaginaPreparada:
+    """
+    Pagina rasterizada pronta para OCR, como array uint8 (0 = tinta,
+    255 = fundo): convertida para escala de cinza uma unica vez, binarizada
+    e endireitada por inteiro. As celulas sao fatias (views) do array; so
+    ha copia quando a celula precisa ser ampliada ou entregue ao motor.
+
+    origem_px: posicao (x, y), em pixels da pagina inteira, do canto
+    superior esquerdo de img_page quando ela e so um recorte da pagina
+    (modo adaptativo, ver _renderizar_regiao).
+    """
+
+    def __init__(self, img_page, dpi_scale: float, origem_px: tuple = (0, 0)):
+        import numpy as np
+        from PIL import Image
+
+        self.escala = dpi_scale
+        self.origem_px = origem_px
+        cinza = np.asarray(img_page.convert("L"))
+        binaria = _binarizar_adaptativo(cinza)
+        del cinza
+        self.angulo = _estimar_inclinacao(binaria)
+        if abs(self.angulo) >= PASSO_DESKEW:
+            girada = Image.fromarray(binaria).rotate(
+                -self.angulo, resample=Image.NEAREST, fillcolor=255)
+            binaria = np.asarray(girada)
+            girada.close()
+        self.pixels = binaria
+
+    def _no_quadro_endireitado(self, x: float, y: float) -> tuple:
+        """Leva um ponto da pagina original para o array ja endireitado."""
+        import math
+        if abs(self.angulo) < PASSO_DESKEW:
+            return x, y
+        h, w = self.pixels.shape
+        cx, cy = w / 2.0, h / 2.0
+        t = math.radians(-self.angulo)    # a pagina foi girada de -angulo
+        dx, dy = x - cx, y - cy
+        return (cx + dx * math.cos(t) + dy * math.sin(t),
+                cy - dx * math.sin(t) + dy * math.cos(t))
+
+    def celula(self, cell_bbox_pts):
+        """
+        Fatia da celula (sem a borda da grade), em coordenadas do array
+        endireitado; None se vazia. E uma view: nao copia pixels.
+        """
+        ox, oy = self.origem_px
+        x0, top, x1, bottom = (v * self.escala for v in cell_bbox_pts)
+        x0, x1, top, bottom = x0 - ox, x1 - ox, top - oy, bottom - oy
+        cx, cy = self._no_quadro_endireitado((x0 + x1) / 2, (top + bottom) / 2)
+        meia_l = (x1 - x0) / 2 - MARGEM_CELULA
+        meia_a = (bottom - top) / 2 - MARGEM_CELULA
+        h, w = self.pixels.shape
+        px0, py0 = max(0, int(cx - meia_l)), max(0, int(cy - meia_a))
+        px1, py1 = min(w, int(cx + meia_l)), min(h, int(cy + meia_a))
+        if px1 <= px0 or py1 <= py0:
+            return None
+        return self.pixels[py0:py1, px0:px1]
+
+    def recorte(self, cell_bbox_pts):
+        """
+        Celula pronta para o motor de OCR (array 2D), ampliada 2x so se a
+        altura estimada das linhas for menor que ALTURA_MIN_GLIFO.
+        None se a celula for vazia ou nao tiver tinta.
+        """
+        import numpy as np
+        from PIL import Image
+
+        cel = self.celula(cell_bbox_pts)
+        if cel is None:
+            return None
+        altura = _altura_glifo(cel)
+        if altura == 0:
+            return None
+        if altura >= ALTURA_MIN_GLIFO:
+            return cel
+        h, w = cel.shape
+        with Image.fromarray(cel) as img:
+            with img.resize((w * 2, h * 2), Image.BICUBIC) as ampliada:
+                return np.asarray(ampliada)
+
+    def imagem(self, cell_bbox_pts):
+        """recorte() como PIL.Image (o formato aceito pelos backends); ou None."""
+        from PIL import Image
+        rec = self.recorte(cell_bbox_pts)
+        return None if rec is None else Image.fromarray(rec)
+
+
+def _altura_glifo(celula) -> float:
+    """
+    Altura mediana (px) das faixas de linhas com tinta da celula: uma
+    estimativa da altura das letras. 0 se nao houver tinta. Faixas de ate
+    2 px (restos de borda, ruido) sao ignoradas.
+    """
+    import numpy as np
+
+    com_tinta = (celula == 0).any(axis=1).astype(np.int8)
+    bordas = np.diff(np.concatenate(([0], com_tinta, [0])))
+    inicios = np.flatnonzero(bordas == 1)
+    fins = np.flatnonzero(bordas == -1)
+    alturas = (fins - inicios)[fins - inicios > 2]
+    return float(np.median(alturas)) if len(alturas) else 0.0
+
+
+# ============================================================
+# OCR POR CELULA
+# ============================================================
+
+def _recortar_celula(img_page, cell_bbox_pts, dpi_scale: float):
+    """
+    Pre-processamento antigo (PIL, RGB, sempre ampliado 2x): recorte da
+    celula sem a borda da grade; None se vazio. Mantido como referencia
+    para o --benchmark-preproc.
+    """
     from PIL import Image
-    import pytesseract
     x0, top, x1, bottom = cell_bbox_pts
-    m = 4
+    m = MARGEM_CELULA
     px0, py0 = max(0, int(x0 * dpi_scale) + m), max(0, int(top * dpi_scale) + m)
     px1, py1 = int(x1 * dpi_scale) - m, int(bottom * dpi_scale) - m
     if px1 <= px0 or py1 <= py0:
-        return ""
+        return None
     crop = img_page.crop((px0, py0, px1, py1))
     w, h = crop.size
-    crop = crop.resize((w * 2, h * 2), Image.LANCZOS)
-    return pytesseract.image_to_string(crop, lang=lang, config="--psm 6").strip()
+    return crop.resize((w * 2, h * 2), Image.LANCZOS)
+
+
+def _ocr_cell(pagina: PaginaPreparada, cell_bbox_pts, lang: str = OCR_LANG,
+              psm: int = PSM_CELULA, backend: BackendOCR = None) -> str:
+    img = pagina.imagem(cell_bbox_pts)
+    if img is None:
+        return ""
+    backend = backend or obter_backend_ocr()
+    try:
+        return backend.ler(img, lang=lang, psm=psm).strip()
+    finally:
+        img.close()
+
+
+# Mosaico: faixa branca entre recortes e altura maxima de cada imagem
+# (o Tesseract recusa imagens com mais de 32767 px de lado)
+FAIXA_MOSAICO       = 60
+ALTURA_MAX_MOSAICO  = 30000
 
 
-def extrair_tabela_ocr(caminho_pdf: str, dpi: int = 250,
-                        verbose: bool = True) -> list:
+def _texto_de_palavras(palavras: list) -> str:
+    """Reagrupa palavras (id_linha, x, y, w, h, texto) em linhas de texto."""
+    linhas = {}
+    for id_linha, x, y, _, _, texto in palavras:
+        linhas.setdefault(id_linha, []).append((x, y, texto))
+    ordenadas = sorted(linhas.values(), key=lambda ws: min(p[1] for p in ws))
+    return "\n".join(" ".join(t for _, _, t in sorted(ws)) for ws in ordenadas)
+
+
+def _ocr_mosaico(pagina: PaginaPreparada, bboxes: list,
+                 backend: BackendOCR = None, lang: str = OCR_LANG,
+                 psm: int = PSM_CELULA) -> list:
     """
-    Extrai linhas da tabela via OCR por celula.
-    Retorna lista de dicts: {pagina, numero_processo, partes_texto, enderecos_texto}
+    OCR de varias celulas numa unica chamada: empilha os recortes numa imagem
+    alta, separados por faixas brancas, le com layout (ler_palavras) e devolve
+    cada palavra a celula de origem pela coordenada y do seu centro.
+    Celulas sem tinta nem entram no mosaico.
+    Retorna os textos na mesma ordem de bboxes.
     """
-    import pdfplumber
+    import numpy as np
+    from PIL import Image
+
+    backend = backend or obter_backend_ocr()
+    textos  = [""] * len(bboxes)
+    recortes = [(i, pagina.recorte(b)) for i, b in enumerate(bboxes)]
+    recortes = [(i, c) for i, c in recortes if c is not None]
+
+    # Agrupa em mosaicos que respeitem a altura maxima
+    grupos, grupo, altura = [], [], FAIXA_MOSAICO
+    for i, rec in recortes:
+        h = rec.shape[0] + FAIXA_MOSAICO
+        if grupo and altura + h > ALTURA_MAX_MOSAICO:
+            grupos.append(grupo)
+            grupo, altura = [], FAIXA_MOSAICO
+        grupo.append((i, rec))
+        altura += h
+    if grupo:
+        grupos.append(grupo)
+
+    for grupo in grupos:
+        largura = max(r.shape[1] for _, r in grupo) + 2 * FAIXA_MOSAICO
+        altura  = FAIXA_MOSAICO + sum(r.shape[0] + FAIXA_MOSAICO for _, r in grupo)
+        pixels  = np.full((altura, largura), 255, dtype=np.uint8)
+        faixas  = []    # (y0, y1, indice da celula)
+        y = FAIXA_MOSAICO
+        for i, rec in grupo:
+            h, w = rec.shape
+            pixels[y:y + h, FAIXA_MOSAICO:FAIXA_MOSAICO + w] = rec
+            faixas.append((y, y + h, i))
+            y += h + FAIXA_MOSAICO
+
+        por_celula = {}
+        with Image.fromarray(pixels) as mosaico:
+            palavras = backend.ler_palavras(mosaico, lang=lang, psm=psm)
+        for palavra in palavras:
+            _, _, py, _, ph, _ = palavra
+            centro = py + ph / 2
+            for y0, y1, i in faixas:
+                if y0 - FAIXA_MOSAICO / 2 <= centro < y1 + FAIXA_MOSAICO / 2:
+                    por_celula.setdefault(i, []).append(palavra)
+                    break
+        for i, palavras in por_celula.items():
+            textos[i] = _texto_de_palavras(palavras)
+
+    return textos
+
+
+def _renderizar_pagina(caminho_pdf: str, p_idx: int, dpi: int,
+                       poppler_path: str = None):
+    """Renderiza uma unica pagina (indice 0-based) do PDF via pdf2image."""
     from pdf2image import convert_from_path
-    import pytesseract
-    from pathlib import Path
+    kwargs = {"dpi": dpi, "first_page": p_idx + 1, "last_page": p_idx + 1}
+    if poppler_path:
+        kwargs["poppler_path"] = poppler_path
+    return convert_from_path(caminho_pdf, **kwargs)[0]
+
+
+def _renderizar_regiao(caminho_pdf: str, p_idx: int, dpi: int, bbox_pts,
+                       poppler_path: str = None) -> tuple:
+    """
+    Renderiza so a regiao bbox_pts (x0, top, x1, bottom em pontos) de uma
+    pagina, em tons de cinza, chamando o pdftoppm com -x/-y/-W/-H (o
+    pdf2image nao expoe o recorte). Retorna (imagem, (x_px, y_px)): a
+    posicao do recorte em pixels da pagina inteira no mesmo DPI.
+    """
+    import io
+    import math
+    import subprocess
+    from PIL import Image
+
+    escala = dpi / 72.0
+    x0, top, x1, bottom = bbox_pts
+    px, py = max(0, int(x0 * escala)), max(0, int(top * escala))
+    largura = math.ceil(x1 * escala) - px
+    altura  = math.ceil(bottom * escala) - py
+
+    exe = os.path.join(poppler_path, "pdftoppm") if poppler_path else "pdftoppm"
+    cmd = [exe, "-f", str(p_idx + 1), "-l", str(p_idx + 1), "-r", str(dpi),
+           "-x", str(px), "-y", str(py), "-W", str(largura), "-H", str(altura),
+           "-gray", caminho_pdf]
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+    saida = subprocess.run(cmd, capture_output=True, check=True, **kwargs).stdout
+    img = Image.open(io.BytesIO(saida))
+    img.load()
+    return img, (px, py)
+
+
+class RegioesPreparadas:
+    """
+    Varias regioes de uma pagina renderizadas em separado (modo adaptativo),
+    cada uma como PaginaPreparada. Oferece recorte()/imagem() como uma
+    PaginaPreparada, delegando a regiao que contem a celula.
+    """
+
+    def __init__(self, regioes: list):
+        self.regioes = regioes      # [(bbox_pts, PaginaPreparada), ...]
+
+    def _pagina_de(self, cell_bbox_pts):
+        x0, top, x1, bottom = cell_bbox_pts
+        for (rx0, rtop, rx1, rbottom), pagina in self.regioes:
+            if rx0 <= x0 and rtop <= top and x1 <= rx1 and bottom <= rbottom:
+                return pagina
+        return None
+
+    def recorte(self, cell_bbox_pts):
+        pagina = self._pagina_de(cell_bbox_pts)
+        return None if pagina is None else pagina.recorte(cell_bbox_pts)
+
+    def imagem(self, cell_bbox_pts):
+        pagina = self._pagina_de(cell_bbox_pts)
+        return None if pagina is None else pagina.imagem(cell_bbox_pts)
+
+
+def _preparar_regioes(caminho_pdf: str, p_idx: int, dpi: int, bboxes: list,
+                      indices: list, poppler_path: str = None) -> RegioesPreparadas:
+    """
+    Modo adaptativo: uma regiao por coluna lida (processo, partes,
+    enderecos), cobrindo so as celulas em indices. Cada regiao e renderizada
+    no DPI de OCR e preparada (binarizacao/deskew) isoladamente.
+    """
+    escala = dpi / 72.0
+    regioes = []
+    for coluna in range(3):
+        caixas = [bboxes[i] for i in indices if i % 3 == coluna]
+        if not caixas:
+            continue
+        bbox = (min(b[0] for b in caixas), min(b[1] for b in caixas),
+                max(b[2] for b in caixas), max(b[3] for b in caixas))
+        img, origem = _renderizar_regiao(caminho_pdf, p_idx, dpi, bbox, poppler_path)
+        try:
+            regioes.append((bbox, PaginaPreparada(img, escala, origem)))
+        finally:
+            img.close()
+    return RegioesPreparadas(regioes)
+
+
+def _celulas_com_texto(pag, bboxes: list) -> set:
+    """
+    Indices das celulas que tem algum caractere na camada de texto (mesmo
+    com encoding ilegivel, os glifos estao la). Se a pagina nao tiver
+    nenhum caractere (tabela so em imagem), considera todas preenchidas.
+    """
+    chars = pag.chars
+    if not chars:
+        return set(range(len(bboxes)))
+    centros = [((c["x0"] + c["x1"]) / 2, (c["top"] + c["bottom"]) / 2) for c in chars]
+    preenchidas = set()
+    for i, (x0, top, x1, bottom) in enumerate(bboxes):
+        if any(x0 <= x <= x1 and top <= y <= bottom for x, y in centros):
+            preenchidas.add(i)
+    return preenchidas
+
+
+def _celulas_das_linhas(linhas: list) -> tuple:
+    """
+    Seleciona as linhas de dados (pula as 2 de cabecalho) de uma tabela
+    dada como lista de linhas de celulas (bbox ou None).
+    Retorna (n_linhas_dados, [(cel_processo, cel_partes, cel_enderecos), ...]).
+    """
+    celulas = []
+    for r_idx, cells in enumerate(linhas):
+        if r_idx <= 1:
+            continue
+        if len(cells) < 5:
+            continue
+        if not all(cells[i] for i in [1, 3, 4]):
+            continue
+        celulas.append((cells[1], cells[3], cells[4]))
+    return max(0, len(linhas) - 2), celulas
+
+
+def _colunas_das_linhas(linhas: list):
+    """Fronteiras x das colunas (a linha mais completa com 5+ celulas), ou None."""
+    completas = [cells for cells in linhas if len(cells) >= 5 and all(cells)]
+    if not completas:
+        return None
+    cells = max(completas, key=len)
+    return [c[0] for c in cells] + [cells[-1][2]]
+
+
+def _linhas_tabela(pag):
+    """Tabela da pagina (pdfplumber) como lista de linhas de celulas, ou None."""
+    tbl_objs = pag.find_tables()
+    if not tbl_objs:
+        return None
+    return [row.cells for row in tbl_objs[0].rows]
+
+
+def _celulas_pagina(pag):
+    """
+    Detecta a tabela da pagina (pdfplumber) e seleciona as linhas de dados.
+    Retorna None se a pagina nao tiver tabela; caso contrario
+    (n_linhas_dados, [(cel_processo, cel_partes, cel_enderecos), ...]).
+    """
+    linhas = _linhas_tabela(pag)
+    return None if linhas is None else _celulas_das_linhas(linhas)
+
+
+def _linhas_por_layout(pag, colunas: list):
+    """
+    Monta a tabela a partir de um layout conhecido, sem find_tables(): as
+    colunas vem do modelo e as linhas das reguas horizontais que cruzam as
+    colunas lidas (processo e enderecos). None se a pagina nao tiver uma
+    regua vertical em cada fronteira do modelo.
+    """
+    tol = TOLERANCIA_LAYOUT
+    edges = pag.edges
+    verticais = [e["x0"] for e in edges if e["orientation"] == "v"]
+    if not all(any(abs(x - c) <= tol for x in verticais) for c in colunas):
+        return None
+
+    meio_proc = (colunas[1] + colunas[2]) / 2
+    meio_end  = (colunas[4] + colunas[5]) / 2 if len(colunas) > 5 else colunas[-1] - tol
+    def cruza(e, x):
+        return e["x0"] - tol <= x <= e["x1"] + tol
+
+    em_proc = sorted(e["top"] for e in edges
+                     if e["orientation"] == "h" and cruza(e, meio_proc))
+    em_end  = [e["top"] for e in edges
+               if e["orientation"] == "h" and cruza(e, meio_end)]
+    ys = []
+    for y in em_proc:
+        if ys and y - ys[-1] <= tol:
+            continue
+        if any(abs(y - y2) <= tol for y2 in em_end):
+            ys.append(y)
+    if len(ys) < 2:
+        return None
+    return [[(colunas[j], y0, colunas[j + 1], y1) for j in range(len(colunas) - 1)]
+            for y0, y1 in zip(ys, ys[1:])]
+
+
+def _mesma_geometria(a, b) -> bool:
+    """Compara dois retornos de _celulas_pagina com TOLERANCIA_LAYOUT."""
+    if a is None or b is None:
+        return a is b
+    if a[0] != b[0] or len(a[1]) != len(b[1]):
+        return False
+    return all(_mesmas_colunas(bx, by)
+               for tx, ty in zip(a[1], b[1]) for bx, by in zip(tx, ty))
+
+
+def _detectar_celulas(pag, p_idx: int, ctx: dict):
+    """
+    _celulas_pagina com os atalhos do contexto:
+      - geometria em cache (mesmo PDF ja processado): nem abre a pagina;
+      - modo layout (ctx["layout"]): reaproveita as colunas de modelos
+        aprendidos em documentos anteriores. O primeiro uso de um modelo em
+        cada documento (e processo) e conferido contra find_tables(); se
+        divergir, o modelo e descartado para o resto do documento.
+    Toda tabela detectada por find_tables() ensina/reforca um modelo.
+    """
+    cache = ctx["cache"]
+    if cache is not None:
+        achado = cache.obter_geometria(ctx["pdf_hash"], p_idx)
+        if achado is not None:
+            return achado or None
+
+    detectado = linhas = None
+    if cache is not None and ctx.get("layout"):
+        if "modelos" not in ctx:
+            ctx["modelos"] = cache.modelos_layout()
+            ctx["modelos_conferidos"] = {}
+        for m_idx, colunas in enumerate(ctx["modelos"]):
+            if ctx["modelos_conferidos"].get(m_idx) is False:
+                continue
+            por_layout = _linhas_por_layout(pag, colunas)
+            if por_layout is None:
+                continue
+            detectado = _celulas_das_linhas(por_layout)
+            if m_idx not in ctx["modelos_conferidos"]:
+                linhas = _linhas_tabela(pag)
+                completo = None if linhas is None else _celulas_das_linhas(linhas)
+                ok = _mesma_geometria(detectado, completo)
+                ctx["modelos_conferidos"][m_idx] = ok
+                if not ok:
+                    detectado = completo
+            break
+
+    if detectado is None and linhas is None:
+        linhas = _linhas_tabela(pag)
+        detectado = None if linhas is None else _celulas_das_linhas(linhas)
+
+    if cache is not None:
+        if linhas is not None:
+            colunas = _colunas_das_linhas(linhas)
+            if colunas:
+                cache.aprender_layout(colunas)
+        cache.gravar_geometria(ctx["pdf_hash"], p_idx, detectado)
+    return detectado
+
+
+def _linhas_de_textos(textos: list, p_idx: int) -> list:
+    """[(processo, partes, enderecos), ...] em texto OCR bruto -> linhas."""
+    resultados = []
+    for proc, partes, endrs in textos:
+        proc   = re.sub(r'\s+', ' ', proc).strip()
+        partes = re.sub(r'[ \t]+', ' ', partes).strip()
+        endrs  = re.sub(r'[ \t]+', ' ', endrs).strip()
+        if proc or partes:
+            resultados.append({
+                "pagina": p_idx + 1,
+                "numero_processo": _normalizar_processo(proc),
+                "partes_texto": partes,
+                "enderecos_texto": endrs,
+            })
+    return resultados
+
+
+def _processar_pagina(pag, p_idx: int, ctx: dict) -> tuple:
+    """
+    Detecta, renderiza (so se houver celulas a ler) e faz OCR de UMA pagina.
+    A imagem e liberada antes de retornar, de modo que no maximo uma pagina
+    rasterizada fica em memoria por processo. Com cache, a pagina so e
+    renderizada se alguma celula ainda nao estiver no cache.
+
+    ctx: caminho_pdf, dpi, poppler_path, cache (CacheOCR ou None),
+         pdf_hash, backend (BackendOCR), mosaico (bool: uma chamada de
+         OCR por pagina em vez de uma por celula), adaptativo (bool:
+         celulas vazias na camada de texto nao sao lidas e so as colunas
+         lidas sao renderizadas, em vez da pagina inteira).
+    Retorna (n_linhas_dados_ou_None, linhas).
+    """
+    detectado = _detectar_celulas(pag, p_idx, ctx)
+    if detectado is None or not detectado[1]:
+        pag.flush_cache()   # descarta chars/objetos ja analisados pelo pdfplumber
+        return (None, []) if detectado is None else (detectado[0], [])
+    n_linhas, celulas = detectado
+    bboxes = [bbox for trio in celulas for bbox in trio]
+    adaptativo = ctx.get("adaptativo")
+    preenchidas = _celulas_com_texto(pag, bboxes) if adaptativo else None
+    pag.flush_cache()
+
+    dpi    = ctx["dpi"]
+    cache  = ctx["cache"]
+    textos = {}
+    chaves = []
+    if adaptativo:
+        textos = {i: "" for i in range(len(bboxes)) if i not in preenchidas}
+    if cache is not None:
+        chaves = [chave_ocr(ctx["pdf_hash"], p_idx, bbox, dpi,
+                         backend=ctx["backend"].nome,
+                         mosaico=bool(ctx.get("mosaico")))
+              for bbox in bboxes]
+        achados = cache.obter([c for i, c in enumerate(chaves) if i not in textos])
+        textos.update({i: achados[c] for i, c in enumerate(chaves) if c in achados})
+
+    faltando = [i for i in range(len(bboxes)) if i not in textos]
+    if faltando:
+        if adaptativo:
+            pagina = _preparar_regioes(ctx["caminho_pdf"], p_idx, dpi, bboxes,
+                                       faltando, ctx["poppler_path"])
+        else:
+            img = _renderizar_pagina(ctx["caminho_pdf"], p_idx, dpi, ctx["poppler_path"])
+            try:
+                pagina = PaginaPreparada(img, dpi / 72.0)
+            finally:
+                img.close()
+        if ctx.get("mosaico"):
+            lidos = _ocr_mosaico(pagina, [bboxes[i] for i in faltando],
+                                 backend=ctx["backend"])
+            textos.update(zip(faltando, lidos))
+        else:
+            for i in faltando:
+                textos[i] = _ocr_cell(pagina, bboxes[i], backend=ctx["backend"])
+        del pagina
+        if cache is not None:
+            cache.gravar({chaves[i]: textos[i] for i in faltando})
+
+    trios = [tuple(textos[i + j] for j in range(3)) for i in range(0, len(bboxes), 3)]
+    return n_linhas, _linhas_de_textos(trios, p_idx)
+
+
+# Estado por processo do pool de OCR (preenchido pelo initializer)
+_WORKER_OCR = {}
+
+
+def _inicializar_worker_ocr(caminho_pdf: str, dpi: int, caminho_cache: str = None,
+                           pdf_hash: str = None, backend: str = None,
+                           mosaico: bool = False, adaptativo: bool = False,
+                           layout: bool = False) -> None:
+    """
+    Initializer do ProcessPoolExecutor: configura Tesseract/Poppler no
+    processo filho (necessario no Windows, que usa spawn) e abre o PDF,
+    o cache de OCR e o motor de OCR uma unica vez por worker.
+    """
+    poppler_path, _ = _configurar_ocr()
+    doc = DocumentoPDF(caminho_pdf)
+    _WORKER_OCR.update({
+        "caminho_pdf":  caminho_pdf,
+        "dpi":          dpi,
+        "poppler_path": poppler_path,
+        "cache":        CacheOCR(caminho_cache) if caminho_cache else None,
+        "pdf_hash":     pdf_hash,
+        "backend":      obter_backend_ocr(backend),
+        "mosaico":      mosaico,
+        "adaptativo":   adaptativo,
+        "layout":       layout,
+        "documento":    doc,
+        "pdf":          doc.plumber,
+    })
+
+
+def _ocr_pagina_worker(p_idx: int) -> tuple:
+    """Processa uma pagina dentro do worker -> (p_idx, n_linhas, linhas)."""
+    pag = _WORKER_OCR["pdf"].pages[p_idx]
+    n_linhas, linhas = _processar_pagina(pag, p_idx, _WORKER_OCR)
+    return p_idx, n_linhas, linhas
+
+
+def _iterar_paginas_sequencial(ctx: dict, paginas):
+    """Gera (p_idx, n_linhas, linhas) renderizando uma pagina por vez."""
+    for p_idx in paginas:
+        n_linhas, linhas = _processar_pagina(ctx["pdf"].pages[p_idx], p_idx, ctx)
+        yield p_idx, n_linhas, linhas
+
+
+def _iterar_paginas_paralelo(caminho_pdf: str, dpi: int, n_paginas: int,
+                             workers: int, caminho_cache: str = None,
+                             pdf_hash: str = None, backend: str = None,
+                             mosaico: bool = False, adaptativo: bool = False,
+                             layout: bool = False):
+    """Gera (p_idx, n_linhas, linhas) na ordem das paginas, via pool de processos."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    pool = ProcessPoolExecutor(max_workers=workers,
+                               initializer=_inicializar_worker_ocr,
+                               initargs=(caminho_pdf, dpi, caminho_cache,
+                                         pdf_hash, backend, mosaico, adaptativo,
+                                         layout))
+    try:
+        # map() devolve na ordem das paginas, independente de qual termina antes
+        yield from pool.map(_ocr_pagina_worker, range(n_paginas))
+    finally:
+        # Se o consumidor parar no meio, nao processa as paginas restantes
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iterar_tabela_ocr(caminho_pdf, dpi: int = 250,
+                      verbose: bool = True, workers: int = None,
+                      caminho_cache: str = None, backend: str = None,
+                      mosaico: bool = False, adaptativo: bool = False,
+                      layout: bool = False):
+    """
+    Versao geradora de extrair_tabela_ocr: produz as linhas
+    {pagina, numero_processo, partes_texto, enderecos_texto} pagina a pagina,
+    sem rasterizar o documento inteiro de antemao. O pico de memoria nao
+    depende do numero de paginas.
+
+    workers:
+      None -> um processo por nucleo (limitado ao numero de paginas)
+      1    -> caminho sequencial, tudo no processo atual
+      N    -> pool com N processos, uma pagina por tarefa
+    A ordem das linhas e a mesma nos dois caminhos. Se o pool de processos
+    nao puder ser criado (ou quebrar), o restante das paginas segue no
+    caminho sequencial.
+
+    caminho_cache: arquivo do CacheOCR (ver caminho_cache_ocr). Celulas ja
+    lidas em execucoes anteriores nao passam de novo pelo Tesseract.
+
+    backend: "tesserocr", "pytesseract" ou None (tesserocr se instalado).
+
+    mosaico: empilha todas as celulas da pagina numa unica imagem e faz uma
+    so chamada de OCR com layout por pagina (ver _ocr_mosaico), em vez de
+    3 chamadas por linha da tabela.
+
+    adaptativo: a deteccao da tabela ja usa so a camada vetorial (paginas
+    sem tabela nunca sao rasterizadas); neste modo, alem disso, celulas sem
+    nenhum caractere nao sao lidas e, em vez da pagina inteira, so as
+    regioes das colunas lidas (processo, partes, enderecos) sao renderizadas
+    no DPI de OCR, recortadas pelo proprio pdftoppm. Permite subir o dpi
+    sem pagar pelos pixels das margens, cabecalho e colunas ignoradas.
+
+    Com caminho_cache, a geometria da tabela de cada pagina tambem fica em
+    cache (por SHA-256 do PDF): reprocessar o mesmo PDF nao chama
+    find_tables() de novo. layout: em PDFs novos, tenta primeiro as colunas
+    dos layouts ja aprendidos (ver _detectar_celulas), pulando find_tables()
+    nas paginas com a mesma grade.
+
+    caminho_pdf pode ser um caminho ou um DocumentoPDF ja aberto; neste caso
+    o pdfplumber e o SHA-256 do documento sao reaproveitados.
+    """
+    from concurrent.futures.process import BrokenProcessPool
 
     poppler_path, tess_cmd = _configurar_ocr()
+    motor = obter_backend_ocr(backend)
     if verbose:
         print(f"  Tesseract : {tess_cmd}")
         print(f"  Poppler   : {poppler_path or '(PATH do sistema)'}")
         tdata = os.environ.get("TESSDATA_PREFIX", "(padrao do sistema)")
         print(f"  tessdata  : {tdata}")
-
-    scale = dpi / 72.0
-    if verbose:
-        print(f"  Convertendo PDF para imagens (DPI={dpi})...")
-    kwargs = {"dpi": dpi}
-    if poppler_path:
-        kwargs["poppler_path"] = poppler_path
-    imgs = convert_from_path(caminho_pdf, **kwargs)
-
-    resultados = []
-    with pdfplumber.open(caminho_pdf) as pdf:
-        for p_idx, (pag, img) in enumerate(zip(pdf.pages, imgs)):
-            tbl_objs = pag.find_tables()
-            if not tbl_objs:
+        print(f"  Motor OCR : {motor.nome}{' (mosaico por pagina)' if mosaico else ''}"
+              f"{' (render so das colunas lidas)' if adaptativo else ''}"
+              f"{' (modelo de layout)' if layout and caminho_cache else ''}")
+
+    doc, proprio = abrir_documento(caminho_pdf)
+    caminho_pdf = doc.caminho
+    n_paginas = doc.n_paginas
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, n_paginas))
+
+    cache = pdf_hash = None
+    if caminho_cache:
+        cache = CacheOCR(caminho_cache)
+        pdf_hash = doc.sha256
+        stats_antes = cache.estatisticas()
+
+    try:
+        proxima = 0
+        paginas = None
+        if workers > 1:
+            if verbose:
+                print(f"  OCR paralelo: {n_paginas} pagina(s) em {workers} processo(s) (DPI={dpi})...")
+            try:
+                for p_idx, n_linhas, linhas in _iterar_paginas_paralelo(
+                        caminho_pdf, dpi, n_paginas, workers, caminho_cache,
+                        pdf_hash, motor.nome, mosaico, adaptativo, layout):
+                    proxima = p_idx + 1
+                    if n_linhas is None:
+                        continue
+                    if verbose:
+                        print(f"  Pag {p_idx+1}: {n_linhas} linha(s) de dados")
+                    yield from linhas
+                paginas = ()
+            except (BrokenProcessPool, OSError, NotImplementedError) as e:
+                if verbose:
+                    print(f"  AVISO: pool de processos indisponivel ({e}) -- modo sequencial")
+        elif verbose:
+            print(f"  OCR pagina a pagina (DPI={dpi})...")
+
+        if paginas is None:
+            paginas = range(proxima, n_paginas)
+        ctx = {"caminho_pdf": caminho_pdf, "dpi": dpi, "poppler_path": poppler_path,
+               "cache": cache, "pdf_hash": pdf_hash, "backend": motor,
+               "mosaico": mosaico, "adaptativo": adaptativo, "layout": layout,
+               "pdf": doc.plumber}
+        for p_idx, n_linhas, linhas in _iterar_paginas_sequencial(ctx, paginas):
+            if n_linhas is None:
                 continue
-            rows = tbl_objs[0].rows
             if verbose:
-                print(f"  Pag {p_idx+1}: {max(0, len(rows)-2)} linha(s) de dados")
-            for r_idx, row in enumerate(rows):
-                if r_idx <= 1:
-                    continue
-                cells = row.cells
-                if len(cells) < 5:
-                    continue
-                if not all(cells[i] for i in [1, 3, 4]):
-                    continue
-                proc  = _ocr_cell(img, cells[1], scale)
-                partes = _ocr_cell(img, cells[3], scale)
-                endrs  = _ocr_cell(img, cells[4], scale)
-                proc   = re.sub(r'\s+', ' ', proc).strip()
-                partes = re.sub(r'[ \t]+', ' ', partes).strip()
-                endrs  = re.sub(r'[ \t]+', ' ', endrs).strip()
-                if proc or partes:
-                    resultados.append({
-                        "pagina": p_idx + 1,
-                        "numero_processo": _normalizar_processo(proc),
-                        "partes_texto": partes,
-                        "enderecos_texto": endrs,
-                    })
-    return resultados
+                print(f"  Pag {p_idx+1}: {n_linhas} linha(s) de dados")
+            yield from linhas
+
+        if cache is not None and verbose:
+            stats = cache.estatisticas()
+            print(f"  Cache OCR : {stats['acertos'] - stats_antes['acertos']} acerto(s), "
+                  f"{stats['falhas'] - stats_antes['falhas']} falha(s) "
+                  f"({stats['entradas']} entrada(s) em {caminho_cache})")
+    finally:
+        if cache is not None:
+            cache.fechar()
+        if proprio:
+            doc.fechar()
+
+
+def extrair_tabela_ocr(caminho_pdf, dpi: int = 250,
+                        verbose: bool = True, workers: int = None,
+                        caminho_cache: str = None, backend: str = None,
+                        mosaico: bool = False, adaptativo: bool = False,
+                        layout: bool = False) -> list:
+    """
+    Extrai linhas da tabela via OCR por celula.
+    Retorna lista de dicts: {pagina, numero_processo, partes_texto, enderecos_texto}
+    Ver iterar_tabela_ocr() para a versao geradora e os parametros
+    workers / caminho_cache / backend / mosaico / adaptativo / layout.
+    """
+    return list(iterar_tabela_ocr(caminho_pdf, dpi=dpi, verbose=verbose,
+                                  workers=workers, caminho_cache=caminho_cache,
+                                  backend=backend, mosaico=mosaico,
+                                  adaptativo=adaptativo, layout=layout))
 
 
 def _normalizar_processo(txt: str) -> str:
@@ -498,10 +1752,19 @@ def parsear_enderecos_coluna(enderecos_texto: str) -> dict:
 # PIPELINE PRINCIPAL
 # ============================================================
 
-def extrair_partes_e_enderecos_ocr(caminho_pdf: str,
+def extrair_partes_e_enderecos_ocr(caminho_pdf,
                                     dpi: int = 250,
-                                    verbose: bool = True) -> list:
-    linhas = extrair_tabela_ocr(caminho_pdf, dpi=dpi, verbose=verbose)
+                                    verbose: bool = True,
+                                    workers: int = None,
+                                    caminho_cache: str = None,
+                                    backend: str = None,
+                                    mosaico: bool = False,
+                                    adaptativo: bool = False,
+                                    layout: bool = False) -> list:
+    linhas = extrair_tabela_ocr(caminho_pdf, dpi=dpi, verbose=verbose,
+                                workers=workers, caminho_cache=caminho_cache,
+                                backend=backend, mosaico=mosaico,
+                                adaptativo=adaptativo, layout=layout)
     resultados = []
 
     for linha in linhas:
@@ -532,34 +1795,9 @@ def extrair_partes_e_enderecos_ocr(caminho_pdf: str,
 # BANCO DE DADOS
 # ============================================================
 
-DDL_ENDERECOS = """
-CREATE TABLE IF NOT EXISTS enderecos_responsavel (
-    id                  INTEGER PRIMARY KEY AUTOINCREMENT,
-    responsavel_id      INTEGER REFERENCES responsaveis(id),
-    certidao_id         INTEGER REFERENCES certidoes(id),
-    numero_doc          TEXT,
-    tipo_logradouro     TEXT,
-    logradouro          TEXT,
-    numero              TEXT,
-    complemento         TEXT,
-    bairro              TEXT,
-    cep                 TEXT,
-    municipio           TEXT,
-    uf                  TEXT DEFAULT 'PI',
-    pais                TEXT DEFAULT 'BR',
-    endereco_original   TEXT,
-    data_insercao       TEXT DEFAULT CURRENT_TIMESTAMP
-);
-CREATE INDEX IF NOT EXISTS idx_end_numero_doc
-    ON enderecos_responsavel(numero_doc);
-CREATE INDEX IF NOT EXISTS idx_end_responsavel
-    ON enderecos_responsavel(responsavel_id);
-"""
-
-
 def criar_tabela_enderecos(conn: sqlite3.Connection) -> None:
-    conn.executescript(DDL_ENDERECOS)
-    conn.commit()
+    """Garante a tabela enderecos_responsavel (o esquema vem de banco.migrar)."""
+    migrar(conn)
 
 
 def salvar_endereco(conn: sqlite3.Connection,
@@ -570,7 +1808,10 @@ def salvar_endereco(conn: sqlite3.Connection,
     cursor = conn.cursor()
     existe_id = None
     if numero_doc:
-        cursor.execute("SELECT id FROM enderecos_responsavel WHERE numero_doc=?", (numero_doc,))
+        # Mesma chave do upsert em lote: um endereco por (numero_doc, certidao_id)
+        cursor.execute("SELECT id FROM enderecos_responsavel "
+                       "WHERE numero_doc=? AND certidao_id IS ?",
+                       (numero_doc, certidao_id))
         row = cursor.fetchone()
         if row:
             existe_id = row[0]
@@ -611,42 +1852,145 @@ def salvar_endereco(conn: sqlite3.Connection,
         return rid
 
 
-def vincular_enderecos_por_doc(conn: sqlite3.Connection) -> int:
+# UPDATE ... FROM (vinculacao por join) existe a partir do SQLite 3.33.
+# Nos joins, CROSS JOIN fixa a ordem: a tabela temporaria (sem estatisticas)
+# guia, e as outras sao lidas pelos indices de numero_doc. Para o banco
+# todo (numeros_doc=None) a subconsulta correlacionada sai mais barata.
+_UPDATE_FROM = sqlite3.sqlite_version_info >= (3, 33, 0)
+
+
+def _marcar_docs_afetados(conn: sqlite3.Connection, numeros_doc=None) -> None:
+    """
+    Preenche a tabela temporaria _docs_afetados com os CPF/CNPJ a vincular:
+    numeros_doc, ou (None) todos os da tabela de enderecos.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _docs_afetados "
+                 "(numero_doc TEXT PRIMARY KEY) WITHOUT ROWID")
+    conn.execute("DELETE FROM temp._docs_afetados")
+    if numeros_doc is None:
+        conn.execute("""
+            INSERT OR IGNORE INTO temp._docs_afetados
+            SELECT DISTINCT numero_doc FROM enderecos_responsavel
+            WHERE numero_doc IS NOT NULL AND numero_doc != ''
+        """)
+    else:
+        conn.executemany("INSERT OR IGNORE INTO temp._docs_afetados VALUES (?)",
+                         [(d,) for d in numeros_doc if d])
+
+
+def vincular_enderecos_por_doc(conn: sqlite3.Connection, numeros_doc=None) -> int:
+    """
+    Liga os enderecos ainda sem responsavel_id ao responsavel de mesmo
+    CPF/CNPJ: o da mesma certidao, se houver, senao o mais recente.
+    numeros_doc restringe aos documentos da importacao atual (None = todos):
+    o custo acompanha o tamanho do lote, nao o do banco.
+    Retorna o numero de enderecos vinculados.
+    """
+    _marcar_docs_afetados(conn, numeros_doc)
+    antes = conn.total_changes
     cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE enderecos_responsavel
-        SET responsavel_id=(
-            SELECT r.id FROM responsaveis r
-            WHERE r.numero_doc=enderecos_responsavel.numero_doc LIMIT 1
-        )
-        WHERE responsavel_id IS NULL
-          AND numero_doc IS NOT NULL AND numero_doc!=''
-    """)
+    if _UPDATE_FROM and numeros_doc is not None:
+        cursor.execute("""
+            WITH melhor AS (
+                SELECT e.id AS eid, r.id AS rid,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY e.id
+                           ORDER BY r.certidao_id IS e.certidao_id DESC, r.id DESC
+                       ) AS ordem
+                FROM temp._docs_afetados d
+                CROSS JOIN enderecos_responsavel e
+                  ON e.numero_doc = d.numero_doc AND e.responsavel_id IS NULL
+                CROSS JOIN responsaveis r ON r.numero_doc = d.numero_doc
+            )
+            UPDATE enderecos_responsavel SET responsavel_id = melhor.rid
+            FROM melhor
+            WHERE melhor.eid = enderecos_responsavel.id AND melhor.ordem = 1
+        """)
+    else:
+        cursor.execute("""
+            UPDATE enderecos_responsavel
+            SET responsavel_id=COALESCE(
+                (SELECT MAX(r.id) FROM responsaveis r
+                 WHERE r.numero_doc=enderecos_responsavel.numero_doc
+                   AND r.certidao_id=enderecos_responsavel.certidao_id),
+                (SELECT MAX(r.id) FROM responsaveis r
+                 WHERE r.numero_doc=enderecos_responsavel.numero_doc)
+            )
+            WHERE responsavel_id IS NULL
+              AND numero_doc IN (SELECT numero_doc FROM temp._docs_afetados)
+              AND EXISTS (SELECT 1 FROM responsaveis r
+                          WHERE r.numero_doc=enderecos_responsavel.numero_doc)
+        """)
+    alterados = conn.total_changes - antes     # rowcount e -1 com WITH
     conn.commit()
-    return cursor.rowcount
+    return alterados
 
 
-def vincular_e_atualizar_endereco_texto(conn: sqlite3.Connection) -> int:
+def vincular_e_atualizar_endereco_texto(conn: sqlite3.Connection,
+                                        numeros_doc=None) -> int:
+    """
+    Preenche responsaveis.endereco (quando vazio) com o endereco de mesmo
+    CPF/CNPJ: o importado para a mesma certidao, se houver, senao o mais
+    recente. numeros_doc como em vincular_enderecos_por_doc.
+    Retorna o numero de responsaveis atualizados.
+    """
+    _marcar_docs_afetados(conn, numeros_doc)
+    antes = conn.total_changes
     cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE responsaveis
-        SET endereco=(
-            SELECT e.endereco_original FROM enderecos_responsavel e
-            WHERE e.numero_doc=responsaveis.numero_doc LIMIT 1
-        )
-        WHERE (endereco IS NULL OR endereco='')
-          AND numero_doc IS NOT NULL AND numero_doc!=''
-    """)
+    if _UPDATE_FROM and numeros_doc is not None:
+        cursor.execute("""
+            WITH melhor AS (
+                SELECT r.id AS rid, e.endereco_original,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY r.id
+                           ORDER BY e.certidao_id IS r.certidao_id DESC, e.id DESC
+                       ) AS ordem
+                FROM temp._docs_afetados d
+                CROSS JOIN responsaveis r
+                  ON r.numero_doc = d.numero_doc
+                 AND (r.endereco IS NULL OR r.endereco = '')
+                CROSS JOIN enderecos_responsavel e ON e.numero_doc = d.numero_doc
+            )
+            UPDATE responsaveis SET endereco = melhor.endereco_original
+            FROM melhor
+            WHERE melhor.rid = responsaveis.id AND melhor.ordem = 1
+        """)
+    else:
+        cursor.execute("""
+            UPDATE responsaveis
+            SET endereco=COALESCE(
+                (SELECT e.endereco_original FROM enderecos_responsavel e
+                 WHERE e.numero_doc=responsaveis.numero_doc
+                   AND e.certidao_id=responsaveis.certidao_id
+                 ORDER BY e.id DESC LIMIT 1),
+                (SELECT e.endereco_original FROM enderecos_responsavel e
+                 WHERE e.numero_doc=responsaveis.numero_doc
+                 ORDER BY e.id DESC LIMIT 1)
+            )
+            WHERE (endereco IS NULL OR endereco='')
+              AND numero_doc IN (SELECT numero_doc FROM temp._docs_afetados)
+              AND EXISTS (SELECT 1 FROM enderecos_responsavel e
+                          WHERE e.numero_doc=responsaveis.numero_doc)
+        """)
+    alterados = conn.total_changes - antes     # rowcount e -1 com WITH
     conn.commit()
-    return cursor.rowcount
+    return alterados
 
 
 def buscar_endereco_responsavel(conn: sqlite3.Connection,
                                 numero_doc: str = None,
-                                responsavel_id: int = None) -> Optional[EnderecoEstruturado]:
+                                responsavel_id: int = None,
+                                certidao_id: int = None) -> Optional[EnderecoEstruturado]:
+    """
+    Endereco do CPF/CNPJ (ou do responsavel): o da certidao_id, se houver,
+    senao o mais recente.
+    """
     cursor = conn.cursor()
     if numero_doc:
-        cursor.execute("SELECT * FROM enderecos_responsavel WHERE numero_doc=? LIMIT 1", (numero_doc,))
+        cursor.execute("""
+            SELECT * FROM enderecos_responsavel WHERE numero_doc=?
+            ORDER BY certidao_id IS ? DESC, id DESC LIMIT 1
+        """, (numero_doc, certidao_id))
     elif responsavel_id:
         cursor.execute("SELECT * FROM enderecos_responsavel WHERE responsavel_id=? LIMIT 1", (responsavel_id,))
     else:
@@ -674,6 +2018,14 @@ def buscar_endereco_responsavel(conn: sqlite3.Connection,
 # PROCESSAMENTO COMPLETO DO PDF
 # ============================================================
 
+def _arquivo_banco(conn: sqlite3.Connection) -> Optional[str]:
+    """Caminho do arquivo do banco 'main' da conexao (None se em memoria)."""
+    for _, nome, arquivo in conn.execute("PRAGMA database_list"):
+        if nome == "main":
+            return arquivo or None
+    return None
+
+
 def _responsaveis_sem_endereco(conn: sqlite3.Connection,
                                certidao_id: int) -> list:
     """Retorna lista de (id, numero_doc) dos responsaveis ainda sem endereco."""
@@ -688,37 +2040,122 @@ def _responsaveis_sem_endereco(conn: sqlite3.Connection,
     return cur.fetchall()
 
 
-def processar_pdf_enderecos(caminho_pdf: str,
+def processar_pdf_enderecos(caminho_pdf,
                              conn: sqlite3.Connection,
                              certidao_id: int = None,
-                             verbose: bool = True) -> list:
+                             verbose: bool = True,
+                             workers: int = None,
+                             usar_cache_ocr: bool = True,
+                             backend_ocr: str = None,
+                             mosaico_ocr: bool = False,
+                             ocr_adaptativo: bool = False,
+                             layout_ocr: bool = False) -> list:
     """
     Pipeline publico:
       1. Cria tabela se necessario
       2. OCR + parse de todas as partes e enderecos
+         (com cache de OCR em ocr_cache.db, ao lado do banco da conexao)
       3. Persiste no banco (vincula por CPF/CNPJ)
       4. Relatorio de responsaveis sem endereco encontrado
+    caminho_pdf: caminho ou DocumentoPDF ja aberto.
     """
     criar_tabela_enderecos(conn)
 
+    caminho_cache = None
+    if usar_cache_ocr:
+        arquivo_db = _arquivo_banco(conn)
+        if arquivo_db:
+            caminho_cache = caminho_cache_ocr(arquivo_db)
+
     if verbose:
         print(f"  Extraindo enderecos via OCR por celula...")
 
-    partes = extrair_partes_e_enderecos_ocr(caminho_pdf, verbose=verbose)
+    partes = extrair_partes_e_enderecos_ocr(caminho_pdf, verbose=verbose,
+                                            workers=workers,
+                                            caminho_cache=caminho_cache,
+                                            backend=backend_ocr,
+                                            mosaico=mosaico_ocr,
+                                            adaptativo=ocr_adaptativo,
+                                            layout=layout_ocr)
 
-    salvos = 0
-    for parte in partes:
-        if parte.endereco and parte.cpf_cnpj:
-            salvar_endereco(conn, parte.endereco,
-                            numero_doc=parte.cpf_cnpj,
-                            certidao_id=certidao_id)
-            salvos += 1
+    gravar_partes_enderecos(conn, partes, certidao_id=certidao_id, verbose=verbose)
+    return partes
 
-    vinculados = vincular_enderecos_por_doc(conn)
-    atualizados = vincular_e_atualizar_endereco_texto(conn)
+
+def salvar_enderecos_em_lote(conn: sqlite3.Connection, partes: list,
+                             certidao_id: int = None) -> int:
+    """
+    Grava os enderecos das partes (com endereco e CPF/CNPJ) com executemany,
+    um upsert por (numero_doc, certidao_id). Nao faz commit: quem chama
+    controla a transacao. Retorna o numero de linhas enviadas.
+    """
+    linhas = [(certidao_id, p.cpf_cnpj,
+               p.endereco.tipo_logradouro, p.endereco.logradouro, p.endereco.numero,
+               p.endereco.complemento, p.endereco.bairro, p.endereco.cep,
+               p.endereco.municipio, p.endereco.uf, p.endereco.pais,
+               p.endereco.endereco_original)
+              for p in partes if p.endereco and p.cpf_cnpj]
+    if not linhas:
+        return 0
+
+    campos = ("tipo_logradouro, logradouro, numero, complemento, bairro, cep, "
+              "municipio, uf, pais, endereco_original")
+    if certidao_id is not None:
+        # Indice unico ux_end_doc_certidao (banco.py, migracao 3)
+        conn.executemany(f"""
+            INSERT INTO enderecos_responsavel (certidao_id, numero_doc, {campos})
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+            ON CONFLICT(numero_doc, certidao_id) DO UPDATE SET
+                tipo_logradouro=excluded.tipo_logradouro, logradouro=excluded.logradouro,
+                numero=excluded.numero, complemento=excluded.complemento,
+                bairro=excluded.bairro, cep=excluded.cep, municipio=excluded.municipio,
+                uf=excluded.uf, pais=excluded.pais,
+                endereco_original=excluded.endereco_original
+        """, linhas)
+    else:
+        # Sem certidao o indice unico nao se aplica (NULL nunca conflita):
+        # atualiza a linha sem certidao do documento, ou insere
+        conn.executemany("""
+            UPDATE enderecos_responsavel SET
+                tipo_logradouro=?, logradouro=?, numero=?, complemento=?,
+                bairro=?, cep=?, municipio=?, uf=?, pais=?, endereco_original=?
+            WHERE numero_doc=? AND certidao_id IS NULL
+        """, [l[2:] + (l[1],) for l in linhas])
+        conn.executemany(f"""
+            INSERT INTO enderecos_responsavel (certidao_id, numero_doc, {campos})
+            SELECT ?,?,?,?,?,?,?,?,?,?,?,?
+            WHERE NOT EXISTS (SELECT 1 FROM enderecos_responsavel
+                              WHERE numero_doc=?2 AND certidao_id IS NULL)
+        """, linhas)
+    return len(linhas)
+
+
+def gravar_partes_enderecos(conn: sqlite3.Connection, partes: list,
+                            certidao_id: int = None, verbose: bool = True) -> int:
+    """
+    Etapas 3-4 de processar_pdf_enderecos, separadas do OCR: persiste as
+    partes ja extraidas (extrair_partes_e_enderecos_ocr) numa transacao so
+    (salvar_enderecos_em_lote), vincula por CPF/CNPJ e relata os
+    responsaveis sem endereco.
+    Retorna o numero de enderecos gravados.
+    """
+    t0 = time.perf_counter()
+    with conn:
+        salvos = salvar_enderecos_em_lote(conn, partes, certidao_id)
+    dt = time.perf_counter() - t0
+
+    # Vincula so os documentos desta importacao e os responsaveis da
+    # certidao (salvar_certidao os recria sem vinculo)
+    docs = {p.cpf_cnpj for p in partes if p.cpf_cnpj}
+    if certidao_id is not None:
+        docs.update(d for (d,) in conn.execute(
+            "SELECT numero_doc FROM responsaveis WHERE certidao_id = ?", (certidao_id,)))
+    vinculados = vincular_enderecos_por_doc(conn, docs)
+    atualizados = vincular_e_atualizar_endereco_texto(conn, docs)
 
     if verbose:
-        print(f"  {salvos} endereco(s) gravado(s) no banco")
+        taxa = f", {salvos / dt:,.0f} linhas/s" if salvos and dt > 0 else ""
+        print(f"  {salvos} endereco(s) gravado(s) no banco em {dt * 1000:.1f} ms{taxa}")
         print(f"  {vinculados} vinculo(s), {atualizados} campo(s) texto atualizado(s)")
 
     if certidao_id:
@@ -729,7 +2166,7 @@ def processar_pdf_enderecos(caminho_pdf: str,
                 print(f"    id={rid} doc={doc} -> nao encontrado no PDF de enderecos")
             print(f"  (Campo endereco ficara em branco na peticao)")
 
-    return partes
+    return salvos
 
 
 # ============================================================
@@ -758,16 +2195,141 @@ def _demo_parser():
         print("-" * 72)
 
 
+def _primeira_pagina_com_tabela(caminho_pdf: str, max_celulas: int, dpi: int,
+                                poppler_path: str = None) -> tuple:
+    """(bboxes das ate max_celulas primeiras celulas, imagem da pagina) ou ([], None)."""
+    with DocumentoPDF(caminho_pdf) as doc:
+        for p_idx, pag in enumerate(doc.plumber.pages):
+            detectado = _celulas_pagina(pag)
+            if detectado and detectado[1]:
+                bboxes = [b for trio in detectado[1] for b in trio][:max_celulas]
+                return bboxes, doc.renderizar(p_idx, dpi, poppler_path)
+    return [], None
+
+
+def _benchmark_backends(caminho_pdf: str, max_celulas: int = 30,
+                        dpi: int = 250) -> dict:
+    """
+    Mede a latencia media por celula de cada backend de OCR disponivel,
+    sobre as mesmas celulas da primeira pagina com tabela do PDF.
+    Retorna {nome_backend: ms_por_celula}.
+    """
+    poppler_path, _ = _configurar_ocr()
+    bboxes, img = _primeira_pagina_com_tabela(caminho_pdf, max_celulas, dpi,
+                                              poppler_path)
+    if img is None:
+        print("Nenhuma tabela encontrada no PDF.")
+        return {}
+    pagina = PaginaPreparada(img, dpi / 72.0)
+    img.close()
+
+    resultados = {}
+    for nome in BACKENDS_OCR:
+        try:
+            backend = obter_backend_ocr(nome)
+        except RuntimeError as e:
+            print(f"  {nome:<12} indisponivel ({e})")
+            continue
+        _ocr_cell(pagina, bboxes[0], backend=backend)   # aquecimento
+        t0 = time.perf_counter()
+        for bbox in bboxes:
+            _ocr_cell(pagina, bbox, backend=backend)
+        ms = (time.perf_counter() - t0) * 1000 / len(bboxes)
+        resultados[nome] = ms
+        print(f"  {nome:<12} {ms:8.1f} ms/celula  ({len(bboxes)} celulas)")
+        t0 = time.perf_counter()
+        _ocr_mosaico(pagina, bboxes, backend=backend)
+        ms_mos = (time.perf_counter() - t0) * 1000 / len(bboxes)
+        resultados[f"{nome}+mosaico"] = ms_mos
+        print(f"  {nome:<12} {ms_mos:8.1f} ms/celula  (mosaico, 1 chamada)")
+
+    if "pytesseract" in resultados and "tesserocr" in resultados:
+        ganho = resultados["pytesseract"] / resultados["tesserocr"]
+        print(f"  tesserocr e {ganho:.1f}x mais rapido por celula")
+    return resultados
+
+
+def _benchmark_preprocessamento(caminhos_pdf: list, max_celulas: int = 30,
+                                dpi: int = 250) -> dict:
+    """
+    Compara, num conjunto de PDFs de referencia, o pre-processamento antigo
+    (recorte PIL em RGB, sempre ampliado 2x) com o PaginaPreparada (NumPy).
+    Mede o tempo por celula (pre-processamento + OCR) e a concordancia
+    entre os textos lidos (difflib, 0..1). Sem gabarito, a concordancia
+    indica o quanto a leitura mudou, nao qual das duas acertou mais:
+    revise as divergencias impressas.
+    """
+    import difflib
+
+    poppler_path, _ = _configurar_ocr()
+    backend = obter_backend_ocr()
+    t_antigo = t_novo = 0.0
+    n_celulas = 0
+    razoes = []
+
+    for caminho_pdf in caminhos_pdf:
+        bboxes, img = _primeira_pagina_com_tabela(caminho_pdf, max_celulas, dpi,
+                                                  poppler_path)
+        if img is None:
+            print(f"  {os.path.basename(caminho_pdf)}: nenhuma tabela")
+            continue
+        escala = dpi / 72.0
+
+        t0 = time.perf_counter()
+        antigos = []
+        for bbox in bboxes:
+            crop = _recortar_celula(img, bbox, escala)
+            antigos.append("" if crop is None else
+                           backend.ler(crop, OCR_LANG, PSM_CELULA).strip())
+        t_antigo += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        pagina = PaginaPreparada(img, escala)
+        novos = [_ocr_cell(pagina, bbox, backend=backend) for bbox in bboxes]
+        t_novo += time.perf_counter() - t0
+        img.close()
+
+        for antigo, novo in zip(antigos, novos):
+            razao = difflib.SequenceMatcher(None, antigo, novo).ratio() if (antigo or novo) else 1.0
+            razoes.append(razao)
+            if razao < 0.9:
+                print(f"    divergencia ({razao:.2f}): {antigo[:40]!r} -> {novo[:40]!r}")
+        n_celulas += len(bboxes)
+        print(f"  {os.path.basename(caminho_pdf)}: {len(bboxes)} celula(s), "
+              f"inclinacao {pagina.angulo:+.1f} graus")
+
+    if not n_celulas:
+        return {}
+    resultado = {
+        "celulas": n_celulas,
+        "ms_antigo": t_antigo * 1000 / n_celulas,
+        "ms_numpy": t_novo * 1000 / n_celulas,
+        "concordancia": sum(razoes) / len(razoes),
+    }
+    print(f"  PIL (antigo) : {resultado['ms_antigo']:8.1f} ms/celula")
+    print(f"  NumPy        : {resultado['ms_numpy']:8.1f} ms/celula  "
+          f"({resultado['ms_antigo'] / max(resultado['ms_numpy'], 1e-9):.2f}x)")
+    print(f"  Concordancia : {resultado['concordancia']:.3f} em {n_celulas} celula(s)")
+    return resultado
+
+
 if __name__ == "__main__":
     import sys
 
     if len(sys.argv) == 1:
         _demo_parser()
+    elif sys.argv[1] == "--benchmark":
+        # python gestor_enderecos.py --benchmark imputacao.pdf [n_celulas]
+        n = int(sys.argv[3]) if len(sys.argv) >= 4 else 30
+        _benchmark_backends(sys.argv[2], max_celulas=n)
+    elif sys.argv[1] == "--benchmark-preproc":
+        # python gestor_enderecos.py --benchmark-preproc a.pdf b.pdf ...
+        _benchmark_preprocessamento(sys.argv[2:])
     elif len(sys.argv) >= 2:
         pdf  = sys.argv[1]
         db   = sys.argv[2] if len(sys.argv) >= 3 else "certidoes_tce.db"
         cid  = int(sys.argv[3]) if len(sys.argv) >= 4 else None
-        conn = sqlite3.connect(db)
+        conn = conectar(db)
         partes = processar_pdf_enderecos(pdf, conn, cid, verbose=True)
         conn.close()
         print(f"\nTotal: {len(partes)} parte(s) processada(s).")
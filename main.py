@@ -13,8 +13,8 @@ import subprocess
 import platform
 from datetime import datetime
 from pathlib import Path
-import pdfplumber
 from pypdf import PdfReader, PdfWriter
+from banco import conectar, migrar
 from enviador_peticao import abrir_enviador
 
 
@@ -22,65 +22,151 @@ from enviador_peticao import abrir_enviador
 # EXTRAÇÃO DE DADOS DA CERTIDÃO
 # ============================================================
 
-def extrair_texto_pdf(caminho_pdf: str) -> str:
+_RE_PALAVRA = re.compile(r"[^\W\d_]{2,}")
+_RE_CID     = re.compile(r"\(cid:\d+\)")
+MIN_CID_PAGINA    = 5      # menos que isso: glifo avulso, não fonte quebrada
+FRACAO_CID_PAGINA = 0.10   # parte do texto da página tomada por "(cid:XX)"
+
+
+def _pagina_sem_texto(texto: str) -> bool:
+    """
+    Página digitalizada (só imagem): camada de texto praticamente vazia —
+    menos de 50 caracteres e nenhuma palavra extraível. Páginas curtas mas
+    legíveis (uma assinatura, um "fim do documento") não vão para o OCR.
+    """
+    if len(texto.strip()) >= 50:
+        return False
+    return _RE_PALAVRA.search(_RE_CID.sub(" ", texto)) is None
+
+
+def _pagina_com_encoding_quebrado(texto: str) -> bool:
+    """
+    Texto cheio de "(cid:XX)" indica fonte com mapeamento privado. A
+    densidade é medida na própria página: mais de MIN_CID_PAGINA
+    ocorrências ocupando ao menos FRACAO_CID_PAGINA do texto dela. Uma
+    página com fonte quebrada não leva as demais para o OCR.
+    """
+    cids = _RE_CID.findall(texto)
+    if len(cids) <= MIN_CID_PAGINA:
+        return False
+    total = len("".join(texto.split()))
+    return sum(len(c) for c in cids) >= FRACAO_CID_PAGINA * total
+
+
+def extrair_paginas_pdf(caminho_pdf, caminho_cache: str = None) -> list:
+    """
+    Extrai o texto página a página, escolhendo o caminho de cada uma:
+      - "texto": camada de texto do pdfplumber (rápido)
+      - "ocr":   só as páginas afetadas são rasterizadas e lidas via
+                 OCR: as sem camada de texto (digitalizadas) e as com
+                 encoding de fonte quebrado ("(cid:XX)" na própria página)
+    caminho_pdf: caminho ou gestor_enderecos.DocumentoPDF já aberto (o
+                 arquivo é lido e o hash calculado uma única vez).
+    Retorna lista ordenada de dicts {pagina (1-based), origem, texto}.
+    """
+    from gestor_enderecos import abrir_documento
+
+    doc, proprio = abrir_documento(caminho_pdf)
+    try:
+        paginas = []
+        for p_idx in range(doc.n_paginas):
+            t = doc.texto_pagina(p_idx)
+            afetada = _pagina_sem_texto(t) or _pagina_com_encoding_quebrado(t)
+            origem = "ocr" if afetada else "texto"
+            paginas.append({"pagina": p_idx + 1, "origem": origem, "texto": t})
+
+        quebradas = [p["pagina"] for p in paginas if p["origem"] == "ocr"]
+        if quebradas:
+            textos_ocr = _extrair_texto_ocr(doc, caminho_cache, quebradas)
+            for p in paginas:
+                if p["origem"] == "ocr":
+                    p["texto"] = textos_ocr.get(p["pagina"], "")
+    finally:
+        if proprio:
+            doc.fechar()
+    return paginas
+
+
+def extrair_texto_pdf(caminho_pdf, caminho_cache: str = None) -> str:
     """
     Extrai texto completo de um PDF.
     Estratégia 1: pdfplumber (rápido, funciona na maioria dos PDFs).
     Estratégia 2: OCR via pdf2image + pytesseract (fallback para PDFs com
                   fontes de encoding privado, como os gerados pelo TCE/PI
                   com assinatura digital via PScript5/Acrobat Distiller).
+    A escolha é feita por página (ver extrair_paginas_pdf): só as páginas
+    afetadas (sem camada de texto ou com encoding quebrado) são
+    rasterizadas e passam pelo OCR, e o texto é montado na ordem original
+    das páginas.
+    caminho_pdf: caminho ou gestor_enderecos.DocumentoPDF.
+    caminho_cache: cache de OCR (gestor_enderecos.CacheOCR) usado pela
+                   estratégia 2; None desativa.
     """
-    texto = ""
-    with pdfplumber.open(caminho_pdf) as pdf:
-        for pagina in pdf.pages:
-            t = pagina.extract_text()
-            if t:
-                texto += t + "\n"
-
-    # Detecta encoding quebrado: texto cheio de "(cid:XX)" ou "/iXXX"
-    # indica que a fonte usa mapeamento privado — aciona OCR
-    cid_count = texto.count("(cid:")
-    total_chars = len(texto.strip())
-    encoding_quebrado = (cid_count > 5) or (total_chars < 50)
+    paginas = extrair_paginas_pdf(caminho_pdf, caminho_cache)
 
-    if encoding_quebrado:
-        print("  ⚠️  Encoding de fonte não mapeável — usando OCR...")
-        texto = _extrair_texto_ocr(caminho_pdf)
+    quebradas = [str(p["pagina"]) for p in paginas if p["origem"] == "ocr"]
+    if quebradas:
+        print(f"  ⚠️  Sem camada de texto ou encoding não mapeável — OCR em {len(quebradas)} de "
+              f"{len(paginas)} página(s): {', '.join(quebradas)}")
 
-    return texto
+    return "".join(p["texto"] + "\n" for p in paginas if p["texto"])
 
 
-def _extrair_texto_ocr(caminho_pdf: str) -> str:
-    """Extrai texto via OCR (pdf2image + pytesseract). Requer poppler e tesseract."""
-    from pdf2image import convert_from_path
-    import pytesseract
-
+def _extrair_texto_ocr(caminho_pdf, caminho_cache: str = None,
+                       paginas: list = None) -> dict:
+    """
+    Extrai texto via OCR (pdf2image + Tesseract). Requer poppler e tesseract.
+    O motor é o backend padrão do gestor_enderecos (tesserocr em processo,
+    ou pytesseract se o tesserocr não estiver instalado).
+    caminho_pdf: caminho ou gestor_enderecos.DocumentoPDF.
+    paginas: números (1-based) das páginas a ler; None = todas. Só essas
+    páginas são renderizadas.
+    Com caminho_cache, páginas já lidas antes (mesmo PDF, mesmo DPI) saem do
+    cache sem renderizar nem chamar o Tesseract.
+    Retorna {numero_pagina: texto}.
+    """
     # Usa a mesma configuracao centralizada do gestor_enderecos
-    try:
-        from gestor_enderecos import _configurar_ocr
-        poppler_path, _ = _configurar_ocr()
-    except ImportError:
-        # Fallback manual caso gestor_enderecos nao esteja disponivel
-        from pathlib import Path
-        base_dir = Path(__file__).parent
-        poppler_local = base_dir / "poppler-25.12.0" / "Library" / "bin"
-        poppler_path = str(poppler_local) if poppler_local.exists() else None
-        tess_win = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-        pytesseract.pytesseract.tesseract_cmd = tess_win
-        os.environ["TESSDATA_PREFIX"] = r"C:\Program Files\Tesseract-OCR\tessdata"
-
-    kwargs = {"dpi": 200}
-    if poppler_path:
-        kwargs["poppler_path"] = poppler_path
-
-    imgs = convert_from_path(caminho_pdf, **kwargs)
+    from gestor_enderecos import (_configurar_ocr, CacheOCR, chave_ocr,
+                                  abrir_documento, obter_backend_ocr,
+                                  OCR_LANG, PSM_PAGINA)
 
-    partes = []
-    for img in imgs:
-        texto = pytesseract.image_to_string(img, lang="por+eng")
-        partes.append(texto)
+    dpi = 200
+    poppler_path, _ = _configurar_ocr()
+    backend = obter_backend_ocr()
+    doc, proprio = abrir_documento(caminho_pdf)
+    cache = CacheOCR(caminho_cache) if caminho_cache else None
 
-    return "\n".join(partes)
+    # Renderiza e lê uma página por vez: só uma imagem fica em memória
+    if paginas is None:
+        paginas = range(1, doc.n_paginas + 1)
+
+    textos = {}
+    try:
+        for n in paginas:
+            chave = None
+            if cache is not None:
+                chave = chave_ocr(doc.sha256, n - 1, None, dpi, OCR_LANG, PSM_PAGINA,
+                                  backend=backend.nome)
+                achado = cache.obter([chave])
+                if chave in achado:
+                    textos[n] = achado[chave]
+                    continue
+            img = doc.renderizar(n - 1, dpi, poppler_path)
+            try:
+                textos[n] = backend.ler(img, OCR_LANG, PSM_PAGINA)
+            finally:
+                img.close()
+            if cache is not None:
+                cache.gravar({chave: textos[n]})
+    finally:
+        if cache is not None:
+            print(f"  Cache OCR: {cache.acertos} página(s) reaproveitada(s), "
+                  f"{cache.falhas} lida(s) via Tesseract")
+            cache.fechar()
+        if proprio:
+            doc.fechar()
+
+    return textos
 
 
 def _normalizar_acordao(s: str) -> str:
@@ -358,34 +444,12 @@ def _buscar_acordao_por_doc(texto_flat: str, num_doc: str) -> str | None:
 # ============================================================
 
 def inicializar_banco(caminho_db: str = "certidoes_tce.db") -> sqlite3.Connection:
-    """Cria / abre o banco SQLite e garante que as tabelas existam."""
-    conn = sqlite3.connect(caminho_db)
-    cursor = conn.cursor()
-
-    cursor.executescript("""
-    CREATE TABLE IF NOT EXISTS certidoes (
-        id              INTEGER PRIMARY KEY AUTOINCREMENT,
-        numero_processo TEXT NOT NULL,
-        valor_atualizado TEXT,
-        data_atualizacao TEXT,
-        acordao_origem   TEXT,
-        data_insercao    TEXT DEFAULT CURRENT_TIMESTAMP,
-        caminho_pdf_certidao TEXT,
-        caminho_pdf_planilha  TEXT
-    );
-
-    CREATE TABLE IF NOT EXISTS responsaveis (
-        id               INTEGER PRIMARY KEY AUTOINCREMENT,
-        certidao_id      INTEGER NOT NULL REFERENCES certidoes(id),
-        nome             TEXT NOT NULL,
-        tipo_doc         TEXT,   -- CPF ou CNPJ
-        numero_doc       TEXT,
-        acordao          TEXT,
-        excluido         INTEGER DEFAULT 0,
-        endereco         TEXT
-    );
-    """)
-    conn.commit()
+    """
+    Cria / abre o banco SQLite. O esquema (de todos os módulos) é criado e
+    atualizado por banco.migrar, só quando há migração pendente.
+    """
+    conn = conectar(caminho_db)
+    migrar(conn)
     return conn
 
 
@@ -395,38 +459,38 @@ def salvar_certidao(conn: sqlite3.Connection, dados: dict,
     """Salva os dados extraídos no banco. Retorna o ID da certidão inserida."""
     cursor = conn.cursor()
 
-    # Verifica se o processo já existe
-    cursor.execute(
+    # Upsert pelo número do processo (índice único, ver banco.migrar)
+    cursor.execute("""
+        INSERT INTO certidoes
+            (numero_processo, valor_atualizado, data_atualizacao,
+             acordao_origem, caminho_pdf_certidao, caminho_pdf_planilha)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(numero_processo) DO UPDATE SET
+            valor_atualizado     = excluded.valor_atualizado,
+            data_atualizacao     = excluded.data_atualizacao,
+            acordao_origem       = excluded.acordao_origem,
+            caminho_pdf_certidao = excluded.caminho_pdf_certidao,
+            caminho_pdf_planilha = excluded.caminho_pdf_planilha
+    """, (dados["numero_processo"], dados["valor_atualizado"],
+          dados["data_atualizacao"], dados["acordao_origem"],
+          caminho_certidao, caminho_planilha))
+    certidao_id = cursor.execute(
         "SELECT id FROM certidoes WHERE numero_processo = ?",
         (dados["numero_processo"],)
-    )
-    row = cursor.fetchone()
-    if row:
-        certidao_id = row[0]
-        cursor.execute("""
-            UPDATE certidoes SET
-                valor_atualizado = ?,
-                data_atualizacao = ?,
-                acordao_origem   = ?,
-                caminho_pdf_certidao = ?,
-                caminho_pdf_planilha  = ?
-            WHERE id = ?
-        """, (dados["valor_atualizado"], dados["data_atualizacao"],
-              dados["acordao_origem"], caminho_certidao, caminho_planilha,
-              certidao_id))
-        # Remove responsáveis antigos para reinserir
-        cursor.execute("DELETE FROM responsaveis WHERE certidao_id = ?",
-                       (certidao_id,))
-    else:
+    ).fetchone()[0]
+
+    # Remove responsáveis antigos para reinserir. Os endereços ligados a
+    # eles ficam sem vínculo (foreign_keys=ON) e são religados por
+    # CPF/CNPJ em gestor_enderecos.vincular_enderecos_por_doc
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' "
+                      "AND name='enderecos_responsavel'").fetchone():
         cursor.execute("""
-            INSERT INTO certidoes
-                (numero_processo, valor_atualizado, data_atualizacao,
-                 acordao_origem, caminho_pdf_certidao, caminho_pdf_planilha)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (dados["numero_processo"], dados["valor_atualizado"],
-              dados["data_atualizacao"], dados["acordao_origem"],
-              caminho_certidao, caminho_planilha))
-        certidao_id = cursor.lastrowid
+            UPDATE enderecos_responsavel SET responsavel_id = NULL
+            WHERE responsavel_id IN
+                  (SELECT id FROM responsaveis WHERE certidao_id = ?)
+        """, (certidao_id,))
+    cursor.execute("DELETE FROM responsaveis WHERE certidao_id = ?",
+                   (certidao_id,))
 
     for resp in dados["responsaveis"]:
         cursor.execute("""
@@ -442,36 +506,59 @@ def salvar_certidao(conn: sqlite3.Connection, dados: dict,
     return certidao_id
 
 
-def listar_certidoes(conn: sqlite3.Connection):
-    """Retorna lista de todas as certidões com seus responsáveis."""
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT c.id, c.numero_processo, c.valor_atualizado, c.data_atualizacao,
-               c.acordao_origem
-        FROM certidoes c
-        ORDER BY c.id DESC
-    """)
-    certidoes = cursor.fetchall()
+# Certidões por página no botão "Listar Banco"
+PAGINA_LISTAGEM = 200
+
+
+def listar_certidoes(conn: sqlite3.Connection, limite: int = None,
+                     antes_de_id: int = None) -> list:
+    """
+    Retorna as certidões com seus responsáveis, da mais nova para a mais
+    antiga (id decrescente).
+    Paginação por cursor: limite = tamanho da página (None = todas) e
+    antes_de_id = id da última certidão da página anterior. A próxima
+    página é listar_certidoes(conn, limite, pagina[-1]["id"]).
+    São duas consultas por página, qualquer que seja o número de certidões:
+    a página e os responsáveis de todas elas (idx_responsaveis_certidao).
+    """
+    filtro = "WHERE id < :antes" if antes_de_id is not None else ""
+    pagina = f"""
+        SELECT id FROM certidoes {filtro}
+        ORDER BY id DESC LIMIT :limite
+    """
+    params = {"antes": antes_de_id, "limite": -1 if limite is None else limite}
 
     resultado = []
-    for c in certidoes:
-        cursor.execute("""
-            SELECT nome, tipo_doc, numero_doc, acordao, excluido, endereco
-            FROM responsaveis WHERE certidao_id = ?
-        """, (c[0],))
-        resps = cursor.fetchall()
-        resultado.append({
+    por_id = {}
+    for c in conn.execute(f"""
+            SELECT c.id, c.numero_processo, c.valor_atualizado, c.data_atualizacao,
+                   c.acordao_origem
+            FROM certidoes c
+            WHERE c.id IN ({pagina})
+            ORDER BY c.id DESC
+        """, params):
+        cert = {
             "id": c[0],
             "numero_processo": c[1],
             "valor_atualizado": c[2],
             "data_atualizacao": c[3],
             "acordao_origem": c[4],
-            "responsaveis": [
-                {"nome": r[0], "tipo_doc": r[1], "numero_doc": r[2],
-                 "acordao": r[3], "excluido": bool(r[4]), "endereco": r[5]}
-                for r in resps
-            ]
-        })
+            "responsaveis": [],
+        }
+        resultado.append(cert)
+        por_id[c[0]] = cert
+
+    if por_id:
+        for r in conn.execute(f"""
+                SELECT certidao_id, nome, tipo_doc, numero_doc, acordao,
+                       excluido, endereco
+                FROM responsaveis
+                WHERE certidao_id IN ({pagina})
+                ORDER BY certidao_id, id
+            """, params):
+            por_id[r[0]]["responsaveis"].append(
+                {"nome": r[1], "tipo_doc": r[2], "numero_doc": r[3],
+                 "acordao": r[4], "excluido": bool(r[5]), "endereco": r[6]})
     return resultado
 
 
@@ -1168,18 +1255,27 @@ def converter_docx_para_pdf(caminho_docx: str, caminho_pdf: str) -> str:
 
 
 def montar_pdf_final(caminho_peticao_pdf: str,
-                     caminho_certidao_pdf: str,
-                     caminho_planilha_pdf: str,
+                     caminho_certidao_pdf,
+                     caminho_planilha_pdf,
                      caminho_saida: str) -> str:
-    """Mescla petição + certidão + planilha num único PDF."""
-    
+    """
+    Mescla petição + certidão + planilha num único PDF.
+    Certidão e planilha podem ser caminhos ou gestor_enderecos.DocumentoPDF
+    já abertos (as páginas do pypdf são reaproveitadas, sem reler o arquivo).
+    """
+    from gestor_enderecos import DocumentoPDF
+
     writer = PdfWriter()
 
-    for pdf_path in [caminho_peticao_pdf, caminho_certidao_pdf, caminho_planilha_pdf]:
-        if pdf_path and os.path.exists(pdf_path):
-            reader = PdfReader(pdf_path)
-            for page in reader.pages:
-                writer.add_page(page)
+    for pdf in [caminho_peticao_pdf, caminho_certidao_pdf, caminho_planilha_pdf]:
+        if isinstance(pdf, DocumentoPDF):
+            paginas = pdf.paginas_pypdf
+        elif pdf and os.path.exists(pdf):
+            paginas = PdfReader(pdf).pages
+        else:
+            continue
+        for page in paginas:
+            writer.add_page(page)
 
     with open(caminho_saida, "wb") as f:
         writer.write(f)
@@ -1195,32 +1291,215 @@ def montar_pdf_final(caminho_peticao_pdf: str,
 # INTERFACE DE LINHA DE COMANDO (CLI) SIMPLES
 # ============================================================
 
+# Etapas de processar_certidao, na ordem (ver --from-stage)
+ETAPAS = ("texto", "dados", "enderecos", "banco", "docx", "pdf", "final")
+
+
 def processar_certidao(
     caminho_certidao: str,
     caminho_planilha: str = None,
     pasta_saida: str = "saida_peticoes",
     caminho_db: str = "certidoes_tce.db",
     caminho_enderecos: str = None,       # ← PDF de endereços das partes (opcional)
+    desde_etapa: str = None,
 ) -> dict:
     """
-    Fluxo completo:
-      1. Extrai dados da certidão PDF
-      2. Salva no banco SQLite
-      3. (Opcional) Importa endereços do PDF de endereços → popula responsaveis
-      4. Recarrega responsáveis do banco (com endereços já preenchidos)
-      5. Gera petição DOCX
-      6. Converte petição para PDF
-      7. Mescla petição + certidão + planilha num único PDF final
+    Fluxo completo, em etapas (ETAPAS):
+      texto      Extrai o texto da certidão PDF (camada de texto ou OCR)
+      dados      Extrai os dados da certidão do texto
+      enderecos  (Opcional) OCR do PDF de endereços das partes
+      banco      Salva no SQLite, grava os endereços e recarrega os
+                 responsáveis (com endereços já preenchidos)
+      docx       Gera petição DOCX
+      pdf        Gera petição PDF
+      final      Mescla petição + certidão + planilha num único PDF final
+    A saída de cada etapa fica em artefatos.db, com chave = hash das
+    entradas + versão do código; numa nova execução só rodam as etapas cujas
+    entradas ou código mudaram (ex.: depois de alterar o modelo da petição,
+    só docx/pdf/final). desde_etapa força essa etapa e as seguintes.
     Retorna dict com caminhos gerados.
     """
+    from gestor_enderecos import DocumentoPDF, caminho_cache_ocr
+
+    if desde_etapa is not None and desde_etapa not in ETAPAS:
+        raise ValueError(f"Etapa desconhecida: {desde_etapa!r} "
+                         f"(use uma de: {', '.join(ETAPAS)})")
+
     os.makedirs(pasta_saida, exist_ok=True)
+    cache_ocr = caminho_cache_ocr(caminho_db)
+
+    # A certidão é aberta uma vez: texto, OCR, hash e a mesclagem final
+    # compartilham o mesmo handle
+    with DocumentoPDF(caminho_certidao) as doc_certidao:
+        return _processar_certidao(doc_certidao, caminho_planilha, pasta_saida,
+                                   caminho_db, caminho_enderecos, cache_ocr,
+                                   desde_etapa)
+
+
+def _processar_certidao(doc_certidao, caminho_planilha: str, pasta_saida: str,
+                        caminho_db: str, caminho_enderecos: str,
+                        cache_ocr: str, desde_etapa: str = None) -> dict:
+    import gestor_enderecos
+    from artefatos import (ArtefatosPipeline, caminho_artefatos, chave_etapa,
+                           versao_codigo, hash_json, hash_arquivo,
+                           registrar_arquivo, arquivo_intacto)
+
+    caminho_certidao = doc_certidao.caminho
+    forcadas = set(ETAPAS[ETAPAS.index(desde_etapa):]) if desde_etapa else set()
+    etapas = {}
+    art = ArtefatosPipeline(caminho_artefatos(caminho_db))
+
+    def reaproveitar(etapa: str, chave: str, valido=None):
+        """Artefato da etapa, se puder ser reaproveitado; senão None."""
+        salvo = None if etapa in forcadas else art.obter(etapa, chave)
+        if salvo is not None and valido is not None and not valido(salvo):
+            salvo = None
+        etapas[etapa] = "executada" if salvo is None else "reaproveitada"
+        if salvo is not None:
+            print(f"⏭️  Etapa {etapa}: sem mudanças, artefato reaproveitado")
+        return salvo
+
+    try:
+        # ── texto ─────────────────────────────────────────────────────────────
+        ch_texto = chave_etapa(
+            "texto",
+            versao_codigo(extrair_texto_pdf, extrair_paginas_pdf, _extrair_texto_ocr,
+                          _pagina_sem_texto, _pagina_com_encoding_quebrado,
+                          gestor_enderecos._VERSAO_OCR),
+            doc_certidao.sha256)
+        salvo = reaproveitar("texto", ch_texto)
+        if salvo is None:
+            print(f"📄 Lendo certidão: {caminho_certidao}")
+            texto_certidao = extrair_texto_pdf(doc_certidao, cache_ocr)
+            art.gravar("texto", ch_texto, {"texto": texto_certidao})
+        else:
+            texto_certidao = salvo["texto"]
+
+        # ── dados ─────────────────────────────────────────────────────────────
+        ch_dados = chave_etapa(
+            "dados",
+            versao_codigo(extrair_dados_certidao, _normalizar_acordao,
+                          _buscar_acordao_por_doc),
+            hash_json(texto_certidao))
+        dados = reaproveitar("dados", ch_dados)
+        if dados is None:
+            print("🔍 Extraindo dados...")
+            dados = extrair_dados_certidao(texto_certidao)
+            art.gravar("dados", ch_dados, dados)
+        _imprimir_dados(dados)
+
+        # ── enderecos: só o OCR; a gravação no banco é da etapa seguinte ──────
+        partes_json = None
+        if caminho_enderecos and os.path.isfile(caminho_enderecos):
+            ch_end = chave_etapa("enderecos", versao_codigo(gestor_enderecos),
+                                 hash_arquivo(caminho_enderecos))
+            partes_json = reaproveitar("enderecos", ch_end)
+            if partes_json is None:
+                print(f"\n📍 Importando endereços: {os.path.basename(caminho_enderecos)}")
+                try:
+                    partes = gestor_enderecos.extrair_partes_e_enderecos_ocr(
+                        caminho_enderecos, verbose=True, caminho_cache=cache_ocr)
+                    partes_json = gestor_enderecos.partes_para_json(partes)
+                    art.gravar("enderecos", ch_end, partes_json)
+                except Exception as e_end:
+                    print(f"  ⚠️  Erro ao importar endereços: {e_end}")
+
+        # ── banco ─────────────────────────────────────────────────────────────
+        ch_banco = chave_etapa(
+            "banco",
+            versao_codigo(salvar_certidao, _persistir_certidao,
+                          gestor_enderecos.gravar_partes_enderecos),
+            hash_json(dados), hash_json(partes_json), caminho_certidao,
+            caminho_planilha)
+        conn = inicializar_banco(caminho_db)
+        try:
+            # Só vale enquanto a certidão gravada continuar no banco
+            salvo = reaproveitar(
+                "banco", ch_banco,
+                lambda s: conn.execute(
+                    "SELECT 1 FROM certidoes WHERE id = ? AND numero_processo = ?",
+                    (s["certidao_id"], dados["numero_processo"])).fetchone())
+            if salvo is None:
+                partes = (gestor_enderecos.partes_de_json(partes_json)
+                          if partes_json is not None else None)
+                certidao_id = _persistir_certidao(conn, dados, caminho_certidao,
+                                                  caminho_planilha,
+                                                  partes_enderecos=partes)
+                art.gravar("banco", ch_banco, {"certidao_id": certidao_id})
+            else:
+                # Endereços editados no banco depois da gravação entram na petição
+                certidao_id = salvo["certidao_id"]
+                _recarregar_responsaveis(conn, certidao_id, dados)
+        finally:
+            conn.close()
+
+        # ── docx / pdf / final ────────────────────────────────────────────────
+        os.makedirs(pasta_saida, exist_ok=True)
+        docx_path, pdf_pet_path, pdf_final_path = _caminhos_saida(dados, pasta_saida)
+        h_dados = hash_json(dados)
+        hoje = datetime.now().strftime("%Y-%m-%d")    # a data vai na petição
+
+        ch_docx = chave_etapa("docx", versao_codigo(gerar_peticao_docx, gerar_valor_extenso),
+                              h_dados, hoje, docx_path)
+        if reaproveitar("docx", ch_docx, arquivo_intacto) is None:
+            print(f"\n📝 Gerando petição DOCX: {docx_path}")
+            gerar_peticao_docx(dados, docx_path)
+            art.gravar("docx", ch_docx, registrar_arquivo(docx_path))
+
+        versao_final = versao_codigo(montar_pdf_final)
+        h_planilha = hash_arquivo(caminho_planilha)
+
+        def chave_final(h_peticao: str) -> str:
+            return chave_etapa("final", versao_final, h_peticao, doc_certidao.sha256,
+                               h_planilha, pdf_final_path)
+
+        # A petição PDF é intermediária (montar_pdf_final a apaga): só é
+        # reaproveitada junto com o PDF final montado a partir dela
+        ch_pdf = chave_etapa("pdf", versao_codigo(gerar_peticao_pdf, gerar_valor_extenso),
+                             h_dados, hoje)
+        salvo_pdf = reaproveitar(
+            "pdf", ch_pdf,
+            lambda s: "final" not in forcadas
+                      and arquivo_intacto(art.obter("final", chave_final(s["sha256"]))))
+        if salvo_pdf is None:
+            print(f"🖨️  Gerando petição PDF: {pdf_pet_path}")
+            gerar_peticao_pdf(dados, pdf_pet_path)
+            salvo_pdf = registrar_arquivo(pdf_pet_path)
+            art.gravar("pdf", ch_pdf, salvo_pdf)
+
+        ch_final = chave_final(salvo_pdf["sha256"])
+        if reaproveitar("final", ch_final, arquivo_intacto) is None:
+            print(f"📦 Montando PDF final: {pdf_final_path}")
+            montar_pdf_final(pdf_pet_path, doc_certidao,
+                             caminho_planilha, pdf_final_path)
+            art.gravar("final", ch_final, registrar_arquivo(pdf_final_path))
+            print(f"✅ PDF final gerado: {pdf_final_path}")
+    finally:
+        art.fechar()
+
+    return {
+        "dados": dados,
+        "certidao_id": certidao_id,
+        "docx": docx_path,
+        "pdf_peticao": pdf_pet_path,
+        "pdf_final": pdf_final_path,
+        "etapas": etapas,
+        "db": caminho_db
+    }
 
-    print(f"📄 Lendo certidão: {caminho_certidao}")
-    texto_certidao = extrair_texto_pdf(caminho_certidao)
+
+def _extrair_certidao(doc_certidao, cache_ocr: str = None) -> dict:
+    """Etapas texto e dados: texto da certidão (camada de texto ou OCR) → dict."""
+    print(f"📄 Lendo certidão: {doc_certidao.caminho}")
+    texto_certidao = extrair_texto_pdf(doc_certidao, cache_ocr)
 
     print("🔍 Extraindo dados...")
     dados = extrair_dados_certidao(texto_certidao)
+    _imprimir_dados(dados)
+    return dados
+
 
+def _imprimir_dados(dados: dict) -> None:
     print("\n📋 Dados extraídos:")
     print(f"  Processo:     {dados['numero_processo']}")
     print(f"  Valor:        {dados['valor_atualizado']}")
@@ -1231,12 +1510,28 @@ def processar_certidao(
         print(f"  Responsável:  {r['nome']} | {r['tipo_doc']}: {r['numero_doc']} | "
               f"Acórdão: {r['acordao']}{status}")
 
-    # ── Banco de dados ────────────────────────────────────────────────────────
-    conn = inicializar_banco(caminho_db)
+
+def _persistir_certidao(conn: sqlite3.Connection, dados: dict,
+                        caminho_certidao: str, caminho_planilha: str = None,
+                        caminho_enderecos: str = None,
+                        partes_enderecos: list = None) -> int:
+    """
+    Etapa banco: salva a certidão, importa os endereços e recarrega os
+    responsáveis do banco em dados["responsaveis"] (já com endereço).
+    Os endereços vêm de caminho_enderecos (OCR aqui mesmo) ou de
+    partes_enderecos, já extraídas (ver gestor_enderecos.
+    extrair_partes_e_enderecos_ocr) — caso do lote e de processar_certidao,
+    em que o OCR é uma etapa à parte e só a gravação passa por esta conexão.
+    Retorna o id da certidão.
+    """
     certidao_id = salvar_certidao(conn, dados, caminho_certidao, caminho_planilha)
 
     # ── Importa endereços ANTES de gerar a petição ────────────────────────────
-    if caminho_enderecos and os.path.isfile(caminho_enderecos):
+    if partes_enderecos is not None:
+        from gestor_enderecos import criar_tabela_enderecos, gravar_partes_enderecos
+        criar_tabela_enderecos(conn)
+        gravar_partes_enderecos(conn, partes_enderecos, certidao_id=certidao_id)
+    elif caminho_enderecos and os.path.isfile(caminho_enderecos):
         print(f"\n📍 Importando endereços: {os.path.basename(caminho_enderecos)}")
         try:
             from gestor_enderecos import processar_pdf_enderecos
@@ -1247,7 +1542,13 @@ def processar_certidao(
         except Exception as e_end:
             print(f"  ⚠️  Erro ao importar endereços: {e_end}")
 
-    # ── Recarrega responsáveis do banco (agora com endereços preenchidos) ─────
+    _recarregar_responsaveis(conn, certidao_id, dados)
+    return certidao_id
+
+
+def _recarregar_responsaveis(conn: sqlite3.Connection, certidao_id: int,
+                             dados: dict) -> None:
+    """Recarrega responsáveis do banco (com endereços preenchidos) em dados."""
     cursor = conn.cursor()
     cursor.execute(
         "SELECT nome, tipo_doc, numero_doc, acordao, excluido, endereco "
@@ -1271,13 +1572,23 @@ def processar_certidao(
         print(f"  ✅ {len(rows)} responsável(eis) recarregado(s) do banco "
               f"({n_end} com endereço)")
 
-    conn.close()
 
-    # ── Nomes de arquivo ──────────────────────────────────────────────────────
+def _caminhos_saida(dados: dict, pasta_saida: str) -> tuple:
+    """(docx, petição pdf, pdf final) de uma certidão em pasta_saida."""
     proc_safe = (dados["numero_processo"] or "certidao").replace("/", "_").replace("\\", "_")
-    docx_path      = os.path.join(pasta_saida, f"peticao_{proc_safe}.docx")
-    pdf_pet_path   = os.path.join(pasta_saida, f"peticao_{proc_safe}.pdf")
-    pdf_final_path = os.path.join(pasta_saida, f"EXECUCAO_{proc_safe}_COMPLETO.pdf")
+    return (os.path.join(pasta_saida, f"peticao_{proc_safe}.docx"),
+            os.path.join(pasta_saida, f"peticao_{proc_safe}.pdf"),
+            os.path.join(pasta_saida, f"EXECUCAO_{proc_safe}_COMPLETO.pdf"))
+
+
+def _gerar_saidas(dados: dict, certidao_pdf, caminho_planilha: str,
+                  pasta_saida: str) -> dict:
+    """
+    Etapas docx, pdf e final, sem artefatos (lote: o job já tem checkpoints).
+    certidao_pdf: caminho ou gestor_enderecos.DocumentoPDF.
+    """
+    os.makedirs(pasta_saida, exist_ok=True)
+    docx_path, pdf_pet_path, pdf_final_path = _caminhos_saida(dados, pasta_saida)
 
     print(f"\n📝 Gerando petição DOCX: {docx_path}")
     gerar_peticao_docx(dados, docx_path)
@@ -1286,20 +1597,486 @@ def processar_certidao(
     gerar_peticao_pdf(dados, pdf_pet_path)
 
     print(f"📦 Montando PDF final: {pdf_final_path}")
-    montar_pdf_final(pdf_pet_path, caminho_certidao,
+    montar_pdf_final(pdf_pet_path, certidao_pdf,
                      caminho_planilha, pdf_final_path)
     print(f"✅ PDF final gerado: {pdf_final_path}")
 
     return {
-        "dados": dados,
-        "certidao_id": certidao_id,
         "docx": docx_path,
         "pdf_peticao": pdf_pet_path,
         "pdf_final": pdf_final_path,
-        "db": caminho_db
     }
 
 
+# ============================================================
+# PROCESSAMENTO EM LOTE
+# ============================================================
+
+SUFIXO_PLANILHA  = "_planilha"
+SUFIXO_ENDERECOS = "_enderecos"
+
+
+def ler_lote(origem: str) -> list:
+    """
+    Lista de itens {certidao, planilha, enderecos} (caminhos; planilha e
+    enderecos podem ser None) a partir de:
+      - um diretório: cada PDF é uma certidão, e os acompanhantes têm o
+        mesmo nome com sufixo (X.pdf, X_planilha.pdf, X_enderecos.pdf);
+      - um manifesto .csv (cabeçalho certidao,planilha,enderecos) ou
+        .jsonl (um objeto por linha, mesmas chaves). Caminhos relativos
+        são resolvidos a partir da pasta do manifesto.
+    """
+    import csv
+
+    origem = Path(origem)
+    if origem.is_dir():
+        pdfs = {p.stem: p for p in origem.iterdir() if p.suffix.lower() == ".pdf"}
+        itens = []
+        for stem, caminho in sorted(pdfs.items()):
+            if stem.endswith((SUFIXO_PLANILHA, SUFIXO_ENDERECOS)):
+                continue
+            planilha  = pdfs.get(stem + SUFIXO_PLANILHA)
+            enderecos = pdfs.get(stem + SUFIXO_ENDERECOS)
+            itens.append({"certidao": str(caminho),
+                          "planilha": str(planilha) if planilha else None,
+                          "enderecos": str(enderecos) if enderecos else None})
+        return itens
+
+    with open(origem, encoding="utf-8-sig", newline="") as f:
+        if origem.suffix.lower() == ".jsonl":
+            brutos = [json.loads(l) for l in f if l.strip()]
+        else:
+            brutos = list(csv.DictReader(f))
+
+    def resolver(valor):
+        if not valor or not str(valor).strip():
+            return None
+        caminho = Path(str(valor).strip())
+        return str(caminho if caminho.is_absolute() else origem.parent / caminho)
+
+    return [{"certidao": resolver(b.get("certidao")),
+             "planilha": resolver(b.get("planilha")),
+             "enderecos": resolver(b.get("enderecos"))}
+            for b in brutos if b.get("certidao")]
+
+
+def _lote_extrair(item: dict, cache_ocr: str) -> dict:
+    """
+    Worker do lote: texto + dados da certidão e OCR dos endereços, sem
+    tocar no banco. A saída do pipeline fica em "log".
+    """
+    import contextlib
+    import io
+    import time
+    from gestor_enderecos import DocumentoPDF, extrair_partes_e_enderecos_ocr
+
+    t0 = time.perf_counter()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        with DocumentoPDF(item["certidao"]) as doc:
+            dados = _extrair_certidao(doc, cache_ocr)
+        partes = None
+        if item.get("enderecos") and os.path.isfile(item["enderecos"]):
+            # Um processo por arquivo: o OCR dos endereços roda sequencial aqui
+            partes = extrair_partes_e_enderecos_ocr(item["enderecos"], verbose=False,
+                                                    workers=1, caminho_cache=cache_ocr)
+    return {"dados": dados, "partes": partes, "log": log.getvalue(),
+            "t_extracao": time.perf_counter() - t0}
+
+
+def _lote_gerar(dados: dict, item: dict, pasta_saida: str) -> dict:
+    """Worker do lote: petição DOCX/PDF e PDF final."""
+    import contextlib
+    import io
+    import time
+
+    t0 = time.perf_counter()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        saidas = _gerar_saidas(dados, item["certidao"], item.get("planilha"),
+                               pasta_saida)
+    return {**saidas, "log": log.getvalue(), "t_geracao": time.perf_counter() - t0}
+
+
+def _chave_item_lote(item: dict) -> str:
+    """Chave do job de uma certidão: SHA-256 do conteúdo dos seus PDFs."""
+    import hashlib
+    from gestor_enderecos import sha256_arquivo
+
+    partes = [sha256_arquivo(item[k]) if item.get(k) and os.path.isfile(item[k]) else ""
+              for k in ("certidao", "planilha", "enderecos")]
+    return hashlib.sha256("|".join(partes).encode()).hexdigest()
+
+
+def processar_lote(origem, pasta_saida: str = "saida_peticoes",
+                   caminho_db: str = "certidoes_tce.db",
+                   workers: int = None, refazer: bool = False) -> list:
+    """
+    Processa várias certidões (ver ler_lote) num pool de processos:
+      1. workers: extração do texto/dados da certidão e OCR dos endereços
+      2. processo principal: gravação no banco, uma certidão por vez, por
+         uma única conexão (único escritor do SQLite)
+      3. workers: geração da petição e do PDF final
+    Cada certidão é um job na fila persistente (fila_jobs, tipo
+    'certidao', chave = hash dos PDFs), com checkpoint ao fim de cada
+    etapa. Se o lote for interrompido, rodá-lo de novo retoma cada
+    certidão da última etapa concluída (sem refazer o OCR) e pula as já
+    concluídas; refazer=True processa tudo de novo. Uma falha afeta só o
+    próprio item e é tentada de novo até o limite de tentativas do job.
+    Ao final imprime uma tabela por arquivo com os tempos de cada etapa.
+    origem: diretório, manifesto .csv/.jsonl ou lista de itens já lida.
+    Retorna a lista de resultados (um dict por item, na ordem da origem).
+    """
+    import contextlib
+    import io
+    import time
+    import traceback
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from gestor_enderecos import caminho_cache_ocr, partes_de_json, partes_para_json
+    from fila_jobs import FilaJobs
+
+    itens = ler_lote(origem) if isinstance(origem, (str, Path)) else list(origem)
+    if not itens:
+        print("Nenhuma certidão encontrada.")
+        return []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(itens)))
+    cache_ocr = caminho_cache_ocr(caminho_db)
+    os.makedirs(pasta_saida, exist_ok=True)
+
+    resultados = [{"certidao": it["certidao"], "status": "pendente",
+                   "t_extracao": 0.0, "t_banco": 0.0, "t_geracao": 0.0}
+                  for it in itens]
+    print(f"📚 Lote: {len(itens)} certidão(ões) em {workers} processo(s)")
+    t_lote = time.perf_counter()
+
+    conn = inicializar_banco(caminho_db)
+    fila = FilaJobs(caminho_db)
+    reabrir = ("failed", "done") if refazer else ("failed",)
+    a_fazer = []                    # (job_id, indice do item)
+    for i, it in enumerate(itens):
+        job = fila.enfileirar("certidao", _chave_item_lote(it),
+                              {**it, "pasta_saida": pasta_saida}, reabrir=reabrir)
+        if job["estado"] == "done":
+            cp = job["checkpoints"]
+            resultados[i].update(status="já concluída",
+                                 numero_processo=cp.get("banco", {}).get("dados", {}).get("numero_processo"),
+                                 certidao_id=cp.get("banco", {}).get("certidao_id"),
+                                 pdf_final=cp.get("geracao", {}).get("pdf_final"))
+        else:
+            a_fazer.append((job["id"], i))
+
+    em_voo = {}                     # future -> (etapa, job, indice)
+
+    def persistir(job, i):
+        res = resultados[i]
+        cp = job["checkpoints"]["extracao"]
+        t0 = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                certidao_id = _persistir_certidao(
+                    conn, cp["dados"], itens[i]["certidao"], itens[i].get("planilha"),
+                    partes_enderecos=(partes_de_json(cp["partes"])
+                                      if cp["partes"] is not None else None))
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            res["t_banco"] = time.perf_counter() - t0
+        res["certidao_id"] = certidao_id
+        job["checkpoints"]["banco"] = {"certidao_id": certidao_id, "dados": cp["dados"]}
+        fila.checkpoint(job["id"], "banco", job["checkpoints"]["banco"])
+
+    def avancar(pool, job, i):
+        """Dispara a próxima etapa do job conforme os checkpoints gravados."""
+        cp = job["checkpoints"]
+        res = resultados[i]
+        if "extracao" in cp:
+            res["numero_processo"] = cp["extracao"]["dados"]["numero_processo"]
+        if "geracao" in cp:
+            fila.concluir(job["id"])
+            res.update(status="ok", pdf_final=cp["geracao"]["pdf_final"])
+        elif "banco" in cp:
+            res["certidao_id"] = cp["banco"]["certidao_id"]
+            em_voo[pool.submit(_lote_gerar, cp["banco"]["dados"], itens[i],
+                               pasta_saida)] = ("geracao", job, i)
+        elif "extracao" in cp:
+            persistir(job, i)
+            avancar(pool, job, i)
+        else:
+            em_voo[pool.submit(_lote_extrair, itens[i], cache_ocr)] = ("extracao", job, i)
+
+    def falhou(job, i, etapa):
+        estado = fila.falhar(job["id"], traceback.format_exc())
+        resultados[i]["status"] = f"falha na {etapa}"
+        resultados[i]["erro"] = traceback.format_exc()
+        if estado == "queued":
+            a_fazer.append((job["id"], i))      # nova tentativa neste mesmo lote
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while a_fazer or em_voo:
+                # Reivindica só o que cabe no pool: o resto fica na fila,
+                # disponível para outro processo
+                while a_fazer and len(em_voo) < workers:
+                    job_id, i = a_fazer.pop(0)
+                    job = fila.reivindicar("certidao", job_id=job_id)
+                    if job is None:
+                        resultados[i]["status"] = "em andamento em outro processo"
+                        continue
+                    try:
+                        avancar(pool, job, i)
+                    except Exception:
+                        falhou(job, i, "banco")
+                if not em_voo:
+                    continue
+
+                prontos, _ = wait(em_voo, timeout=60, return_when=FIRST_COMPLETED)
+                for _, job, _ in em_voo.values():
+                    fila.renovar(job["id"])
+                for fut in prontos:
+                    etapa, job, i = em_voo.pop(fut)
+                    try:
+                        saida = fut.result()
+                    except Exception:
+                        falhou(job, i, etapa)
+                        continue
+                    if etapa == "extracao":
+                        resultados[i]["t_extracao"] = saida["t_extracao"]
+                        job["checkpoints"]["extracao"] = {
+                            "dados": saida["dados"],
+                            "partes": (partes_para_json(saida["partes"])
+                                       if saida["partes"] is not None else None),
+                        }
+                        fila.checkpoint(job["id"], "extracao", job["checkpoints"]["extracao"])
+                    else:
+                        resultados[i]["t_geracao"] = saida["t_geracao"]
+                        job["checkpoints"]["geracao"] = {
+                            k: saida[k] for k in ("docx", "pdf_peticao", "pdf_final")}
+                        fila.checkpoint(job["id"], "geracao", job["checkpoints"]["geracao"])
+                    try:
+                        avancar(pool, job, i)
+                    except Exception:
+                        falhou(job, i, "banco")
+    finally:
+        # Interrompido (Ctrl+C, erro inesperado): devolve os jobs à fila
+        for _, job, _ in em_voo.values():
+            fila.falhar(job["id"], "lote interrompido")
+        fila.fechar()
+        conn.close()
+
+    _imprimir_resumo_lote(resultados, time.perf_counter() - t_lote)
+    return resultados
+
+
+def _imprimir_resumo_lote(resultados: list, total: float) -> None:
+    print()
+    print(f"{'Arquivo':<40} {'Processo':<16} {'Extr.':>7} {'Banco':>7} "
+          f"{'Geração':>8} {'Total':>7}  Status")
+    print("-" * 100)
+    for r in resultados:
+        soma = r["t_extracao"] + r["t_banco"] + r["t_geracao"]
+        print(f"{os.path.basename(r['certidao'])[:40]:<40} "
+              f"{(r.get('numero_processo') or '-')[:16]:<16} "
+              f"{r['t_extracao']:6.1f}s {r['t_banco']:6.1f}s {r['t_geracao']:7.1f}s "
+              f"{soma:6.1f}s  {r['status']}")
+    ok = sum(1 for r in resultados if r["status"] in ("ok", "já concluída"))
+    print("-" * 100)
+    print(f"{ok}/{len(resultados)} certidão(ões) processada(s) em {total:.1f}s")
+
+
+# ============================================================
+# MODO VIGIA (pasta de entrada)
+# ============================================================
+
+def _hashes_certidoes(conn: sqlite3.Connection, memo: dict) -> set:
+    """
+    SHA-256 dos PDFs apontados por certidoes.caminho_pdf_certidao que ainda
+    existem. memo guarda {(caminho, tamanho, mtime): hash} entre chamadas,
+    para só ler arquivos novos ou alterados.
+    """
+    from gestor_enderecos import sha256_arquivo
+
+    for (caminho,) in conn.execute(
+            "SELECT DISTINCT caminho_pdf_certidao FROM certidoes "
+            "WHERE caminho_pdf_certidao IS NOT NULL"):
+        try:
+            st = os.stat(caminho)
+        except OSError:
+            continue
+        chave = (caminho, st.st_size, st.st_mtime)
+        if chave not in memo:
+            memo[chave] = sha256_arquivo(caminho)
+    return set(memo.values())
+
+
+def _mover_para(caminho: str, pasta: Path) -> str:
+    """Move o arquivo para a pasta sem sobrescrever (acrescenta _1, _2...)."""
+    import shutil
+
+    destino = pasta / Path(caminho).name
+    n = 1
+    while destino.exists():
+        destino = pasta / f"{Path(caminho).stem}_{n}{Path(caminho).suffix}"
+        n += 1
+    shutil.move(caminho, destino)
+    return str(destino)
+
+
+def _arquivar(caminho: str, pasta: Path) -> str:
+    """
+    _mover_para que não derruba o vigia: se o arquivo estiver travado (aberto
+    em outro programa) ou tiver sumido, avisa e devolve o caminho original —
+    o arquivo continua na entrada e é tratado de novo na próxima varredura.
+    """
+    try:
+        return _mover_para(caminho, pasta)
+    except OSError as e:
+        print(f"  ⚠️  {os.path.basename(caminho)}: não foi possível mover "
+              f"para {pasta.name} ({e})")
+        return caminho
+
+
+def vigiar_pasta(pasta_entrada: str, pasta_saida: str = "saida_peticoes",
+                 caminho_db: str = "certidoes_tce.db", workers: int = 2,
+                 intervalo: float = 5.0, estabilidade: float = 10.0,
+                 uma_vez: bool = False) -> None:
+    """
+    Modo sem interface: vigia pasta_entrada (varredura a cada `intervalo`
+    segundos) e processa as certidões novas assim que chegam.
+      - Os arquivos seguem a convenção de ler_lote (X.pdf, X_planilha.pdf,
+        X_enderecos.pdf). Um item só entra na fila quando todos os seus
+        arquivos ficam `estabilidade` segundos sem mudar de tamanho/data,
+        para não pegar uma cópia pela metade.
+      - Certidões cujo conteúdo (SHA-256) já está no banco, via
+        certidoes.caminho_pdf_certidao, não são reprocessadas.
+      - Cada leva de itens prontos passa por processar_lote, com no máximo
+        `workers` processos e um único escritor no SQLite.
+      - Depois, os PDFs vão para <entrada>/processados ou <entrada>/falhas,
+        e o caminho da certidão no banco passa a apontar para processados.
+    uma_vez: faz uma única varredura (sem esperar estabilidade) e retorna.
+    Ctrl+C encerra.
+    """
+    import time
+
+    entrada = Path(pasta_entrada)
+    pasta_ok = entrada / "processados"
+    pasta_falha = entrada / "falhas"
+    pasta_ok.mkdir(parents=True, exist_ok=True)
+    pasta_falha.mkdir(parents=True, exist_ok=True)
+
+    vistos = {}     # caminho -> ((tamanho, mtime), instante em que ficou assim)
+    memo_hashes = {}
+    print(f"👀 Vigiando {entrada.resolve()} (a cada {intervalo:.0f}s; Ctrl+C encerra)")
+
+    try:
+        while True:
+            try:
+                vistos = _varrer_entrada(entrada, vistos, estabilidade, uma_vez,
+                                         pasta_saida, caminho_db, workers,
+                                         pasta_ok, pasta_falha, memo_hashes)
+            except (OSError, sqlite3.Error) as e:
+                # Pasta de rede fora do ar, banco travado por outro
+                # processo...: perde só esta varredura
+                print(f"  ⚠️  Varredura falhou ({type(e).__name__}: {e}); "
+                      f"nova tentativa em {intervalo:.0f}s")
+            if uma_vez:
+                return
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        print("\n⏹️  Vigia encerrado.")
+
+
+def _varrer_entrada(entrada: Path, vistos: dict, estabilidade: float,
+                    uma_vez: bool, pasta_saida: str, caminho_db: str,
+                    workers: int, pasta_ok: Path, pasta_falha: Path,
+                    memo_hashes: dict) -> dict:
+    """
+    Uma varredura do vigia: atualiza `vistos`, processa os itens estáveis e
+    devolve o novo `vistos`. Um arquivo que some ou fica inacessível entre a
+    listagem e o stat é só ignorado nesta passada.
+    """
+    import time
+
+    agora = time.monotonic()
+    estaveis = set()
+    for p in entrada.iterdir():
+        try:
+            if not p.is_file() or p.suffix.lower() != ".pdf":
+                continue
+            st = p.stat()
+        except OSError:
+            continue
+        assinatura = (st.st_size, st.st_mtime)
+        anterior = vistos.get(str(p))
+        if anterior is None or anterior[0] != assinatura:
+            vistos[str(p)] = (assinatura, agora)
+        if uma_vez or agora - vistos[str(p)][1] >= estabilidade:
+            estaveis.add(str(p))
+    vistos = {c: v for c, v in vistos.items() if os.path.exists(c)}
+
+    prontos = [it for it in ler_lote(entrada)
+               if all(c in estaveis for c in it.values() if c)]
+    if prontos:
+        _processar_prontos(prontos, pasta_saida, caminho_db, workers,
+                           pasta_ok, pasta_falha, memo_hashes)
+        for it in prontos:
+            for c in it.values():
+                vistos.pop(c, None)
+    return vistos
+
+
+def _processar_prontos(prontos: list, pasta_saida: str, caminho_db: str,
+                       workers: int, pasta_ok: Path, pasta_falha: Path,
+                       memo_hashes: dict) -> None:
+    """Uma leva do vigia: deduplica, processa em lote e arquiva os PDFs."""
+    from gestor_enderecos import sha256_arquivo
+
+    conn = inicializar_banco(caminho_db)
+    try:
+        conhecidos = _hashes_certidoes(conn, memo_hashes)
+    finally:
+        conn.close()
+
+    novos = []
+    for it in prontos:
+        try:
+            h = sha256_arquivo(it["certidao"])
+        except OSError as e:
+            print(f"  ⚠️  {os.path.basename(it['certidao'])}: ilegível agora ({e}); "
+                  f"fica para a próxima varredura")
+            continue
+        if h in conhecidos:
+            print(f"  ↩️  {os.path.basename(it['certidao'])}: já processada (mesmo conteúdo)")
+            for c in it.values():
+                if c:
+                    _arquivar(c, pasta_ok)
+            continue
+        conhecidos.add(h)
+        novos.append(it)
+    if not novos:
+        return
+
+    resultados = processar_lote(novos, pasta_saida=pasta_saida,
+                                caminho_db=caminho_db, workers=workers)
+
+    conn = inicializar_banco(caminho_db)
+    try:
+        for it, res in zip(novos, resultados):
+            concluida = res["status"] in ("ok", "já concluída")
+            destino = pasta_ok if concluida else pasta_falha
+            movidos = {k: _arquivar(c, destino) if c else None for k, c in it.items()}
+            # Falhas vão para falhas/ e não entram na deduplicação: se o
+            # operador devolver o arquivo à entrada, ele é processado de novo
+            if concluida and res.get("certidao_id"):
+                conn.execute(
+                    "UPDATE certidoes SET caminho_pdf_certidao = ?, "
+                    "caminho_pdf_planilha = ? WHERE id = ?",
+                    (movidos["certidao"], movidos["planilha"], res["certidao_id"]))
+        conn.commit()
+    finally:
+        conn.close()
+
+
 # ============================================================
 # INTERFACE TKINTER (GUI)
 # ============================================================
@@ -1441,22 +2218,45 @@ def lancar_gui():
             messagebox.showerror("Erro", str(e))
 
     # ── Botão listar banco ───────────────────────────────────────────────────
+    # Lista PAGINA_LISTAGEM certidões por clique; o clique seguinte continua
+    # de onde parou (cursor = id da última listada), até voltar ao início
+    cursor_lista = {"db": None, "antes_de_id": None}
+
     def listar_db():
         db = var_db.get().strip()
         if not os.path.exists(db):
             messagebox.showinfo("Info", "Banco ainda não criado.")
             return
+        if cursor_lista["db"] != db:
+            cursor_lista.update(db=db, antes_de_id=None)
         conn = inicializar_banco(db)
-        certs = listar_certidoes(conn)
-        conn.close()
-        log("=" * 60)
-        log(f"Certidões no banco: {len(certs)}")
+        try:
+            total = conn.execute("SELECT COUNT(*) FROM certidoes").fetchone()[0]
+            certs = listar_certidoes(conn, PAGINA_LISTAGEM, cursor_lista["antes_de_id"])
+            restantes = (conn.execute("SELECT COUNT(*) FROM certidoes WHERE id < ?",
+                                      (certs[-1]["id"],)).fetchone()[0]
+                         if certs else 0)
+        finally:
+            conn.close()
+
+        # Uma única inserção no log: log() redesenha a janela a cada chamada
+        linhas = ["=" * 60]
+        if cursor_lista["antes_de_id"] is None:
+            linhas.append(f"Certidões no banco: {total}")
         for c in certs:
-            log(f"  [{c['id']}] {c['numero_processo']} | {c['valor_atualizado']}")
+            linhas.append(f"  [{c['id']}] {c['numero_processo']} | {c['valor_atualizado']}")
             for r in c["responsaveis"]:
                 status = " [excluído]" if r["excluido"] else ""
                 end_txt = f" | {r['endereco']}" if r.get("endereco") else ""
-                log(f"      • {r['nome']} ({r['tipo_doc']}: {r['numero_doc']}){status}{end_txt}")
+                linhas.append(f"      • {r['nome']} ({r['tipo_doc']}: {r['numero_doc']})"
+                              f"{status}{end_txt}")
+        if restantes:
+            cursor_lista["antes_de_id"] = certs[-1]["id"]
+            linhas.append(f"  … mais {restantes} certidão(ões): clique em "
+                          f"\"Listar Banco\" de novo para a próxima página.")
+        else:
+            cursor_lista["antes_de_id"] = None
+        log("\n".join(linhas))
     
     # ── Botão enviar peticao ───────────────────────────────────────────────────
     def enviar_peticao():
@@ -1498,12 +2298,40 @@ if __name__ == "__main__":
     if len(sys.argv) == 1:
         # Sem argumentos → GUI
         lancar_gui()
+    elif sys.argv[1] == "--lote":
+        # python main.py --lote <pasta | manifesto.csv | manifesto.jsonl> [workers]
+        uso = "Uso: python main.py --lote <pasta | manifesto.csv | manifesto.jsonl> [workers]"
+        if not 3 <= len(sys.argv) <= 4 or (len(sys.argv) == 4 and not sys.argv[3].isdigit()):
+            sys.exit(uso)
+        n_workers = int(sys.argv[3]) if len(sys.argv) >= 4 else None
+        processar_lote(sys.argv[2], workers=n_workers)
+    elif sys.argv[1] == "--vigiar":
+        # python main.py --vigiar <pasta_entrada> [workers]
+        uso = "Uso: python main.py --vigiar <pasta_entrada> [workers]"
+        if not 3 <= len(sys.argv) <= 4 or (len(sys.argv) == 4 and not sys.argv[3].isdigit()):
+            sys.exit(uso)
+        n_workers = int(sys.argv[3]) if len(sys.argv) >= 4 else 2
+        vigiar_pasta(sys.argv[2], workers=n_workers)
     elif len(sys.argv) >= 2:
         # Modo linha de comando: python extrator_certidao.py certidao.pdf [planilha.pdf]
-        certidao_pdf  = sys.argv[1]
-        planilha_pdf  = sys.argv[2] if len(sys.argv) >= 3 else None
-        enderecos_pdf = sys.argv[3] if len(sys.argv) >= 4 else None
+        #   [enderecos.pdf] [--from-stage ETAPA]
+        uso = ("Uso: python main.py certidao.pdf [planilha.pdf] [enderecos.pdf] "
+               f"[--from-stage {{{','.join(ETAPAS)}}}]")
+        args = sys.argv[1:]
+        desde_etapa = None
+        if "--from-stage" in args:
+            i = args.index("--from-stage")
+            if i + 1 >= len(args) or args[i + 1] not in ETAPAS:
+                sys.exit(uso)
+            desde_etapa = args[i + 1]
+            del args[i:i + 2]
+        if not args:
+            sys.exit(uso)
+        certidao_pdf  = args[0]
+        planilha_pdf  = args[1] if len(args) >= 2 else None
+        enderecos_pdf = args[2] if len(args) >= 3 else None
         resultado = processar_certidao(certidao_pdf, planilha_pdf,
-                                       caminho_enderecos=enderecos_pdf)
+                                       caminho_enderecos=enderecos_pdf,
+                                       desde_etapa=desde_etapa)
         print(json.dumps({k: v for k, v in resultado.items() if k != "dados"},
                           ensure_ascii=False, indent=2))